@@ -26,6 +26,44 @@ a host list through xargs.
 
 Multi-threaded for speed and exits upon first available host response to minimize delay to ~ 1 second or less.
 
+On Python 3 the checks run as coroutines on an asyncio event loop by default (--engine asyncio), which scales to
+thousands of candidate hosts and cancels all outstanding probes the moment the first one succeeds. --deadline sets an
+overall time limit after which the remaining probes are abandoned and NO_AVAILABLE_SERVER is returned. The original
+thread pool engine is still available via --engine threads and is always used on Python 2, as well as for HTTP(S)
+checks sent through a proxy from the environment ($HTTP_PROXY / $HTTPS_PROXY / $ALL_PROXY not bypassed by $NO_PROXY).
+Both engines verify HTTPS certificates against $REQUESTS_CA_BUNDLE / $CURL_CA_BUNDLE if set.
+
+--cache-ttl caches the answer in a local file shared by all the find_active_*.py tools, keyed by tool, host list, port
+and check criteria. A cached answer younger than the TTL is re-verified with a single probe of just that host before
+being returned, falling back to probing all the hosts if it no longer passes. This saves hammering clusters with probes
+from job wrappers calling these tools before every submission when the answer only changes on failover.
+
+--watch runs as a long lived watcher daemon instead, re-checking every N seconds (backing off exponentially up to
+--max-backoff while no server is available) and publishing the current answer atomically to --publish-file and / or
+to any client connecting to the --publish-socket unix domain socket. The current answer is re-verified with a single
+probe each interval and all hosts are only probed again once it fails, so the answer is stable and failover is
+detected within one interval, eg.
+
+    ./find_active_hadoop_namenode.py --watch 5 --publish-socket /tmp/namenode.sock namenode1 namenode2 &
+
+    nc -U /tmp/namenode.sock
+
+--rank probes every host --rank-probes times concurrently and prints all the healthy hosts ordered by their median
+(p50) or 95th percentile (p95) response latency, so clients can pin to the consistently fastest node rather than just
+whichever happened to answer first. Output columns are host, p50 ms, p95 ms and successful / total probes, hosts
+failing some of their probes are ordered after those passing all of them, eg.
+
+    ./find_active_elasticsearch.py --rank node1 node2 node3 | head -n 1 | awk '{print $1}'
+
+HTTP(S) checks reuse keep-alive connections from a shared pool and stream the response through the --regex, stopping
+as soon as it matches rather than downloading the whole page first. Without a --regex the body isn't downloaded at all
+and --method HEAD or RANGE (a GET of just the first byte) can be used to make the check cheaper still.
+
+--ping on the asyncio engine sends ICMP echo requests to all the hosts in-process over one unprivileged ICMP datagram
+socket instead of forking the ping command per host, where the OS permits it (Linux sysctl net.ipv4.ping_group_range
+must include one of your groups). --ping-method tcp instead TCP connects to --port, counting a refused connection as
+the host being up, which works on any engine and without any ICMP permissions.
+
 Useful for pre-determining a server to be passed to tools that only take a single --host argument but for which the
 technology has later added multi-master support or active-standby masters (eg. Hadoop, HBase) or where you want to
 query cluster wide information available from any online peer (eg. Elasticsearch).
@@ -105,19 +143,36 @@ from __future__ import division
 from __future__ import print_function
 #from __future__ import unicode_literals
 
+import errno
+import json
+import math
 import os
 import platform
 import re
+import signal
 import socket
+import stat
 import subprocess
 import sys
-#from threading import Thread
+import time
+from threading import Thread
 from multiprocessing.pool import ThreadPool
 from multiprocessing import cpu_count
+import multiprocessing
 # prefer blocking semantics of que.get() rather than handling deque.popleft() => 'IndexError: pop from an empty deque'
 #from collections import deque
 import traceback
 from random import shuffle
+try:
+    # Python 3.11+ deprecates the sre_parse alias
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse  # pylint: disable=deprecated-module
+try:
+    import fcntl
+except ImportError:
+    # no locking on Windows
+    fcntl = None
 # Python 2 Queue vs Python 3 queue module :-/
 if sys.version[0] == '2':
     import Queue as queue  # pylint: disable=import-error
@@ -130,20 +185,170 @@ except ImportError:
     print(traceback.format_exc(), end='')
     sys.exit(4)
 srcdir = os.path.abspath(os.path.dirname(__file__))
-libdir = os.path.join(srcdir, 'pylib')
-sys.path.append(libdir)
+pylib = os.path.join(srcdir, 'pylib')
+lib = os.path.join(srcdir, 'lib')
+sys.path.append(pylib)
+sys.path.append(lib)
 try:
     # pylint: disable=wrong-import-position
     from harisekhon.utils import log, log_option, die, code_error, uniq_list_ordered
     from harisekhon.utils import validate_hostport_list, validate_port, validate_int, validate_regex
     from harisekhon.utils import isPort, isInt, isStr, isTuple, UnknownError
     from harisekhon import CLI
+    # asyncio engine requires Python 3.5+ syntax
+    if sys.version_info >= (3, 5):
+        from find_active_async import AsyncProber, icmp_permitted
+    else:
+        AsyncProber = None
+        icmp_permitted = None
 except ImportError as _:
     print(traceback.format_exc(), end='')
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.8.6'
+__version__ = '0.14.1'
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest rank percentile of an already sorted non-empty list
+    """
+    index = int(math.ceil(pct / 100.0 * len(sorted_values))) - 1
+    return sorted_values[max(index, 0)]
+
+
+class RegexStreamMatcher(object):
+    """
+    Searches for a regex in text fed in incrementally, eg. from a streamed http response, deciding as early as is safe
+
+    Each chunk is only searched from the earliest position a match could still start at, and the text before that is
+    dropped, so this takes linear time and bounded memory however long the response is. Matches are limited to the
+    regex's maximum width, or max_match characters for regexes that can match text of any length
+    """
+
+    # longest match detected for regexes of unbounded width, eg. containing .* or \s+
+    max_match = 64 * 1024
+    # text kept before the search position for lookbehinds, word boundaries and multiline ^ to look back at
+    context = 1024
+
+    def __init__(self, regex):
+        self.regex = regex
+        self.text = ''
+        # position in text to search from, earlier positions have been ruled out as match starts
+        self.pos = 0
+        self.matched = False
+        pattern = regex.pattern
+        # a match must end this many characters before the end of the text seen so far to be trusted,
+        # since end anchors, word boundaries or lookaheads could stop matching once more text follows
+        self.margin = 0
+        if '(?=' in pattern or '(?!' in pattern or '\\Z' in pattern or \
+           ('$' in pattern and not regex.flags & re.MULTILINE):
+            # depends on arbitrary text after the match or on where the text ends, so only finish() can tell
+            self.margin = self.max_match
+        elif '$' in pattern or '\\b' in pattern or '\\B' in pattern:
+            self.margin = 1
+        self.span = self.max_width(regex) + self.margin
+
+    @classmethod
+    def max_width(cls, regex):
+        try:
+            width = sre_parse.parse(regex.pattern, regex.flags).getwidth()[1]
+        except (OverflowError, ValueError, TypeError):
+            width = cls.max_match
+        return min(width, cls.max_match)
+
+    def feed(self, text):
+        """
+        Returns True once there is definitely a match, regardless of any text still to come
+        """
+        if self.matched:
+            return True
+        self.text += text
+        end = len(self.text)
+        match = self.regex.search(self.text, self.pos)
+        if match and match.end() <= end - self.margin:
+            self.matched = True
+            return True
+        # only matches starting within span of the end could still complete once more text follows
+        pos = max(self.pos, end - self.span)
+        if match:
+            pos = min(pos, match.start())
+        # passing pos to search() rather than searching from the start of the kept text stops ^ and \A matching
+        # there, while leaving lookbehinds the real preceding text
+        trim = max(pos - self.context, 0)
+        self.text = self.text[trim:]
+        self.pos = pos - trim
+        return False
+
+    def finish(self):
+        """
+        Returns whether the complete text matches
+        """
+        self.matched = self.matched or self.regex.search(self.text, self.pos) is not None
+        return self.matched
+
+
+class ResultCache(object):
+    """
+    TTL cache of find_active_*.py answers in a JSON file, shared by concurrent processes using file locking
+    """
+
+    def __init__(self, filename, ttl):
+        self.filename = filename
+        self.ttl = ttl
+
+    @staticmethod
+    def make_key(*args):
+        return json.dumps(args)
+
+    def _load(self, filehandle):
+        filehandle.seek(0)
+        content = filehandle.read()
+        if not content.strip():
+            return {}
+        try:
+            cache = json.loads(content)
+        except ValueError:
+            log.warn("ignoring corrupt cache file '%s'", self.filename)
+            return {}
+        if not isinstance(cache, dict):
+            return {}
+        return cache
+
+    def get(self, key):
+        try:
+            with open(self.filename) as filehandle:
+                if fcntl:
+                    fcntl.flock(filehandle, fcntl.LOCK_SH)
+                entry = self._load(filehandle).get(key)
+        except IOError as _:
+            log.debug("cache file '%s' not readable: %s", self.filename, _)
+            return None
+        if not entry or time.time() - entry.get('time', 0) > self.ttl:
+            return None
+        result = entry.get('result')
+        # JSON turns (host, port) tuples in to lists
+        if isinstance(result, list):
+            result = tuple(result)
+        return result
+
+    def set(self, key, result):
+        try:
+            # 'a+' to create without truncating before the lock is held
+            with open(self.filename, 'a+') as filehandle:
+                if fcntl:
+                    fcntl.flock(filehandle, fcntl.LOCK_EX)
+                cache = self._load(filehandle)
+                now = time.time()
+                # expire old entries so the file doesn't grow forever
+                cache = dict([(k, v) for (k, v) in cache.items()
+                              if isinstance(v, dict) and now - v.get('time', 0) <= self.ttl])
+                cache[key] = {'result': result, 'time': now}
+                filehandle.seek(0)
+                filehandle.truncate()
+                json.dump(cache, filehandle)
+        except IOError as _:
+            log.warn("failed to write cache file '%s': %s", self.filename, _)
 
 
 class FindActiveServer(CLI):
@@ -162,6 +367,22 @@ class FindActiveServer(CLI):
         self.request_timeout = None
         self.default_num_threads = min(cpu_count() * 4, 100)
         self.num_threads = None
+        self.engine = None
+        self.deadline = None
+        self.cache = None
+        self.cache_key = None
+        self.watch_interval = None
+        self.max_backoff = None
+        self.publish_file = None
+        self.publish_socket = None
+        self.published = ''
+        self.rank = False
+        self.rank_probes = None
+        self.rank_by = None
+        self.method = 'GET'
+        self.ping_method = 'exec'
+        self.session = None
+        self.prober = None
         self.queue = queue.Queue()
         self.pool = None
 
@@ -177,6 +398,14 @@ class FindActiveServer(CLI):
         self.add_opt('-r', '--regex',
                      help='Regex to search for in http content (optional). Case sensitive by default ' + \
                           'for better targeting, wrap with (?i:...) modifier for case insensitivity')
+        self.add_opt('-m', '--method', choices=['GET', 'HEAD', 'RANGE'], default='GET',
+                     help='HTTP method to check with when not using --regex, RANGE is a GET of just the first byte ' +
+                     '(default: GET, choices: GET, HEAD, RANGE)')
+        self.add_opt('-I', '--ping-method', choices=['auto', 'icmp', 'tcp', 'exec'], default='auto',
+                     help='How to --ping: icmp sends echo requests in-process from an unprivileged ICMP socket ' +
+                     '(asyncio engine only), tcp connects to --port and counts a refused connection as up, ' +
+                     'exec runs the ping command per host, auto uses icmp where permitted or else exec ' +
+                     '(default: auto)')
         self.add_common_opts()
 
     # only here for subclassed programs convenience
@@ -200,6 +429,41 @@ class FindActiveServer(CLI):
                      help='Timeout for each individual server request in seconds ($REQUEST_TIMEOUT, default: 2 secs)')
         self.add_opt('-R', '--random', action='store_true', help='Randomize order of hosts tested ' +
                      '(for use with --num-threads=1)')
+        engines = ['threads']
+        if AsyncProber is not None:
+            engines.insert(0, 'asyncio')
+        self.add_opt('-e', '--engine', choices=engines, default=engines[0],
+                     help='Probe engine, asyncio runs all checks on one event loop and cancels outstanding probes ' +
+                     'as soon as one succeeds (Python 3 only), threads uses a thread pool and is always used for ' +
+                     'http checks through a proxy from $HTTP_PROXY / $HTTPS_PROXY ' +
+                     '(default: {0}, choices: {1})'.format(engines[0], ', '.join(engines)))
+        self.add_opt('-d', '--deadline', metavar='secs', type='int',
+                     help='Overall time limit in seconds to find an available server, after which outstanding ' +
+                     'probes are abandoned and NO_AVAILABLE_SERVER is returned (optional)')
+        self.add_opt('-c', '--cache-ttl', metavar='secs', type='int', default=os.getenv('FIND_ACTIVE_CACHE_TTL'),
+                     help='Cache the answer for this many seconds, re-verifying a cached answer with a single ' +
+                     'probe before returning it ($FIND_ACTIVE_CACHE_TTL, default: no caching)')
+        self.add_opt('-C', '--cache-file', metavar='file',
+                     default=os.getenv('FIND_ACTIVE_CACHE_FILE',
+                                       os.path.expanduser('~/.find_active_server.cache.json')),
+                     help='Cache file shared by all the find_active_*.py tools ' +
+                     '($FIND_ACTIVE_CACHE_FILE, default: ~/.find_active_server.cache.json)')
+        self.add_opt('-W', '--watch', metavar='secs', type='int',
+                     help='Run as a watcher daemon, re-probing every N seconds and publishing the current answer ' +
+                     'to --publish-file / --publish-socket')
+        self.add_opt('-B', '--max-backoff', metavar='secs', type='int', default=60,
+                     help='Maximum poll interval to back off to in --watch mode while no server is available ' +
+                     '(default: 60)')
+        self.add_opt('-O', '--publish-file', metavar='file',
+                     help='File to atomically write the current answer to in --watch mode')
+        self.add_opt('-U', '--publish-socket', metavar='path',
+                     help='Unix domain socket to serve the current answer on in --watch mode')
+        self.add_opt('-k', '--rank', action='store_true',
+                     help='Probe every host several times and print all healthy hosts ordered by latency')
+        self.add_opt('-K', '--rank-probes', metavar='num', type='int', default=5,
+                     help='Number of times to probe each host in --rank mode (default: 5)')
+        self.add_opt('-Y', '--rank-by', choices=['p50', 'p95'], default='p50',
+                     help='Latency percentile to order hosts by in --rank mode (default: p50, choices: p50, p95)')
 
     def process_options(self):
         self.validate_common_opts()
@@ -241,7 +505,9 @@ class FindActiveServer(CLI):
         if self.is_option_defined('ping') and self.get_opt('ping'):
             if self.protocol:
                 self.usage('cannot specify --ping with --http / --https, mutually exclusive tests!')
-            elif self.port != self.default_port:
+            if self.is_option_defined('ping_method'):
+                self.ping_method = self.get_opt('ping_method')
+            if self.port != self.default_port and self.ping_method != 'tcp':
                 self.usage('cannot specify --port with --ping, mutually exclusive options!')
             self.protocol = 'ping'
         if self.protocol and self.protocol not in ('http', 'https', 'ping'):
@@ -256,19 +522,275 @@ class FindActiveServer(CLI):
             validate_regex(self.regex)
             self.regex = re.compile(self.regex)
 
+        if self.is_option_defined('method') and self.get_opt('method'):
+            self.method = self.get_opt('method')
+        if self.method != 'GET':
+            if self.protocol not in ('http', 'https'):
+                self.usage('--method requires --http / --https')
+            if self.regex:
+                self.usage('--method {0} cannot be used with --regex, which needs the content'.format(self.method))
+            log_option('method', self.method)
+
+        self.engine = self.get_opt('engine')
+        if self.engine == 'asyncio' and self.protocol in ('http', 'https') and self.uses_proxy():
+            log.info('proxy set in environment for some of the hosts, which the asyncio engine does not support, ' +
+                     'falling back to threads engine')
+            self.engine = 'threads'
+        log_option('engine', self.engine)
+
         self.num_threads = self.get_opt('num_threads')
-        validate_int(self.num_threads, 'num threads', 1, 100)
+        # coroutines are cheap enough to run many more probes concurrently than threads
+        validate_int(self.num_threads, 'num threads', 1, 1000 if self.engine == 'asyncio' else 100)
         self.num_threads = int(self.num_threads)
 
+        if self.protocol == 'ping':
+            self.validate_ping_method()
+
+        if self.protocol in ('http', 'https'):
+            # shared keep-alive connection pool across all threads and repeated checks
+            self.session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=max(len(self.host_list), 10),
+                                                    pool_maxsize=self.num_threads)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+        self.deadline = self.get_opt('deadline')
+        if self.deadline is not None:
+            validate_int(self.deadline, 'deadline', 1)
+            self.deadline = int(self.deadline)
+
         self.request_timeout = self.get_opt('request_timeout')
         validate_int(self.request_timeout, 'request timeout', 1, 60)
         self.request_timeout = int(self.request_timeout)
 
+        cache_ttl = self.get_opt('cache_ttl')
+        if cache_ttl:
+            validate_int(cache_ttl, 'cache ttl', 1)
+            cache_file = self.get_opt('cache_file')
+            log_option('cache file', cache_file)
+            self.cache = ResultCache(cache_file, int(cache_ttl))
+            # before --random shuffles the host list so the same hosts always share a cache entry
+            self.cache_key = ResultCache.make_key(self.__class__.__name__,
+                                                  sorted(self.host_list),
+                                                  self.port,
+                                                  self.protocol,
+                                                  self.url_path,
+                                                  self.regex.pattern if self.regex else None)
+
         if self.get_opt('random'):
             log_option('random', True)
             shuffle(self.host_list)
 
+        self.watch_interval = self.get_opt('watch')
+        self.publish_file = self.get_opt('publish_file')
+        self.publish_socket = self.get_opt('publish_socket')
+        if self.watch_interval is not None:
+            validate_int(self.watch_interval, 'watch interval', 1)
+            self.watch_interval = int(self.watch_interval)
+            self.max_backoff = self.get_opt('max_backoff')
+            validate_int(self.max_backoff, 'max backoff', self.watch_interval)
+            self.max_backoff = int(self.max_backoff)
+            log_option('publish file', self.publish_file)
+            log_option('publish socket', self.publish_socket)
+        elif self.publish_file or self.publish_socket:
+            self.usage('--publish-file / --publish-socket require --watch')
+
+        self.rank = self.get_opt('rank')
+        if self.rank:
+            if self.watch_interval:
+                self.usage('--rank and --watch are mutually exclusive')
+            self.rank_probes = self.get_opt('rank_probes')
+            validate_int(self.rank_probes, 'rank probes', 1, 1000)
+            self.rank_probes = int(self.rank_probes)
+            self.rank_by = self.get_opt('rank_by')
+            log_option('rank probes', self.rank_probes)
+            log_option('rank by', self.rank_by)
+
+    def uses_proxy(self):
+        """
+        Returns True if the requests library would send any of the http checks through a proxy from the environment,
+        ie. $HTTP_PROXY / $HTTPS_PROXY / $ALL_PROXY not bypassed by $NO_PROXY
+        """
+        for (host, port) in self.host_port_list():
+            url = '{0}://{1}:{2}/'.format(self.protocol, host, port)
+            if requests.utils.select_proxy(url, requests.utils.get_environ_proxies(url)):
+                return True
+        return False
+
+    def validate_ping_method(self):
+        if self.ping_method == 'auto':
+            if self.engine == 'asyncio' and icmp_permitted():
+                self.ping_method = 'icmp'
+            else:
+                self.ping_method = 'exec'
+        elif self.ping_method == 'icmp':
+            if self.engine != 'asyncio':
+                self.usage('--ping-method icmp requires --engine asyncio')
+            if not icmp_permitted():
+                self.usage('unprivileged ICMP sockets are not permitted for this user, check sysctl ' +
+                           'net.ipv4.ping_group_range includes one of your groups or use --ping-method tcp / exec')
+        log_option('ping method', self.ping_method)
+
     def run(self):
+        if self.rank:
+            self.run_rank()
+        if self.watch_interval:
+            self.watch()
+        if self.cache:
+            self.check_cached()
+        self.handle_result(self.find_active())
+        if not self.get_opt('quiet'):
+            print('NO_AVAILABLE_SERVER')
+        sys.exit(1)
+
+    def find_active(self):
+        if self.engine == 'asyncio':
+            return self.run_asyncio()
+        return self.run_threads()
+
+    def run_asyncio(self):
+        prober = self.get_prober()
+        # generator so each probe coroutine is only created when there is a free slot to run it
+        probes = (self.async_probe(prober, host, port) for (host, port) in self.host_port_list())
+        try:
+            return_val = prober.first_success(probes, self.num_threads, self.deadline)
+        except OSError as _:
+            die(str(_))
+        return return_val
+
+    def get_prober(self):
+        # kept across runs so keep-alive connections can be reused in --watch mode
+        if self.prober is None:
+            self.prober = AsyncProber(regex=self.regex,
+                                      request_timeout=self.request_timeout,
+                                      method=self.method,
+                                      matcher_class=RegexStreamMatcher)
+        return self.prober
+
+    def async_probe(self, prober, host, port):
+        if self.protocol in ('http', 'https'):
+            return prober.check_http(host, port, self.protocol, self.url_path)
+        elif self.protocol == 'ping':
+            if self.ping_method == 'icmp':
+                return prober.check_icmp(host)
+            elif self.ping_method == 'tcp':
+                return prober.check_tcp_ping(host, port)
+            return prober.check_ping(host, self.ping_cmd(host, 1, self.request_timeout))
+        return prober.check_socket(host, port)
+
+    def run_rank(self):
+        hosts = list(self.host_port_list())
+        # interleave the rounds to spread the load on each host
+        jobs = [(host, port) for _ in range(self.rank_probes) for (host, port) in hosts]
+        log.info('running %s probes', len(jobs))
+        if self.engine == 'asyncio':
+            prober = self.get_prober()
+            probes = [prober.timed(self.async_probe(prober, host, port)) for (host, port) in jobs]
+            try:
+                results = prober.run_all(probes, self.num_threads, self.deadline)
+            except OSError as _:
+                die(str(_))
+        else:
+            results = self.run_threads_all(jobs)
+        latencies = dict([(host_port, []) for host_port in hosts])
+        for (host_port, result) in zip(jobs, results):
+            if result and result[0]:
+                latencies[host_port].append(result[1])
+        ranking = []
+        for (host, port) in hosts:
+            samples = sorted(latencies[(host, port)])
+            if not samples:
+                log.info("host '%s' port '%s' failed all probes", host, port)
+                continue
+            # ping results have no port
+            name = host if self.protocol == 'ping' else self.format_result(host, port)
+            ranking.append((self.rank_probes - len(samples),
+                            percentile(samples, 50),
+                            percentile(samples, 95),
+                            name))
+        if not ranking:
+            if not self.get_opt('quiet'):
+                print('NO_AVAILABLE_SERVER')
+            sys.exit(1)
+        if self.rank_by == 'p95':
+            ranking.sort(key=lambda _: (_[0], _[2], _[1]))
+        else:
+            ranking.sort(key=lambda _: (_[0], _[1], _[2]))
+        width = max([len(_[3]) for _ in ranking])
+        for (failures, p50, p95, name) in ranking:
+            print('{0:{width}}  {1:8.1f}  {2:8.1f}  {3}/{4}'.format(name,
+                                                                    p50 * 1000,
+                                                                    p95 * 1000,
+                                                                    self.rank_probes - failures,
+                                                                    self.rank_probes,
+                                                                    width=width))
+        sys.exit(0)
+
+    def run_threads_all(self, jobs):
+        """
+        Runs all the (host, port) jobs on the thread pool returning a list of (result, secs) in the same order,
+        with None for any not completed before the deadline
+        """
+        self.pool = ThreadPool(processes=self.num_threads)
+        async_results = [self.pool.apply_async(self.timed_check, job) for job in jobs]
+        self.pool.close()
+        end_time = None
+        if self.deadline:
+            end_time = time.time() + self.deadline
+        results = []
+        for async_result in async_results:
+            try:
+                if end_time is None:
+                    results.append(async_result.get())
+                else:
+                    results.append(async_result.get(timeout=max(end_time - time.time(), 0)))
+            except multiprocessing.TimeoutError:
+                results.append(None)
+        return results
+
+    def timed_check(self, host, port):
+        start = time.time()
+        result = self.check_host(host, port)
+        return (result, time.time() - start)
+
+    def check_cached(self):
+        return_val = self.cache.get(self.cache_key)
+        if not return_val:
+            log.info('no cached answer')
+            return
+        log.info('re-verifying cached answer: %s', return_val)
+        if isTuple(return_val):
+            (host, port) = return_val
+        else:
+            (host, port) = (return_val, None)
+        if self.check_host(host, port):
+            # finish directly rather than via handle_result() to not refresh the cache entry's age
+            self.finish(host, port)
+        log.info('cached answer failed verification, probing all hosts')
+
+    def check_host(self, host, port):
+        if self.protocol in ('http', 'https'):
+            return self.check_http(host, port, self.url_path)
+        elif self.protocol == 'ping':
+            if self.ping_method == 'icmp':
+                prober = self.get_prober()
+                try:
+                    return prober.first_success([prober.check_icmp(host)], 1)
+                except OSError as _:
+                    die(str(_))
+            elif self.ping_method == 'tcp':
+                # ping results have no port so re-verifying a cached or watched answer uses the default
+                return self.check_tcp_ping(host, port or self.port)
+            return self.check_ping(host, 1, self.request_timeout)
+        return self.check_socket(host, port)
+
+    def host_port_list(self):
+        for host in self.host_list:
+            # this also strips the :port from host
+            yield self.port_override(host)
+
+    def run_threads(self):
+        self.queue = queue.Queue()
         self.pool = ThreadPool(processes=self.num_threads)
         if self.protocol in ('http', 'https'):
             for host in self.host_list:
@@ -282,17 +804,19 @@ class FindActiveServer(CLI):
                 (host, port) = self.port_override(host)
                 #if self.check_ping(host):
                 #    self.finish(host)
-                self.launch_thread(self.check_ping, host, 1, self.request_timeout)
+                if self.ping_method == 'tcp':
+                    self.launch_thread(self.check_tcp_ping, host, port)
+                else:
+                    self.launch_thread(self.check_ping, host, 1, self.request_timeout)
         else:
             for host in self.host_list:
                 (host, port) = self.port_override(host)
                 #if self.check_socket(host, port):
                 #    self.finish(host, port)
                 self.launch_thread(self.check_socket, host, port)
-        self.collect_results()
-        if not self.get_opt('quiet'):
-            print('NO_AVAILABLE_SERVER')
-        sys.exit(1)
+        # lets the threads exit once any still running checks complete instead of accumulating in --watch mode
+        self.pool.close()
+        return self.collect_results()
 
     def launch_thread(self, func, *args):
         # works but no tunable concurrency
@@ -307,14 +831,31 @@ class FindActiveServer(CLI):
         #async_result = pool.apply_async(self.check_ping, (host,))
         #return_val = async_result.get()
         #
-        self.pool.apply_async(lambda *args: self.queue.put(func(*args)), args)
+        # bind this run's queue so late results can't leak in to the next run in --watch mode
+        que = self.queue
+        self.pool.apply_async(lambda *args: que.put(func(*args)), args)
 
     def collect_results(self):
         return_val = None
+        end_time = None
+        if self.deadline:
+            end_time = time.time() + self.deadline
         for _ in self.host_list:
-            return_val = self.queue.get()
+            try:
+                if end_time is None:
+                    return_val = self.queue.get()
+                else:
+                    return_val = self.queue.get(timeout=max(end_time - time.time(), 0))
+            except queue.Empty:
+                log.info('deadline of %s secs reached', self.deadline)
+                return None
             if return_val:
                 break
+        return return_val
+
+    def handle_result(self, return_val):
+        if return_val and self.cache:
+            self.cache.set(self.cache_key, return_val)
         if return_val:
             if isTuple(return_val):
                 self.finish(*return_val)
@@ -337,12 +878,102 @@ class FindActiveServer(CLI):
         return (host, port)
 
     def finish(self, host, port=None):
-        print(host, end='')
-        if port is not None and port != self.port:
-            print(':{0}'.format(port), end='')
-        print()
+        print(self.format_result(host, port))
         sys.exit(0)
 
+    def format_result(self, host, port=None):
+        if port is not None and port != self.port:
+            return '{0}:{1}'.format(host, port)
+        return host
+
+    def watch(self):
+        # the global --timeout applies to a single lookup, not to the lifetime of the watcher
+        if hasattr(signal, 'alarm'):
+            signal.alarm(0)
+        # exit cleanly on kill to remove the socket file
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        log.info('watching every %s secs', self.watch_interval)
+        server = None
+        # sentinel so the first result is always published, even if it's None
+        current = object()
+        return_val = None
+        interval = self.watch_interval
+        try:
+            while True:
+                if return_val:
+                    (host, port) = return_val if isTuple(return_val) else (return_val, None)
+                    if not self.check_host(host, port):
+                        log.info('active server %s failed verification, probing all hosts', current)
+                        return_val = None
+                if not return_val:
+                    return_val = self.find_active()
+                active = None
+                if return_val:
+                    if self.cache:
+                        self.cache.set(self.cache_key, return_val)
+                    if isTuple(return_val):
+                        active = self.format_result(*return_val)
+                    else:
+                        active = self.format_result(return_val)
+                if active != current:
+                    print('{0}  {1}'.format(time.strftime('%Y-%m-%d %H:%M:%S'), active or 'NO_AVAILABLE_SERVER'))
+                    sys.stdout.flush()
+                    current = active
+                    self.publish(active)
+                if server is None and self.publish_socket:
+                    server = self.start_socket_server()
+                if active:
+                    interval = self.watch_interval
+                else:
+                    interval = min(interval * 2, self.max_backoff)
+                    log.info('no available server, backing off to %s secs', interval)
+                time.sleep(interval)
+        finally:
+            if server is not None:
+                server.close()
+                os.unlink(self.publish_socket)
+
+    def publish(self, active):
+        if active:
+            self.published = active + '\n'
+        elif self.get_opt('quiet'):
+            self.published = ''
+        else:
+            self.published = 'NO_AVAILABLE_SERVER\n'
+        if self.publish_file:
+            # write and rename so readers never see a partially written file
+            tmp = '{0}.tmp.{1}'.format(self.publish_file, os.getpid())
+            with open(tmp, 'w') as filehandle:
+                filehandle.write(self.published)
+            os.rename(tmp, self.publish_file)
+
+    def start_socket_server(self):
+        if os.path.exists(self.publish_socket):
+            if not stat.S_ISSOCK(os.stat(self.publish_socket).st_mode):
+                die("--publish-socket '{0}' already exists and is not a socket".format(self.publish_socket))
+            os.unlink(self.publish_socket)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.publish_socket)
+        server.listen(128)
+        thread = Thread(target=self.serve_socket, args=(server,))
+        thread.daemon = True
+        thread.start()
+        return server
+
+    def serve_socket(self, server):
+        while True:
+            try:
+                (conn, _) = server.accept()
+            except socket.error:
+                # server socket closed on exit
+                return
+            try:
+                conn.sendall(self.published.encode('utf-8'))
+            except socket.error as _:
+                log.debug('failed to send to socket client: %s', _)
+            finally:
+                conn.close()
+
     @staticmethod
     def check_ping(host, count=None, wait=None):
         if count is None:
@@ -356,14 +987,7 @@ class FindActiveServer(CLI):
             raise UnknownError("passed invalid wait '{0}' to check_ping method, must be a valid integer!"\
                                .format(wait))
         log.info("pinging host '%s' (count=%s, wait=%s)", host, count, wait)
-        count_switch = '-c'
-        if platform.system().lower() == 'windows':
-            count_switch = '-n'
-        wait_switch = '-w'
-        if platform.system().lower() == 'darwin':
-            wait_switch = '-W'
-        # causes hang if count / wait are not cast to string
-        cmd = ['ping', count_switch, '{0}'.format(count), wait_switch, '{0}'.format(wait), host]
+        cmd = FindActiveServer.ping_cmd(host, count, wait)
         log.debug('cmd: %s', ' '.join(cmd))
         #log.debug('args: %s', cmd)
         try:
@@ -385,6 +1009,28 @@ class FindActiveServer(CLI):
             die('error calling ping: {0}'.format(_))
         return None
 
+    @staticmethod
+    def ping_cmd(host, count, wait):
+        count_switch = '-c'
+        if platform.system().lower() == 'windows':
+            count_switch = '-n'
+        wait_switch = '-w'
+        if platform.system().lower() == 'darwin':
+            wait_switch = '-W'
+        # causes hang if count / wait are not cast to string
+        return ['ping', count_switch, '{0}'.format(count), wait_switch, '{0}'.format(wait), host]
+
+    def check_tcp_ping(self, host, port):
+        log.info("TCP pinging host '%s' port '%s'", host, port)
+        try:
+            socket.create_connection((host, int(port)), self.request_timeout).close()
+        except socket.error as _:
+            # a reset means the host is up, there just isn't anything listening on the port
+            if _.errno != errno.ECONNREFUSED:
+                return None
+        log.info("host '%s' responded to TCP ping", host)
+        return host
+
     def check_socket(self, host, port):
         log.info("checking host '%s' port '%s' socket", host, port)
         try:
@@ -406,19 +1052,41 @@ class FindActiveServer(CLI):
                                                              host=host,
                                                              port=port,
                                                              url_path=url_path.lstrip('/'))
-        log.info('GET %s', url)
+        log.info('%s %s', self.method, url)
+        headers = {}
+        if self.method == 'RANGE':
+            headers['Range'] = 'bytes=0-0'
         try:
             # timeout here isn't total timeout, it's response time
-            req = requests.get(url, timeout=self.request_timeout)
+            # stream so the body is only downloaded as far as is needed
+            req = self.session.request('HEAD' if self.method == 'HEAD' else 'GET',
+                                       url,
+                                       headers=headers,
+                                       timeout=self.request_timeout,
+                                       allow_redirects=True,
+                                       stream=True)
         except requests.exceptions.RequestException as _:
             log.info('%s - returned exception: %s', url, _)
             return False
         except IOError as _:
             log.info('%s - returned IOError: %s', url, _)
             return False
+        try:
+            return self.check_http_response(req, url, host, port)
+        except requests.exceptions.RequestException as _:
+            log.info('%s - returned exception: %s', url, _)
+            return False
+        except IOError as _:
+            log.info('%s - returned IOError: %s', url, _)
+            return False
+        finally:
+            # returns the connection to the pool if the body was read fully, otherwise closes it
+            req.close()
+
+    def check_http_response(self, req, url, host, port):
         log.debug("%s - response: %s %s", url, req.status_code, req.reason)
-        log.debug("%s - content:\n%s\n%s\n%s", url, '='*80, req.content.strip(), '='*80)
-        if req.status_code != 200:
+        ok_status_codes = (200, 206) if self.method == 'RANGE' else (200,)
+        if req.status_code not in ok_status_codes:
             log.info('%s - status code %s != 200', url, req.status_code)
             return None
         if self.regex:
@@ -427,11 +1095,23 @@ class FindActiveServer(CLI):
             # of the expected compiled regex, then .search() will hang
             if isStr(self.regex):
                 die('string found instead of expected compiled regex!')
-            if self.regex.search(req.content):
+            if req.encoding is None:
+                req.encoding = 'utf-8'
+            matcher = RegexStreamMatcher(self.regex)
+            for chunk in req.iter_content(chunk_size=8192, decode_unicode=True):
+                if matcher.feed(chunk):
+                    break
+            else:
+                matcher.finish()
+            log.debug("%s - content:\n%s\n%s\n%s", url, '='*80, matcher.text.strip(), '='*80)
+            if matcher.matched:
                 log.info('%s - regex matched http output', url)
             else:
                 log.info('%s - regex did not match http output', url)
                 return None
+        elif self.method in ('HEAD', 'RANGE'):
+            # no body or just the one byte, reading it lets the connection be reused
+            _ = req.content
         log.info("%s - passed all checks", url)
         return (host, port)
 
@@ -21,6 +21,11 @@ Tool to iterate on and major compact all HBase tables (to be scheduled and calle
 This is a pythonic rewrite of an old best practice from a few years back when I worked for Cloudera for off-peak
 compactions to prevent them impacting peak hours.
 
+The --schedule mode compacts only --jobs tables at a time, biggest first, waiting for each table's compaction to
+actually finish according to the RegionServer JMX region metrics and while any RegionServer's compaction queue, flush
+queue or request rate is over its limit, and doesn't start any more tables after the --window-end time so the last
+compaction doesn't run in to business hours. The RegionServers are found from the table regions if not given
+
 Uses the HBase Thrift server. For versions older than HBase 0.96+ or using modified protocols, the connection
 protocol / compat / transport settings will need to be adjusted.
 
@@ -37,6 +42,7 @@ import logging
 import os
 import re
 import sys
+import threading
 import traceback
 import socket
 try:
@@ -57,19 +63,22 @@ except ImportError as _:
           + traceback.format_exc(), end='')
     sys.exit(4)
 srcdir = os.path.abspath(os.path.dirname(__file__))
-libdir = os.path.join(srcdir, 'pylib')
-sys.path.append(libdir)
+pylib = os.path.join(srcdir, 'pylib')
+lib = os.path.join(srcdir, 'lib')
+sys.path.append(pylib)
+sys.path.append(lib)
 try:
     # pylint: disable=wrong-import-position
     from harisekhon.utils import log, die
     from harisekhon.utils import validate_host, validate_port, validate_regex
     from harisekhon import CLI
+    from hbase_maintenance_scheduler import HBaseMaintenanceScheduler
 except ImportError as _:
     print(traceback.format_exc(), end='')
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.4.1'
+__version__ = '0.5.0'
 
 
 class HBaseCompactTables(CLI):
@@ -84,6 +93,9 @@ class HBaseCompactTables(CLI):
         self.port = 9090
         self.table_regex = None
         self.timeout_default = 6 * 3600
+        self.scheduler = HBaseMaintenanceScheduler(self, 'compact')
+        # happybase connections aren't thread safe and the --schedule mode jobs share the one connection
+        self.conn_lock = threading.Lock()
 
     def add_options(self):
         self.add_hostoption(name='HBase Thrift Server', default_host='localhost', default_port=self.port)
@@ -91,6 +103,7 @@ class HBaseCompactTables(CLI):
                      '. Highly recommended to use this to compact a different subset of tables each night' +
                      ' to prevent the last running compaction running in to business hours')
         self.add_opt('-l', '--list-tables', action='store_true', help='List tables and exit')
+        self.scheduler.add_options()
 
     def process_args(self):
         log.setLevel(logging.INFO)
@@ -106,6 +119,7 @@ class HBaseCompactTables(CLI):
             validate_regex(regex)
             self.table_regex = re.compile(regex, re.I)
             log.info("filtering to compact only tables matching regex \'%s\'", regex)
+        self.scheduler.process_options(regionservers_required=False)
 
     def get_tables(self):
         try:
@@ -126,11 +140,14 @@ class HBaseCompactTables(CLI):
         if self.get_opt('list_tables'):
             print('Tables:\n\n' + '\n'.join(tables))
             sys.exit(3)
-        for table in tables:
-            if self.table_regex:
-                if self.table_regex.search(table):
-                    self.compact_table(table)
-            else:
+        if self.table_regex:
+            tables = [table for table in tables if self.table_regex.search(table)]
+        if self.scheduler.enabled:
+            if not self.scheduler.regionservers:
+                self.scheduler.regionservers = self.get_regionservers(tables)
+            self.scheduler.run(tables, self.compact_table_and_wait)
+        else:
+            for table in tables:
                 self.compact_table(table)
         log.info('finished, closing connection')
         self.conn.close()
@@ -142,6 +159,28 @@ class HBaseCompactTables(CLI):
         except (socket.timeout, ThriftException, HBaseIOError) as _:
             die('ERROR while trying to compact table \'{0}\': {1}'.format(table, _))
 
+    def get_regionservers(self, tables):
+        regionservers = set()
+        for table in tables:
+            try:
+                for region in self.conn.table(table).regions():
+                    regionservers.add('{0}:{1}'.format(region['server_name'], self.scheduler.port))
+            except (socket.timeout, ThriftException, HBaseIOError) as _:
+                die('ERROR while trying to get regions for table \'{0}\': {1}'.format(table, _))
+        if not regionservers:
+            die('ERROR: no RegionServers found serving the regions of the tables to compact')
+        regionservers = sorted(regionservers)
+        log.info('found RegionServers: %s', ', '.join(regionservers))
+        return regionservers
+
+    def compact_table_and_wait(self, table):
+        # exceptions are reported by the scheduler, which compacts the rest of the tables
+        baseline = self.scheduler.get_region_metrics()
+        log.info("major compacting table '%s'", table)
+        with self.conn_lock:
+            self.conn.compact_table(table, major=True)
+        return self.scheduler.wait_for_compaction(table, baseline)
+
 
 if __name__ == '__main__':
     HBaseCompactTables().main()
@@ -27,6 +27,10 @@ Written for flushing bulk imports skipping the WAL, for example OpenTSDB bulk im
 
 The Thrift API doesn't support this action so it uses the HBase shell locally which must be in the $PATH
 
+The --schedule mode flushes only --jobs tables at a time, each in its own HBase shell, biggest memstores first,
+waiting while any RegionServer's compaction queue, flush queue or request rate is over its limit according to the JMX
+stats of the given --regionservers, and doesn't start any more tables after the --window-end time
+
 There is also a shell script version of this in the adjacent DevOps-Perl-Tools repo
 
 Tested on Hortonworks HDP 2.3 (HBase 1.1.2) and Apache HBase 1.0.3, 1.1.6, 1.2.1, 1.2.2, 1.3.1
@@ -42,22 +46,27 @@ import logging
 import os
 import re
 import sys
+import threading
 import traceback
 import subprocess
 PIPE = subprocess.PIPE
-libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
-sys.path.append(libdir)
+srcdir = os.path.abspath(os.path.dirname(__file__))
+pylib = os.path.join(srcdir, 'pylib')
+lib = os.path.join(srcdir, 'lib')
+sys.path.append(pylib)
+sys.path.append(lib)
 try:
     # pylint: disable=wrong-import-position
     from harisekhon.utils import log, die, autoflush
     from harisekhon.utils import validate_regex
     from harisekhon import CLI
+    from hbase_maintenance_scheduler import HBaseMaintenanceScheduler
 except ImportError as _:
     print(traceback.format_exc(), end='')
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.1'
+__version__ = '0.2.0'
 
 
 class HBaseFlushTables(CLI):
@@ -69,13 +78,18 @@ class HBaseFlushTables(CLI):
         # super().__init__()
         self.table_list_header_regex = re.compile('TABLE')
         self.table_list_end_regex = re.compile(r'row.*\sin\s.*\sseconds')
+        self.error_regex = re.compile(r'^ERROR.*$', re.M)
         self.table_regex = None
         self.timeout_default = 6 * 3600
+        self.scheduler = HBaseMaintenanceScheduler(self, 'flush')
+        # keeps the output of concurrent --schedule mode flushes from interleaving
+        self.print_lock = threading.Lock()
         autoflush()
 
     def add_options(self):
         self.add_opt('-r', '--regex', help='Regex of tables to flush')
         self.add_opt('-l', '--list-tables', action='store_true', help='List tables and exit')
+        self.scheduler.add_options()
 
     def process_args(self):
         log.setLevel(logging.INFO)
@@ -85,14 +99,22 @@ class HBaseFlushTables(CLI):
             validate_regex(regex)
             self.table_regex = re.compile(regex, re.I)
             log.info('filtering to flush only tables matching regex \'{0}\''.format(regex))
+        self.scheduler.process_options()
+
+    @staticmethod
+    def hbase_shell(commands):
+        # by having stdout and stderr go to the same place more likely the output will be in a sane order
+        process = subprocess.Popen(['hbase', 'shell'], stdin=PIPE, stdout=PIPE, stderr=subprocess.STDOUT,
+                                   universal_newlines=True)
+        (stdout, _) = process.communicate(input=commands)
+        process.wait()
+        return (process.returncode, stdout)
 
     def get_tables(self):
         log.info('getting table list')
         try:
-            process = subprocess.Popen(['hbase', 'shell'], stdin=PIPE, stdout=PIPE, stderr=subprocess.STDOUT)
-            (stdout, _) = process.communicate('list')
-            process.wait()
-            if process.returncode != 0:
+            (returncode, stdout) = self.hbase_shell('list')
+            if returncode != 0:
                 print('ERROR:', end='')
                 die(stdout)
             lines = stdout.split('\n')
@@ -134,15 +156,15 @@ class HBaseFlushTables(CLI):
                     tables_to_flush.add(table)
         else:
             tables_to_flush = sorted(list(tables))
+        if self.scheduler.enabled:
+            self.scheduler.run(tables_to_flush, self.flush_table)
+            return
         if log.isEnabledFor(logging.INFO):
             log.info('Flushing tables:\n\n%s\n', '\n'.join(tables_to_flush))
         flush_commands = '\n'.join(["flush '{0}'".format(table) for table in tables_to_flush])
         try:
-            # by having stdout and stderr go to the same place more likely the output will be in a sane order
-            process = subprocess.Popen(['hbase', 'shell'], stdin=PIPE, stdout=PIPE, stderr=subprocess.STDOUT)
-            (stdout, _) = process.communicate(input=flush_commands)
-            process.wait()
-            if process.returncode != 0:
+            (returncode, stdout) = self.hbase_shell(flush_commands)
+            if returncode != 0:
                 print('ERROR:', end='')
                 die(stdout)
             print(stdout)
@@ -153,6 +175,16 @@ class HBaseFlushTables(CLI):
             print(_.output)
             sys.exit(_.returncode)
 
+    def flush_table(self, table):
+        # runs in the --schedule mode worker threads so raises for the scheduler to report instead of exiting
+        (returncode, stdout) = self.hbase_shell("flush '{0}'".format(table))
+        with self.print_lock:
+            print(stdout)
+        # older HBase shells exit zero even when the command fails
+        error = self.error_regex.search(stdout)
+        if returncode != 0 or error:
+            raise IOError('hbase shell exit code {0}: {1}'.format(returncode, error.group(0) if error else stdout))
+
 
 if __name__ == '__main__':
     HBaseFlushTables().main()
@@ -21,7 +21,15 @@ Tool to generate some random data in HBase for test purposes
 Uses the HBase Thrift server. For versions older than HBase 0.96+ or using modified protocols, the connection
 protocol / compat / transport settings will need to be adjusted.
 
-Prints a dot for every 100 rows sent to let you know it's still working.
+Rows are sent in batches of --batch-size rows per Thrift call by --threads writer threads in parallel, each with its own
+connection, for realistic ingest rates when load testing. Row keys and values are generated in bulk from random bytes,
+using the characters [A-Za-z0-9_-]. Reports rows/sec and MB/sec for each writer thread and in total.
+
+--pre-split creates the table pre-split in to N regions evenly across the random row key space to test ingest spread
+across all RegionServers. As the Thrift API can't create pre-split tables this uses the 'hbase shell' command, which
+must be in the $PATH and configured for the same cluster.
+
+Prints a dot for every batch of rows sent to let you know it's still working.
 
 Tested on Hortonworks HDP 2.3 (HBase 1.1.2) and Apache HBase 1.0.3, 1.1.6, 1.2.1, 1.2.2, 1.3.1
 
@@ -33,11 +41,14 @@ from __future__ import print_function
 #from __future__ import unicode_literals
 
 #import logging
+import base64
 import os
+import subprocess
 import sys
 import time
 import traceback
 import socket
+from multiprocessing.pool import ThreadPool
 try:
     # pylint: disable=wrong-import-position
     import happybase  # pylint: disable=unused-import
@@ -61,7 +72,7 @@ libdir = os.path.join(srcdir, 'pylib')
 sys.path.append(libdir)
 try:
     # pylint: disable=wrong-import-position
-    from harisekhon.utils import log, die, random_alnum, autoflush, log_option
+    from harisekhon.utils import log, die, autoflush, log_option, which
     from harisekhon.utils import validate_host, validate_port, validate_database_tablename, validate_int
     from harisekhon import CLI
 except ImportError as _:
@@ -69,7 +80,19 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.5.2'
+__version__ = '0.6.0'
+
+# sorted characters of the urlsafe base64 random row keys, to calculate evenly spread split points
+KEY_CHARS = ''.join(sorted('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'))
+
+
+def random_strings(count, length):
+    """
+    Returns a list of count random byte strings of length [A-Za-z0-9_-] characters, generated in bulk from random bytes
+    """
+    # base64 encodes every 3 bytes to 4 characters
+    data = base64.urlsafe_b64encode(os.urandom((count * length * 3 + 3) // 4))
+    return [data[i * length:(i + 1) * length] for i in range(count)]
 
 
 class HBaseGenerateData(CLI):
@@ -88,6 +111,8 @@ class HBaseGenerateData(CLI):
         self.default_key_length = 20
         self.default_value_length = 40
         self.default_skew_pc = 90
+        self.default_batch_size = 1000
+        self.default_threads = 4
         self.table = self.default_table_name
         self.num_rows = self.default_num_rows
         self.key_length = self.default_key_length
@@ -96,6 +121,9 @@ class HBaseGenerateData(CLI):
         self.skew_pc = self.default_skew_pc
         self.drop_table = False
         self.use_existing_table = False
+        self.batch_size = self.default_batch_size
+        self.threads = self.default_threads
+        self.pre_split = None
         self.column_family = 'cf1'
         self.timeout_default = 6 * 3600
         autoflush()
@@ -120,6 +148,13 @@ class HBaseGenerateData(CLI):
         self.add_opt('-X', '--use-existing-table', action='store_true',
                      help='Allows sending data to an existing table. ' +
                      'Dangerous but useful to test pre-splitting schemes on test tables')
+        self.add_opt('-b', '--batch-size', default=self.default_batch_size,
+                     help='Number of rows to send per Thrift call (default: {0})'.format(self.default_batch_size))
+        self.add_opt('-j', '--threads', default=self.default_threads,
+                     help='Number of writer threads, each with its own connection (default: {0})'
+                     .format(self.default_threads))
+        self.add_opt('-S', '--pre-split', metavar='num_regions',
+                     help='Create the table pre-split in to this many regions using the hbase shell command')
 
     def process_args(self):
         # this resets DEBUG env var
@@ -143,6 +178,17 @@ class HBaseGenerateData(CLI):
         validate_int(self.value_length, 'value length', 1, 1000000)
 
         self.num_rows = int(self.num_rows)
+        self.key_length = int(self.key_length)
+        self.value_length = int(self.value_length)
+
+        self.batch_size = self.get_opt('batch_size')
+        validate_int(self.batch_size, 'batch size', 1, 1000000)
+        self.batch_size = int(self.batch_size)
+        self.threads = self.get_opt('threads')
+        validate_int(self.threads, 'threads', 1, 1000)
+        self.threads = int(self.threads)
+        log_option('batch size', self.batch_size)
+        log_option('threads', self.threads)
 
         self.skew = self.get_opt('skew')
         log_option('skew data', self.skew)
@@ -156,6 +202,16 @@ class HBaseGenerateData(CLI):
             die("not allowed to use --drop-table if using a table name other than the default table '{0}'"\
                 .format(self.default_table_name))
 
+        self.pre_split = self.get_opt('pre_split')
+        if self.pre_split is not None:
+            validate_int(self.pre_split, 'pre-split regions', 2, len(KEY_CHARS) ** 2)
+            self.pre_split = int(self.pre_split)
+            if self.use_existing_table:
+                self.usage('--pre-split cannot be used with --use-existing-table')
+            if not which('hbase'):
+                die("'hbase' command not found in $PATH, required for --pre-split " +
+                    "as the HBase Thrift API cannot create pre-split tables")
+
     def get_tables(self):
         try:
             log.info('getting table list')
@@ -200,13 +256,43 @@ class HBaseGenerateData(CLI):
             die('ERROR: {0}'.format(_))
 
     def create_table(self):
+        if self.pre_split:
+            self.create_pre_split_table()
+            return
         log.info('creating table %s', self.table)
         self.conn.create_table(self.table, {self.column_family: dict(max_versions=1)})
 
+    def get_split_keys(self):
+        num_keys = len(KEY_CHARS) ** 2
+        split_keys = []
+        for i in range(1, self.pre_split):
+            position = i * num_keys // self.pre_split
+            split_keys.append(KEY_CHARS[position // len(KEY_CHARS)] + KEY_CHARS[position % len(KEY_CHARS)])
+        return split_keys
+
+    def create_pre_split_table(self):
+        log.info('creating table %s pre-split in to %s regions using hbase shell', self.table, self.pre_split)
+        create_command = "create '{table}', {{NAME => '{cf}', VERSIONS => 1}}, SPLITS => [{splits}]"\
+                         .format(table=self.table,
+                                 cf=self.column_family,
+                                 splits=', '.join(["'{0}'".format(key) for key in self.get_split_keys()]))
+        log.debug('hbase shell command: %s', create_command)
+        try:
+            # -n non-interactive so errors fail with a non-zero exit code
+            process = subprocess.Popen(['hbase', 'shell', '-n'],
+                                       stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT)
+            (stdout, _) = process.communicate(input=create_command.encode('utf-8'))
+            process.wait()
+            if process.returncode != 0:
+                print('ERROR:', end='')
+                die(stdout)
+        except OSError as _:
+            die("OSError running hbase shell to create pre-split table: {0}".format(_))
+
     def populate_table(self):
         table = self.table
-        key_length = self.key_length
-        value_length = self.value_length
         table_conn = None
         # does not actually connect until sending data
         #log.info("connecting to test table '%s'", table)
@@ -217,34 +303,66 @@ class HBaseGenerateData(CLI):
         log.info("populating test table '%s' with random data", table)
         if self.use_existing_table:
             self.column_family = sorted(table_conn.families().keys())[0]
-        cf_col = self.column_family + ':col1'
+            if isinstance(self.column_family, bytes) and not isinstance(self.column_family, str):
+                self.column_family = self.column_family.decode('utf-8')
+        cf_col = (self.column_family + ':col1').encode('utf-8')
+        # split the rows in to contiguous ranges for each writer so --skew applies the same as a single writer
+        ranges = []
+        for i in range(self.threads):
+            ranges.append((i, self.num_rows * i // self.threads, self.num_rows * (i + 1) // self.threads))
+        pool = ThreadPool(processes=self.threads)
         try:
-            skew_prefix = 'A' * key_length
-            skew_mod = max(1, 100.0 / self.skew_pc)
-            #log.info('skew mod is %s', skew_mod)
-            width = len('{0}'.format(self.num_rows))
             start = time.time()
-            for _ in range(self.num_rows):
-                if self.skew and int(_ % skew_mod) == 0:
-                    table_conn.put(bytes(skew_prefix + '{number:0{width}d}'.format(width=width, number=_)), \
-                                   {bytes(cf_col): bytes(random_alnum(value_length))})
-                else:
-                    table_conn.put(bytes(random_alnum(key_length)), {bytes(cf_col): bytes(random_alnum(value_length))})
-                if _ % 100 == 0:
-                    print('.', file=sys.stderr, end='')
-            print(file=sys.stderr)
+            results = pool.map(lambda args: self.write_rows(cf_col, *args), ranges)
             time_taken = time.time() - start
-            log.info('sent %s rows of generated data to HBase in %.2f seconds (%d rows/sec, %s/sec)',
-                     self.num_rows,
-                     time_taken,
-                     self.num_rows / time_taken,
-                     humanize.naturalsize(self.num_rows * (key_length + value_length) / time_taken)
-                    )
+            print(file=sys.stderr)
+            for (thread, num_rows, thread_time_taken) in results:
+                self.log_rate('writer thread {0} sent'.format(thread), num_rows, thread_time_taken)
+            self.log_rate('sent', self.num_rows, time_taken)
         except (socket.timeout, ThriftException, HBaseIOError) as _:
             exp = str(_)
             exp = exp.replace('\\n', '\n')
             exp = exp.replace('\\t', '\t')
             die('ERROR while trying to populate table \'{0}\': {1}'.format(table, exp))
+        finally:
+            pool.terminate()
+
+    def write_rows(self, cf_col, thread, start_row, end_row):
+        """
+        Sends rows start_row to end_row in batches over this writer thread's own connection
+
+        Returns (thread, num rows sent, secs taken)
+        """
+        start = time.time()
+        conn = happybase.Connection(host=self.host, port=self.port, timeout=10 * 1000)  # ms
+        try:
+            table_conn = conn.table(self.table)
+            skew_prefix = 'A' * self.key_length
+            skew_mod = max(1, 100.0 / self.skew_pc) if self.skew_pc else None
+            width = len('{0}'.format(self.num_rows))
+            with table_conn.batch(batch_size=self.batch_size) as batch:
+                for batch_start in range(start_row, end_row, self.batch_size):
+                    batch_end = min(batch_start + self.batch_size, end_row)
+                    count = batch_end - batch_start
+                    keys = random_strings(count, self.key_length)
+                    values = random_strings(count, self.value_length)
+                    for (_, key, value) in zip(range(batch_start, batch_end), keys, values):
+                        if self.skew and skew_mod and int(_ % skew_mod) == 0:
+                            key = (skew_prefix + '{number:0{width}d}'.format(width=width, number=_)).encode('utf-8')
+                        batch.put(key, {cf_col: value})
+                    print('.', file=sys.stderr, end='')
+        finally:
+            conn.close()
+        return (thread, end_row - start_row, time.time() - start)
+
+    def log_rate(self, msg, num_rows, time_taken):
+        time_taken = max(time_taken, 0.001)
+        log.info('%s %s rows of generated data to HBase in %.2f seconds (%d rows/sec, %s/sec)',
+                 msg,
+                 num_rows,
+                 time_taken,
+                 num_rows / time_taken,
+                 humanize.naturalsize(num_rows * (self.key_length + self.value_length) / time_taken))
 
 
 if __name__ == '__main__':
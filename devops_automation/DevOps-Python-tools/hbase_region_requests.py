@@ -20,7 +20,11 @@ Tool to calculate HBase Region Requests Per Second or Average Since Startup usin
 
 Designed to help analyze region hotspotting (see also hbase_regionserver_request.py for regionserver load skew)
 
-Argument list should be one or more RegionServers to dump the JMX stats from
+Argument list should be one or more RegionServers to dump the JMX stats from, which are all queried concurrently
+
+--history FILE --record also appends each interval's region rates to a local SQLite file with rolling --retention so
+it can be left running, and --history FILE --query then prints the top N hottest regions averaged over any
+--since / --until window from that file without querying the RegionServers again
 
 Tested on Apache HBase 1.0.3, 1.1.6, 1.2.1, 1.2.2, 1.3.1
 
@@ -31,26 +35,29 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import json
 import os
-import re
 import sys
 import time
 import traceback
-import requests
-libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
-sys.path.append(libdir)
+srcdir = os.path.abspath(os.path.dirname(__file__))
+pylib = os.path.join(srcdir, 'pylib')
+lib = os.path.join(srcdir, 'lib')
+sys.path.append(pylib)
+sys.path.append(lib)
 try:
     # pylint: disable=wrong-import-position
     from harisekhon.utils import validate_host, validate_port, validate_chars, validate_int
-    from harisekhon.utils import UnknownError, CriticalError, support_msg_api, printerr, plural, log
-    from harisekhon import CLI, RequestHandler
+    from harisekhon.utils import UnknownError, support_msg_api, printerr, plural, log
+    from harisekhon import CLI
+    from hbase_jmx import HBaseJMXCollector, REGIONS_BEAN, RUNTIME_BEAN
+    from hbase_region_metrics import RegionMetricsParser
+    from hbase_request_history import HBaseRequestHistory
 except ImportError as _:
     print(traceback.format_exc(), end='')
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.5.3'
+__version__ = '0.8.0'
 
 
 class HBaseRegionsRequests(CLI):
@@ -68,11 +75,15 @@ class HBaseRegionsRequests(CLI):
         self.count = 0
         self.since_uptime = False
         self.show = set()
+        self.parser = None
         self.stats = {}
         self.last = {}
         self.first_iteration = 0
+        self.jobs = 300
+        self.collector = None
+        self.history = HBaseRequestHistory(self)
+        self.tstamp = None
         self.timeout_default = 300
-        self.url = None
         self._regions = None
 
     def add_options(self):
@@ -85,12 +96,30 @@ class HBaseRegionsRequests(CLI):
         self.add_opt('-c', '--count', default=self.count,
                      help='Number of times to print stats (default: {}, zero means infinite)'.format(self.count))
         self.add_opt('-a', '--average', action='store_true', help='Calculate average since RegionServer startup')
+        self.add_opt('-j', '--jobs', default=self.jobs,
+                     help='Max number of RegionServers to query at the same time (default: {})'.format(self.jobs))
         self.add_opt('--reads', action='store_true', help='Show read requests (default shows read and write)')
         self.add_opt('--writes', action='store_true', help='Show write requests (default shows read and write')
         self.add_opt('--total', action='store_true', help='Show total requests (default shows read and write)')
         self.add_opt('--skip-zeros', action='store_true', help="Don't output regions which have zero requests")
+        self.history.add_options()
 
     def process_args(self):
+        self.history.process_options()
+        if self.get_opt('reads'):
+            self.show.add('read')
+        if self.get_opt('writes'):
+            self.show.add('write')
+        if self.get_opt('total'):
+            self.show.add('total')
+        self.table = self.get_opt('table')
+        table_chars = 'A-Za-z0-9:._-'
+        if self.table:
+            validate_chars(self.table, 'table', table_chars)
+        self.namespace = self.get_opt('namespace')
+        validate_chars(self.namespace, 'hbase namespace', 'A-Za-z0-9:._-')
+        if self.history.query:
+            return
         self.host_list = self.args
         if not self.host_list:
             self.usage('no host arguments given, must give at least one regionserver host as an argument')
@@ -99,14 +128,10 @@ class HBaseRegionsRequests(CLI):
         self.port = self.get_opt('port')
         validate_port(self.port)
 
-        self.table = self.get_opt('table')
-        table_chars = 'A-Za-z0-9:._-'
-        if self.table:
-            validate_chars(self.table, 'table', table_chars)
-        else:
+        if not self.table:
             self.table = '[{}]+'.format(table_chars)
-        self.namespace = self.get_opt('namespace')
-        validate_chars(self.namespace, 'hbase namespace', 'A-Za-z0-9:._-')
+        self.parser = RegionMetricsParser(['readRequestCount', 'writeRequestCount'],
+                                          namespace=self.namespace, table_regex=self.table)
         self.interval = self.get_opt('interval')
         self.count = self.get_opt('count')
         self.since_uptime = self.get_opt('average')
@@ -116,14 +141,15 @@ class HBaseRegionsRequests(CLI):
         self.count = int(self.count)
         if self.count == 0:
             self.disable_timeout()
-        if self.get_opt('reads'):
-            self.show.add('read')
-        if self.get_opt('writes'):
-            self.show.add('write')
-        if self.get_opt('total'):
-            self.show.add('total')
+        self.jobs = self.get_opt('jobs')
+        validate_int(self.jobs, 'jobs', 1, 1000)
+        self.jobs = int(self.jobs)
+        self.collector = HBaseJMXCollector(port=self.port, jobs=self.jobs)
 
     def run(self):
+        if self.history.query:
+            self.print_history()
+            return
         if self.count:
             for _ in range(self.count):
                 self.run_hosts()
@@ -135,86 +161,73 @@ class HBaseRegionsRequests(CLI):
                 time.sleep(self.interval)
 
     def run_hosts(self):
-        for host in self.host_list:
-            url = 'http://{host}:{port}/jmx'.format(host=host, port=self.port)
-            if not self.since_uptime:
-                url += '?qry=Hadoop:service=HBase,name=RegionServer,sub=Regions'
+        bean_names = [REGIONS_BEAN]
+        if self.since_uptime:
+            bean_names.append(RUNTIME_BEAN)
+        self.tstamp = int(time.time())
+        for (host, beans, error) in self.collector.collect(self.host_list, bean_names):
+            if error:
+                printerr("ERROR querying JMX stats for host '{}': {}".format(host, error), )
+                continue
             try:
-                self.run_host(host, url)
-            except (CriticalError, UnknownError, requests.RequestException) as _:
+                self.run_host(host, beans)
+            except UnknownError as _:
                 printerr("ERROR querying JMX stats for host '{}': {}".format(host, _), )
+        if self.history.record:
+            self.history.commit()
 
-    def run_host(self, host, url):
-        log.info('querying %s', host)
-        req = RequestHandler().get(url)
-        json_data = json.loads(req.text)
+    def run_host(self, host, beans):
         uptime = None
-        beans = json_data['beans']
         if self.since_uptime:
-            for bean in beans:
-                if bean['name'] == 'java.lang:type=Runtime':
-                    uptime = int(bean['Uptime'] / 1000)
-                    break
+            if RUNTIME_BEAN in beans:
+                uptime = int(beans[RUNTIME_BEAN]['Uptime'] / 1000)
             if not uptime:
                 raise UnknownError("failed to find uptime in JMX stats for host '{}'. {}"\
                                    .format(host, support_msg_api()))
-        for bean in beans:
+        if REGIONS_BEAN in beans:
             log.debug('processing Regions bean')
-            if bean['name'] == 'Hadoop:service=HBase,name=RegionServer,sub=Regions':
-                self.process_bean(host, bean, uptime)
-                self.print_stats(host)
+            self.process_bean(host, beans[REGIONS_BEAN], uptime)
+            self.print_stats(host)
 
     def process_bean(self, host, bean, uptime):
-        region_regex = re.compile('^Namespace_{namespace}_table_({table})_region_(.+)_metric_(.+)RequestCount'\
-                                  .format(namespace=self.namespace, table=self.table))
-        stats = self.stats
-        last = self.last
-        for key in bean:
-            match = region_regex.match(key)
-            if match:
-                table = match.group(1)
-                region = match.group(2)
-                metric_type = match.group(3)
-                log.info('matched table %s region %s %s request count = %s', table, region, metric_type, bean[key])
-                if host not in stats:
-                    stats[host] = {}
-                if host not in last:
-                    last[host] = {}
-                if table not in stats[host]:
-                    stats[host][table] = {}
-                if region not in stats[host][table]:
-                    stats[host][table][region] = {}
-                if self.since_uptime:
-                    stats[host][table][region][metric_type] = bean[key] / uptime
-                else:
-                    # this isn't perfect - will result on a region split as well as first run
-                    # but it's generally good enough
-                    if key not in last[host]:
-                        self.first_iteration = 1
-                    else:
-                        stats[host][table][region][metric_type] = (bean[key] - last[host][key]) / self.interval
-                    last[host][key] = bean[key]
-                # totalRequestCount field seems to not always be found, causing key errors later in print_stats()
-                #
-                # worse is that totalRequestCount calculation is wrong due to change
-                #
-                # See https://issues.apache.org/jira/browse/HBASE-20626
-                #
-                # which counts multi-requests as a single request, breaking the seemingly reasonable assertion
-                #
-                # assert readRequestCount + writeRequestcount == totalRequestCount
-                #
-                if 'read' in stats[host][table][region] and 'write' in stats[host][table][region]:
-                    #log.debug('calculating total now we have read and write info')
-                    stats[host][table][region]['total'] = stats[host][table][region]['read'] + \
-                                                          stats[host][table][region]['write']
+        counts = self.parser.parse(host, bean)
+        reads = counts['readRequestCount']
+        writes = counts['writeRequestCount']
+        rows = None
+        if self.since_uptime:
+            reads = reads / uptime
+            writes = writes / uptime
+        else:
+            last = self.last.get(host)
+            self.last[host] = counts
+            if last is not None:
+                rows = counts.align(last)
+            # this isn't perfect - will result on a region split as well as first run
+            # but it's generally good enough
+            if rows is None:
+                self.first_iteration = 1
+            else:
+                reads = (reads - last['readRequestCount'][rows]) / self.interval
+                writes = (writes - last['writeRequestCount'][rows]) / self.interval
+        # totalRequestCount calculation is wrong due to change
+        #
+        # See https://issues.apache.org/jira/browse/HBASE-20626
+        #
+        # which counts multi-requests as a single request, breaking the seemingly reasonable assertion
+        #
+        # assert readRequestCount + writeRequestcount == totalRequestCount
+        #
+        # so calculate total from read + write instead
+        self.stats[host] = counts.derive({'read': reads, 'write': writes, 'total': reads + writes})
+        if self.history.record and rows is not None:
+            self.history.record_regions(self.tstamp, self.stats[host], self.namespace)
 
     def print_stats(self, host):
         stats = self.stats
         show = self.show
         skip_zeros = self.get_opt('skip_zeros')
         tstamp = time.strftime('%F %T')
-        if not stats:
+        if not any(stats.values()):
             print("No table regions found for table '{}'. Did you specify the correct table name?".format(self.table))
             sys.exit(1)
         if self.first_iteration:
@@ -223,26 +236,42 @@ class HBaseRegionsRequests(CLI):
                   .format(tstamp, host, self.interval, plural(self.interval)))
             self.first_iteration = 0
             return
+        host_stats = stats[host]
         count = 0
-        for table in sorted(stats[host]):
-            for region in sorted(stats[host][table]):
-                table_region = region
-                if len(stats) > 1:
-                    table_region = '{}:{}'.format(table, region)
-                # maintain explicit order for humans
-                # rather than iterate keys of region which will some out in the wrong order
-                for metric in ('read', 'write', 'total'):
-                    value = stats[host][table][region][metric]
-                    if skip_zeros and int(value) == 0:
-                        continue
-                    if show and metric not in show:
-                        continue
-                    print('{:20s}\t{:20s}\t{:40s}\t{:10s}\t{:8.0f}'\
-                          .format(tstamp, host, table_region, metric, value))
-                    count += 1
+        for row in host_stats.order_by_name():
+            table_region = host_stats.regions[row]
+            if len(stats) > 1:
+                table_region = '{}:{}'.format(host_stats.tables[row], table_region)
+            # maintain explicit order for humans
+            # rather than iterate keys of region which will some out in the wrong order
+            for metric in ('read', 'write', 'total'):
+                value = host_stats[metric][row]
+                if skip_zeros and int(value) == 0:
+                    continue
+                if show and metric not in show:
+                    continue
+                print('{:20s}\t{:20s}\t{:40s}\t{:10s}\t{:8.0f}'\
+                      .format(tstamp, host, table_region, metric, value))
+                count += 1
         if count:
             print()
 
+    def print_history(self):
+        metric = 'total'
+        if len(self.show) == 1:
+            metric = list(self.show)[0]
+        table = self.table
+        if table and self.namespace != 'default':
+            table = '{}:{}'.format(self.namespace, table)
+        regions = self.history.query_regions(metric, table)
+        if not regions:
+            print('No region request rates recorded in the given time window')
+            sys.exit(1)
+        self.history.print_window('regions')
+        for (table, region, hosts, average, peak, samples) in regions:
+            print('{:40s}\t{:20s}\t{:10s}\t{:8.0f}\t{:8.0f}\t{} sample{}'\
+                  .format('{}:{}'.format(table, region), hosts, metric, average, peak, samples, plural(samples)))
+
     # some extra effort to make it look the same as HBase presents it as
     #def encode_char(self, char):
     #    if char in string.printable and char not in ('\t', '\n', '\r', '\x0b', '\x0c'):
@@ -20,7 +20,7 @@ Tool to find the biggest or smallest HBase Regions across any given RegionServer
 
 Designed to find big and small regions to look at migrating for storage skew across RegionServers
 
-Argument list should be one or more RegionServers to dump the JMX stats from
+Argument list should be one or more RegionServers to dump the JMX stats from, which are all queried concurrently
 
 See also hbase_regions_by_memstore_size.py
          hbase_regions_least_used.py
@@ -34,25 +34,27 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import json
 import os
-import re
 import sys
 import traceback
-import requests
-libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
-sys.path.append(libdir)
+srcdir = os.path.abspath(os.path.dirname(__file__))
+pylib = os.path.join(srcdir, 'pylib')
+lib = os.path.join(srcdir, 'lib')
+sys.path.append(pylib)
+sys.path.append(lib)
 try:
     # pylint: disable=wrong-import-position
     from harisekhon.utils import validate_host, validate_port, validate_chars, validate_int
-    from harisekhon.utils import UnknownError, CriticalError, printerr, log
-    from harisekhon import CLI, RequestHandler
+    from harisekhon.utils import printerr, log
+    from harisekhon import CLI
+    from hbase_jmx import HBaseJMXCollector, REGIONS_BEAN
+    from hbase_region_metrics import RegionMetrics, RegionMetricsParser
 except ImportError as _:
     print(traceback.format_exc(), end='')
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.6.2'
+__version__ = '0.8.0'
 
 
 class HBaseRegionsBySize(CLI):
@@ -67,12 +69,13 @@ class HBaseRegionsBySize(CLI):
         self.table = None
         self.namespace = 'default'
         self.metric = 'storeFileSize'
-        self.region_regex = None
-        self.stats = {}
+        self.parser = None
+        self.stats = None
         self.top_n = None
         self.count = 0
+        self.jobs = 300
+        self.collector = None
         self.timeout_default = 300
-        self.url = None
 
     def add_options(self):
         self.add_opt('-P', '--port', default=os.getenv('HBASE_REGIONSERVER_PORT', self.port),
@@ -84,6 +87,8 @@ class HBaseRegionsBySize(CLI):
                                                       '(default: 100, may return more regions ' + \
                                                       'than N if multiple have the same size)')
         self.add_opt('-s', '--smallest', action='store_true', help='Sort by smallest (default: largest)')
+        self.add_opt('-j', '--jobs', default=self.jobs,
+                     help='Max number of RegionServers to query at the same time (default: {})'.format(self.jobs))
 
     def process_args(self):
         self.host_list = self.args
@@ -102,71 +107,47 @@ class HBaseRegionsBySize(CLI):
             self.table = '[{}]+'.format(table_chars)
         self.namespace = self.get_opt('namespace')
         validate_chars(self.namespace, 'hbase namespace', 'A-Za-z0-9:._-')
-        self.region_regex = re.compile('^Namespace_{namespace}_table_({table})_region_(.+)_metric_{metric}'\
-                                       .format(namespace=self.namespace, table=self.table, metric=self.metric))
+        self.parser = RegionMetricsParser([self.metric], namespace=self.namespace, table_regex=self.table)
+        self.stats = RegionMetrics([self.metric])
         self.top_n = self.get_opt('top')
         if self.top_n:
             validate_int(self.top_n, 'top N', 1)
             self.top_n = int(self.top_n)
+        self.jobs = self.get_opt('jobs')
+        validate_int(self.jobs, 'jobs', 1, 1000)
+        self.jobs = int(self.jobs)
+        self.collector = HBaseJMXCollector(port=self.port, jobs=self.jobs)
 
     def run(self):
-        for host in self.host_list:
-            url = 'http://{host}:{port}/jmx'.format(host=host, port=self.port)
-            url += '?qry=Hadoop:service=HBase,name=RegionServer,sub=Regions'
-            try:
-                self.run_host(host, url)
-            except (CriticalError, UnknownError, requests.RequestException) as _:
-                printerr("ERROR querying JMX stats for host '{}': {}".format(host, _), )
+        for (host, beans, error) in self.collector.collect(self.host_list, [REGIONS_BEAN]):
+            if error:
+                printerr("ERROR querying JMX stats for host '{}': {}".format(host, error), )
+            if REGIONS_BEAN in beans:
+                log.debug('processing Regions bean')
+                self.process_bean(host, beans[REGIONS_BEAN])
         self.print_stats()
 
-    def run_host(self, host, url):
-        log.info('querying %s', host)
-        req = RequestHandler().get(url)
-        json_data = json.loads(req.text)
-        beans = json_data['beans']
-        for bean in beans:
-            log.debug('processing Regions bean')
-            if bean['name'] == 'Hadoop:service=HBase,name=RegionServer,sub=Regions':
-                self.process_bean(host, bean)
-
     def process_bean(self, host, bean):
-        region_regex = self.region_regex
-        stats = self.stats
-        for key in bean:
-            match = region_regex.match(key)
-            if match:
-                table = match.group(1)
-                region = match.group(2)
-                log.info('matched table %s region %s storeFileSize = %s', table, region, bean[key])
-                size = bean[key]
-                if size not in stats:
-                    stats[size] = []
-                stats[size].append((host, table, region))
+        self.stats.extend(self.parser.parse(host, bean))
 
     def print_stats(self):
         stats = self.stats
         if not stats:
             print("No table regions found for table '{}'. Did you specify the correct table name?".format(self.table))
             sys.exit(1)
-        size_list = sorted(stats)
-        if not self.get_opt('smallest'):
-            size_list = list(reversed(size_list))
+        sizes = stats[self.metric]
         human = self.get_opt('human')
         if human:
             import humanize
-        for size in size_list:
-            for _ in stats[size]:
-                if self.top_n and self.count > self.top_n:
-                    sys.exit(0)
-                self.count += 1
-                host = _[0]
-                table = _[1]
-                region = _[2]
-                size_human = size
-                if human:
-                    size_human = humanize.naturalsize(size_human)
-                print('{:20s}\t{:20s}\t{:20s}\t{:>10}'\
-                      .format(host, table, region, size_human))
+        for row in stats.argsort(self.metric, reverse=not self.get_opt('smallest')):
+            if self.top_n and self.count > self.top_n:
+                sys.exit(0)
+            self.count += 1
+            size_human = int(sizes[row])
+            if human:
+                size_human = humanize.naturalsize(size_human)
+            print('{:20s}\t{:20s}\t{:20s}\t{:>10}'\
+                  .format(stats.hosts[row], stats.tables[row], stats.regions[row], size_human))
         print()
 
     # some extra effort to make it look the same as HBase presents it as
@@ -20,7 +20,7 @@ Tool to find biggest or smallest least used HBase Regions across any given Regio
 
 Designed to find the biggest and smallest hbase regions to look at migrating for storage skew across RegionServers
 
-Argument list should be one or more RegionServers to dump the JMX stats from
+Argument list should be one or more RegionServers to dump the JMX stats from, which are all queried concurrently
 
 Tested on Apache HBase 1.0.3, 1.1.6, 1.2.1, 1.2.2, 1.3.1
 
@@ -31,25 +31,27 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import json
 import os
-import re
 import sys
 import traceback
-import requests
-libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
-sys.path.append(libdir)
+srcdir = os.path.abspath(os.path.dirname(__file__))
+pylib = os.path.join(srcdir, 'pylib')
+lib = os.path.join(srcdir, 'lib')
+sys.path.append(pylib)
+sys.path.append(lib)
 try:
     # pylint: disable=wrong-import-position
     from harisekhon.utils import validate_host, validate_port, validate_chars, validate_int
-    from harisekhon.utils import UnknownError, CriticalError, printerr, log
-    from harisekhon import CLI, RequestHandler
+    from harisekhon.utils import printerr, log
+    from harisekhon import CLI
+    from hbase_jmx import HBaseJMXCollector, REGIONS_BEAN
+    from hbase_region_metrics import RegionMetricsParser
 except ImportError as _:
     print(traceback.format_exc(), end='')
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.5.1'
+__version__ = '0.7.0'
 
 
 class HBaseRegionsLeastUsed(CLI):
@@ -63,13 +65,14 @@ class HBaseRegionsLeastUsed(CLI):
         self.port = 16030
         self.table = None
         self.namespace = 'default'
+        self.parser = None
         self.stats = {}
         self.request_threshold = None
-        self.regions_under_count = {}
         self.top_n = None
         self.count = 0
+        self.jobs = 300
+        self.collector = None
         self.timeout_default = 300
-        self.url = None
 
     def add_options(self):
         self.add_opt('-P', '--port', default=os.getenv('HBASE_REGIONSERVER_PORT', self.port),
@@ -82,6 +85,8 @@ class HBaseRegionsLeastUsed(CLI):
                                                                    'than N if multiple have the same size)')
         self.add_opt('-r', '--requests', help='Only output regions with totalRequestCounts less than or equal to this')
         self.add_opt('-s', '--smallest', action='store_true', help='Sort by smallest (default: largest)')
+        self.add_opt('-j', '--jobs', default=self.jobs,
+                     help='Max number of RegionServers to query at the same time (default: {})'.format(self.jobs))
 
     def process_args(self):
         self.host_list = self.args
@@ -107,96 +112,48 @@ class HBaseRegionsLeastUsed(CLI):
         self.request_threshold = self.get_opt('requests')
         validate_int(self.request_threshold, 'request count threshold')
         self.request_threshold = int(self.request_threshold)
+        self.parser = RegionMetricsParser(['storeFileSize', 'readRequestCount', 'writeRequestCount'],
+                                          namespace=self.namespace, table_regex=self.table)
+        self.jobs = self.get_opt('jobs')
+        validate_int(self.jobs, 'jobs', 1, 1000)
+        self.jobs = int(self.jobs)
+        self.collector = HBaseJMXCollector(port=self.port, jobs=self.jobs)
 
     def run(self):
-        for host in self.host_list:
-            url = 'http://{host}:{port}/jmx'.format(host=host, port=self.port)
-            url += '?qry=Hadoop:service=HBase,name=RegionServer,sub=Regions'
-            try:
-                self.run_host(host, url)
-            except (CriticalError, UnknownError, requests.RequestException) as _:
-                printerr("ERROR querying JMX stats for host '{}': {}".format(host, _), )
-
-    def run_host(self, host, url):
-        log.info('querying %s', host)
-        req = RequestHandler().get(url)
-        json_data = json.loads(req.text)
-        beans = json_data['beans']
-        for bean in beans:
-            log.debug('processing Regions bean')
-            if bean['name'] == 'Hadoop:service=HBase,name=RegionServer,sub=Regions':
-                self.process_bean(host, bean)
+        for (host, beans, error) in self.collector.collect(self.host_list, [REGIONS_BEAN]):
+            if error:
+                printerr("ERROR querying JMX stats for host '{}': {}".format(host, error), )
+            if REGIONS_BEAN in beans:
+                log.debug('processing Regions bean')
+                self.process_bean(host, beans[REGIONS_BEAN])
                 self.print_stats(host)
 
     def process_bean(self, host, bean):
-        prefix = '^Namespace_{namespace}_table_({table})_region_(.+)_metric_'\
-                                  .format(namespace=self.namespace, table=self.table)
-        region_regex = re.compile('{}storeFileSize'.format(prefix))
-        request_count_regex = re.compile('{}(read|write)RequestCount'.format(prefix))
-        stats = self.stats
-        regions_under_count = self.regions_under_count
-        region_counts = {}
-        got_total = 0
-        for key in bean:
-            match = region_regex.match(key)
-            if match:
-                table = match.group(1)
-                region = match.group(2)
-                log.info('matched table %s region %s storeFileSize = %s', table, region, bean[key])
-                size = bean[key]
-                if size not in stats:
-                    stats[size] = []
-                stats[size].append((host, table, region))
-                continue
-            match2 = request_count_regex.match(key)
-            if match2:
-                table = match2.group(1)
-                region = match2.group(2)
-                request_type = match2.group(3)
-                log.info('matched table %s region %s %sRequestCount = %s', table, region, request_type, bean[key])
-                request_count = bean[key]
-                if region not in region_counts:
-                    region_counts[region] = 0
-                    got_total = 0
-                else:
-                    got_total = 1
-                # add read + write request counts
-                region_counts[region] += request_count
-                if got_total and region_counts[region] <= self.request_threshold:
-                    regions_under_count[region] = region_counts[region]
-                continue
+        self.stats[host] = self.parser.parse(host, bean)
 
     def print_stats(self, host):
-        stats = self.stats
-        regions_under_count = self.regions_under_count
-        if not stats:
+        stats = self.stats[host]
+        if not any(self.stats.values()):
             print("No table regions found for table '{}'. Did you specify the correct table name?".format(self.table))
             sys.exit(1)
-        size_list = sorted(stats)
-        if not self.get_opt('smallest'):
-            size_list = list(reversed(size_list))
-        if self.top_n:
-            size_list = size_list[0:self.top_n]
+        sizes = stats['storeFileSize']
+        # regions missing either the read or write request count are NaN and never under the threshold
+        request_counts = stats['readRequestCount'] + stats['writeRequestCount']
+        under_count = request_counts <= self.request_threshold
         human = self.get_opt('human')
         if human:
             import humanize
-        for size in size_list:
-            for _ in stats[size]:
-                host2 = _[0]
-                if host != host2:
-                    continue
-                table = _[1]
-                region = _[2]
-                if region not in regions_under_count:
-                    continue
-                self.count += 1
-                if self.count > self.top_n:
-                    sys.exit(0)
-                size_human = size
-                if human:
-                    size_human = humanize.naturalsize(size_human)
-                print('{:20s}\t{:20s}\t{:20s}\t{:10}\t{}'\
-                      .format(host, table, region, size_human, regions_under_count[region]))
+        for row in stats.argsort('storeFileSize', reverse=not self.get_opt('smallest')):
+            if not under_count[row]:
+                continue
+            self.count += 1
+            if self.count > self.top_n:
+                sys.exit(0)
+            size_human = int(sizes[row])
+            if human:
+                size_human = humanize.naturalsize(size_human)
+            print('{:20s}\t{:20s}\t{:20s}\t{:10}\t{}'\
+                  .format(host, stats.tables[row], stats.regions[row], size_human, int(request_counts[row])))
         print()
 
     # some extra effort to make it look the same as HBase presents it as
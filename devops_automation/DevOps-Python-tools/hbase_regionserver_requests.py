@@ -20,7 +20,11 @@ Tool to calculate HBase RegionServer Requests Per Second or Average Since Startu
 
 Designed to help analyze regionserver load imbalance (see also hbase_region_requests.py for region hotspotting)
 
-Argument list should be one or more RegionServers to dump the JMX stats from
+Argument list should be one or more RegionServers to dump the JMX stats from, which are all queried concurrently
+
+--history FILE --record also appends each interval's RegionServer rates to a local SQLite file with rolling --retention
+so it can be left running, and --history FILE --query then prints the top N busiest RegionServers averaged over any
+--since / --until window from that file without querying the RegionServers again
 
 Tested on Apache HBase 1.0.3, 1.1.6, 1.2.1, 1.2.2, 1.3.1
 
@@ -31,26 +35,29 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import json
 import os
 import re
 import sys
 import time
 import traceback
-import requests
-libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
-sys.path.append(libdir)
+srcdir = os.path.abspath(os.path.dirname(__file__))
+pylib = os.path.join(srcdir, 'pylib')
+lib = os.path.join(srcdir, 'lib')
+sys.path.append(pylib)
+sys.path.append(lib)
 try:
     # pylint: disable=wrong-import-position
     from harisekhon.utils import validate_host, validate_port, validate_int
-    from harisekhon.utils import UnknownError, CriticalError, support_msg_api, printerr, plural, log
-    from harisekhon import CLI, RequestHandler
+    from harisekhon.utils import UnknownError, support_msg_api, printerr, plural, log
+    from harisekhon import CLI
+    from hbase_jmx import HBaseJMXCollector, SERVER_BEAN, RUNTIME_BEAN
+    from hbase_request_history import HBaseRequestHistory
 except ImportError as _:
     print(traceback.format_exc(), end='')
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.5.3'
+__version__ = '0.7.0'
 
 
 class HBaseRegionServerRequests(CLI):
@@ -70,8 +77,12 @@ class HBaseRegionServerRequests(CLI):
         self.first_iteration = 0
         self.request_type = None
         self.request_types = ('read', 'write', 'total', 'rpcScan', 'rpcMutate', 'rpcMulti', 'rpcGet', 'blocked')
+        self.request_count_regex = re.compile('^(.+)RequestCount$')
+        self.jobs = 300
+        self.collector = None
+        self.history = HBaseRequestHistory(self)
+        self.tstamp = None
         self.timeout_default = 300
-        self.url = None
         self._regions = None
 
     def add_options(self):
@@ -82,10 +93,22 @@ class HBaseRegionServerRequests(CLI):
         self.add_opt('-c', '--count', default=self.count,
                      help='Number of times to print stats (default: {}, zero means infinite)'.format(self.count))
         self.add_opt('-a', '--average', action='store_true', help='Calculate average since RegionServer startup')
+        self.add_opt('-j', '--jobs', default=self.jobs,
+                     help='Max number of RegionServers to query at the same time (default: {})'.format(self.jobs))
         self.add_opt('-T', '--type', help='Only return given metric types (comma separated list containing any of: {})'\
                                           .format(', '.join(self.request_types)))
+        self.history.add_options()
 
     def process_args(self):
+        self.history.process_options()
+        self.request_type = self.get_opt('type')
+        if self.request_type:
+            self.request_type = [_.strip() for _ in self.request_type.split(',')]
+            for _ in self.request_type:
+                if _ not in self.request_types:
+                    self.usage('--type may only include: {}'.format(', '.join(self.request_types)))
+        if self.history.query:
+            return
         self.host_list = self.args
         if not self.host_list:
             self.usage('no host arguments given, must give at least one regionserver host as an argument')
@@ -103,14 +126,15 @@ class HBaseRegionServerRequests(CLI):
         self.count = int(self.count)
         if self.count == 0:
             self.disable_timeout()
-        self.request_type = self.get_opt('type')
-        if self.request_type:
-            self.request_type = [_.strip() for _ in self.request_type.split(',')]
-            for _ in self.request_type:
-                if _ not in self.request_types:
-                    self.usage('--type may only include: {}'.format(', '.join(self.request_types)))
+        self.jobs = self.get_opt('jobs')
+        validate_int(self.jobs, 'jobs', 1, 1000)
+        self.jobs = int(self.jobs)
+        self.collector = HBaseJMXCollector(port=self.port, jobs=self.jobs)
 
     def run(self):
+        if self.history.query:
+            self.print_history()
+            return
         if self.count:
             for _ in range(self.count):
                 self.run_hosts()
@@ -122,37 +146,36 @@ class HBaseRegionServerRequests(CLI):
                 time.sleep(self.interval)
 
     def run_hosts(self):
-        for host in self.host_list:
-            url = 'http://{host}:{port}/jmx'.format(host=host, port=self.port)
-            if not self.since_uptime:
-                url += '?qry=Hadoop:service=HBase,name=RegionServer,sub=Server'
+        bean_names = [SERVER_BEAN]
+        if self.since_uptime:
+            bean_names.append(RUNTIME_BEAN)
+        self.tstamp = int(time.time())
+        for (host, beans, error) in self.collector.collect(self.host_list, bean_names):
+            if error:
+                printerr("ERROR querying JMX stats for host '{}': {}".format(host, error), )
+                continue
             try:
-                self.run_host(host, url)
-            except (CriticalError, UnknownError, requests.RequestException) as _:
+                self.run_host(host, beans)
+            except UnknownError as _:
                 printerr("ERROR querying JMX stats for host '{}': {}".format(host, _), )
+        if self.history.record:
+            self.history.commit()
 
-    def run_host(self, host, url):
-        log.info('querying %s', host)
-        req = RequestHandler().get(url)
-        json_data = json.loads(req.text)
+    def run_host(self, host, beans):
         uptime = None
-        beans = json_data['beans']
         if self.since_uptime:
-            for bean in beans:
-                if bean['name'] == 'java.lang:type=Runtime':
-                    uptime = int(bean['Uptime'] / 1000)
-                    break
+            if RUNTIME_BEAN in beans:
+                uptime = int(beans[RUNTIME_BEAN]['Uptime'] / 1000)
             if not uptime:
                 raise UnknownError("failed to find uptime in JMX stats for host '{}'. {}"\
                                    .format(host, support_msg_api()))
-        for bean in beans:
-            log.debug('processing Regions bean')
-            if bean['name'] == 'Hadoop:service=HBase,name=RegionServer,sub=Server':
-                self.process_bean(host, bean, uptime)
-                self.print_stats(host)
+        if SERVER_BEAN in beans:
+            log.debug('processing Server bean')
+            self.process_bean(host, beans[SERVER_BEAN], uptime)
+            self.print_stats(host)
 
     def process_bean(self, host, bean, uptime):
-        region_regex = re.compile('^(.+)RequestCount$')
+        region_regex = self.request_count_regex
         stats = self.stats
         last = self.last
         for key in bean:
@@ -174,6 +197,8 @@ class HBaseRegionServerRequests(CLI):
                     else:
                         stats[host][metric_type] = (bean[key] - last[host][key]) / self.interval
                     last[host][key] = bean[key]
+        if self.history.record and not self.first_iteration and host in stats:
+            self.history.record_regionserver(self.tstamp, host, stats[host])
 
     def print_stats(self, host):
         stats = self.stats
@@ -199,6 +224,18 @@ class HBaseRegionServerRequests(CLI):
                   .format(tstamp, host, metric, val))
         print()
 
+    def print_history(self):
+        for metric in self.request_type or ['total']:
+            regionservers = self.history.query_regionservers(metric)
+            if not regionservers:
+                print('No regionserver {} request rates recorded in the given time window'.format(metric))
+                sys.exit(1)
+            self.history.print_window('regionservers for {} requests'.format(metric))
+            for (host, average, peak, samples) in regionservers:
+                print('{:20s}\t{:10s}\t{:8.0f}\t{:8.0f}\t{} sample{}'\
+                      .format(host, metric, average, peak, samples, plural(samples)))
+            print()
+
     # some extra effort to make it look the same as HBase presents it as
     #def encode_char(self, char):
     #    if char in string.printable and char not in ('\t', '\n', '\r', '\x0b', '\x0c'):
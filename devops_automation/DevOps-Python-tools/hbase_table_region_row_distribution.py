@@ -25,6 +25,14 @@ region-by-region full table scan operation ie. O(n). Tested with 50M data points
 This may time out on HBase tables with very large regions such as wide row opentsdb tables,
 in which case you should instead consider using Spark, Hive or Phoenix instead.
 
+Regions are scanned concurrently by --jobs workers, each using its own connection from a pool of Thrift connections,
+fetching --batch-size row keys per Thrift call. Only the row keys are returned by the scans, using server side
+FirstKeyOnlyFilter and KeyOnlyFilter so cell values are never sent over Thrift.
+
+With --checkpoint-file each completed region's row count is recorded as it finishes so an interrupted or timed out run
+can be re-run with the same file to resume, only scanning the regions not already completed. The file is removed once
+all regions have been counted. --stats prints the scan throughput and the slowest regions, which are often the hotspots.
+
 Tested on Hortonworks HDP 2.5 (HBase 1.1.2) and Apache HBase 1.0.3, 1.1.6, 1.2.1, 1.2.2, 1.3.1
 
 """
@@ -35,22 +43,28 @@ from __future__ import print_function
 #from __future__ import unicode_literals
 
 #import logging
+import json
 import os
 import sys
+import time
 import traceback
+from multiprocessing.pool import ThreadPool
 import numpy as np
 libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
 sys.path.append(libdir)
 try:
     # pylint: disable=wrong-import-position
-    from harisekhon.utils import log, log_option, die, code_error, support_msg_api, autoflush
-    from hbase_show_table_region_ranges import HBaseShowTableRegionRanges
+    from harisekhon.utils import log, log_option, die, code_error, support_msg_api, autoflush, validate_int
+    from hbase_show_table_region_ranges import HBaseShowTableRegionRanges, happybase
 except ImportError as _:
     print(traceback.format_exc(), end='')
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.6.2'
+__version__ = '0.7.1'
+
+# return just the first cell of each row without its value, all that's needed to count rows
+KEY_ONLY_FILTER = 'FirstKeyOnlyFilter() AND KeyOnlyFilter()'
 
 
 class HBaseTableRegionRowDistribution(HBaseShowTableRegionRanges):
@@ -71,6 +85,11 @@ class HBaseTableRegionRowDistribution(HBaseShowTableRegionRanges):
         self.row_count_width = len(self.row_count_header)
         self.row_count_pc_header = '% of Total Rows'
         self.row_count_pc_width = len(self.row_count_pc_header)
+        self.jobs = None
+        self.batch_size = None
+        self.checkpoint_file = None
+        self.pool = None
+        self.scan_time = None
         autoflush()
 
     def add_options(self):
@@ -82,6 +101,16 @@ class HBaseTableRegionRowDistribution(HBaseShowTableRegionRanges):
                      '. Makes it easier to see the regions with the most rows or if one server is rows heavy regions' +
                      '. See also hbase_calculate_server_row_distribution.py')
         self.add_opt('-d', '--desc', action='store_true', help='Reverse sort order (descending)')
+        self.add_opt('-j', '--jobs', metavar='num', type='int', default=10,
+                     help='Number of regions to scan concurrently, each over its own Thrift connection (default: 10)')
+        self.add_opt('-b', '--batch-size', metavar='num', type='int', default=10000,
+                     help='Number of row keys to fetch per Thrift call while scanning (default: 10000)')
+        self.add_opt('-c', '--checkpoint-file', metavar='file',
+                     help='Record completed region row counts to this file and resume from it if it already exists')
+        self.add_opt('-S', '--stats', action='store_true',
+                     help='Print scan throughput and the slowest regions at the end')
+        self.add_opt('-e', '--slowest', metavar='num', type='int', default=10,
+                     help='Number of slowest regions to print with --stats (default: 10)')
 
     def local_main(self, table_conn):
         self.no_region_col = self.get_opt('no_region_name')
@@ -93,6 +122,16 @@ class HBaseTableRegionRowDistribution(HBaseShowTableRegionRanges):
                 self.usage('invalid --sort option given, must be one of: {0}'.format(', '.join(self.valid_sorts)))
         log_option('no region name', self.no_region_col)
         log_option('sort', self.sort)
+        self.jobs = self.get_opt('jobs')
+        validate_int(self.jobs, 'jobs', 1, 1000)
+        self.jobs = int(self.jobs)
+        self.batch_size = self.get_opt('batch_size')
+        validate_int(self.batch_size, 'batch size', 1, 1000000)
+        self.batch_size = int(self.batch_size)
+        self.checkpoint_file = self.get_opt('checkpoint_file')
+        log_option('checkpoint file', self.checkpoint_file)
+        if self.get_opt('stats'):
+            validate_int(self.get_opt('slowest'), 'slowest', 0)
         if self.no_region_col:
             self.total_width -= self.region_width
         num_regions = len(self._regions)
@@ -106,12 +145,16 @@ class HBaseTableRegionRowDistribution(HBaseShowTableRegionRanges):
         self.calculate_row_percentages()
         self.print_table_region_row_counts()
         self.print_summary()
+        if self.get_opt('stats'):
+            self.print_stats()
 
     def populate_region_metadata(self):
         log.info('getting region metadata')
         try:
             for region in self._regions:
                 self._regions_meta.append({
+                    # full region name identifies the exact region in checkpoint files, changing if it is split
+                    'id': self.bytes_to_str(region['name']),
                     'name': self.bytes_to_str(self.shorten_region_name(region['name'])),
                     'start_key': self.bytes_to_str(region['start_key']),
                     'end_key': self.bytes_to_str(region['end_key']),
@@ -120,26 +163,91 @@ class HBaseTableRegionRowDistribution(HBaseShowTableRegionRanges):
         except KeyError as _:
             die('error parsing region info: {0}. '.format(_) + support_msg_api())
 
-    def populate_row_counts(self, table_conn):
+    def populate_row_counts(self, table_conn):  # pylint: disable=unused-argument
         if not self.conn.is_table_enabled(self.table):
             die("table '{0}' is not enabled".format(self.table))
-        log.info('getting region row counts')
+        completed = self.load_checkpoint()
+        regions = []
+        for region in self._regions_meta:
+            if region['id'] in completed:
+                (region['row_count'], region['secs']) = completed[region['id']]
+                region['resumed'] = True
+                log.info("region '%s' row count %s loaded from checkpoint", region['name'], region['row_count'])
+            else:
+                regions.append(region)
+        log.info('getting region row counts for %s regions with %s concurrent jobs', len(regions), self.jobs)
         if self.verbose < 2:
             print('progress dots (1 per region scanned): ', file=sys.stderr, end='')
-        for region in self._regions_meta:
-            log.info("scanning region '%s'", region['name'])
-            region['row_count'] = self.scan_count(table_conn,
-                                                  region['start_key'],
-                                                  region['end_key'])
-            if self.verbose < 2:
-                print('.', file=sys.stderr, end='')
+        start = time.time()
+        jobs = min(self.jobs, max(len(regions), 1))
+        self.pool = happybase.ConnectionPool(size=jobs, host=self.host, port=self.port, timeout=10 * 1000)  # ms
+        pool = ThreadPool(processes=jobs)
+        checkpoint = None
+        try:
+            if self.checkpoint_file:
+                checkpoint = open(self.checkpoint_file, 'a')
+            for (region, row_count, secs) in pool.imap_unordered(self.scan_region, regions):
+                region['row_count'] = row_count
+                region['secs'] = secs
+                region['resumed'] = False
+                log.info("region '%s' has %s rows, scanned in %.2f secs", region['name'], row_count, secs)
+                if checkpoint:
+                    checkpoint.write(json.dumps({'table': self.table,
+                                                 'region': region['id'],
+                                                 'row_count': row_count,
+                                                 'secs': secs}) + '\n')
+                    checkpoint.flush()
+                if self.verbose < 2:
+                    print('.', file=sys.stderr, end='')
+        finally:
+            pool.terminate()
+            if checkpoint:
+                checkpoint.close()
+        self.scan_time = time.time() - start
         if self.verbose < 2:
             print(file=sys.stderr)
+        if self.checkpoint_file and os.path.exists(self.checkpoint_file):
+            log.info("all regions counted, removing checkpoint file '%s'", self.checkpoint_file)
+            os.unlink(self.checkpoint_file)
+
+    def load_checkpoint(self):
+        """
+        Returns a dict of region id => (row_count, secs) for regions of this table completed in a previous run
+        """
+        completed = {}
+        if not self.checkpoint_file or not os.path.exists(self.checkpoint_file):
+            return completed
+        log.info("resuming from checkpoint file '%s'", self.checkpoint_file)
+        try:
+            with open(self.checkpoint_file) as filehandle:
+                for line in filehandle:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last line may be partially written if the previous run was killed
+                        log.warning("skipping invalid checkpoint line: %s", line.rstrip('\n'))
+                        continue
+                    if record.get('table') == self.table:
+                        completed[record['region']] = (int(record['row_count']), float(record['secs']))
+        except (IOError, OSError, KeyError, TypeError) as _:
+            die("failed to read checkpoint file '{0}': {1}".format(self.checkpoint_file, _))
+        log.info('%s regions already completed in checkpoint', len(completed))
+        return completed
+
+    def scan_region(self, region):
+        log.info("scanning region '%s'", region['name'])
+        start = time.time()
+        with self.pool.connection() as conn:
+            row_count = self.scan_count(conn.table(self.table),
+                                        region['start_key'],
+                                        region['end_key'],
+                                        self.batch_size)
+        return (region, row_count, time.time() - start)
 
     @staticmethod
-    def scan_count(table_conn, start_row, end_row):
+    def scan_count(table_conn, start_row, end_row, batch_size=10000):
         # row_stop is exclusive but so is end_row passed from region info so shouldn't be off by one
-        rows = table_conn.scan(row_start=start_row, row_stop=end_row, columns=[])
+        rows = table_conn.scan(row_start=start_row, row_stop=end_row, filter=KEY_ONLY_FILTER, batch_size=batch_size)
         # memory vs time trade off
         #return len(list(rows))
         return sum(1 for _ in rows)
@@ -270,6 +378,24 @@ class HBaseTableRegionRowDistribution(HBaseShowTableRegionRanges):
                                                              third_quartile_non_empty  / self.total_rows * 100))
         print()
 
+    def print_stats(self):
+        scan_time = max(self.scan_time, 0.001)
+        scanned = [region for region in self._regions_meta if not region['resumed']]
+        rows_scanned = sum([region['row_count'] for region in scanned])
+        print('scanned {0} rows in {1} regions in {2:.2f} secs with {3} concurrent jobs => {4:.2f} rows/sec'
+              .format(rows_scanned, len(scanned), scan_time, self.jobs, rows_scanned / scan_time))
+        if len(scanned) < len(self._regions_meta):
+            print('{0} regions resumed from checkpoint'.format(len(self._regions_meta) - len(scanned)))
+        # including resumed regions as their timings were recorded in the checkpoint
+        slowest = sorted(self._regions_meta, key=lambda _: -_['secs'])[:self.get_opt('slowest')]
+        if slowest:
+            print('\nslowest regions:\n')
+            for region in slowest:
+                print('{0:8.2f} secs  {1:>12} rows  {2}  {3}'.format(region['secs'],
+                                                                    region['row_count'],
+                                                                    region['server'],
+                                                                    region['name']))
+
 
 if __name__ == '__main__':
     HBaseTableRegionRowDistribution().main()
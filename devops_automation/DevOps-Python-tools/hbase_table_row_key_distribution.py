@@ -25,6 +25,17 @@ region-by-region full table scan operation ie. O(n). Tested with 50M data points
 This may time out on HBase tables with very large regions such as wide row opentsdb tables,
 in which case you should instead consider using Spark, Hive or Phoenix instead.
 
+Only the row keys are returned by the scan, using server side FirstKeyOnlyFilter and KeyOnlyFilter so cell values are
+never sent over Thrift, which makes a huge difference on tables with wide rows or large values.
+
+For huge tables --sample instead estimates the distribution in seconds by scanning just --sample-rows rows from each of
+--sample-points start keys spread across the key range of every region, printing each prefix's estimated percentage of
+rows with a confidence interval and the skew of the largest prefix. Every region is weighted by its estimated row
+count: the part of the region between each sample point and the next is counted exactly where the scan reached the next
+point, and otherwise extrapolated at the density of rows per key range the scan covered, so regions scanned completely
+are simply exact. As every region is sampled, the confidence intervals only cover the error of the rows extrapolated
+rather than counted, narrowing to zero width when every region is scanned completely.
+
 Tested on Hortonworks HDP 2.5 (HBase 1.1.2) and Apache HBase 1.0.3, 1.1.6, 1.2.1, 1.2.2, 1.3.1
 
 """
@@ -35,6 +46,7 @@ from __future__ import print_function
 #from __future__ import unicode_literals
 
 #import logging
+import bisect
 import os
 import re
 import socket
@@ -72,7 +84,74 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.6.2'
+__version__ = '0.8.3'
+
+# return just the first cell of each row without its value, all that's needed to count row keys
+KEY_ONLY_FILTER = 'FirstKeyOnlyFilter() AND KeyOnlyFilter()'
+
+# beyond this many prefixes in the rest of an extrapolated segment, split its rows by the prefixes scanned instead
+MAX_SPREAD_PREFIXES = 256
+
+# two sided normal distribution z scores for --confidence
+Z_SCORES = {'90': 1.645, '95': 1.960, '99': 2.576}
+
+
+class KeySpace(object):
+    """
+    Key space of length bytes drawn from the alphabet of byte values seen in a sample of row keys, for interpolating
+    keys. ASCII and hex keys only use a small fraction of the 256 possible values of each byte, so interpolating raw
+    bytes would leave most of any key range empty of rows
+    """
+
+    def __init__(self, keys, length):
+        alphabet = set()
+        for key in keys:
+            alphabet.update(key_bytes(key))
+        self.alphabet = sorted(alphabet) or [0]
+        self.radix = len(self.alphabet)
+        self.length = length
+        # key space end, for an empty end key
+        self.end = self.radix ** length
+
+    def to_int(self, key):
+        """
+        Converts a row key to an integer preserving sort order
+        """
+        key = key_bytes(key)[:self.length]
+        num = 0
+        for (i, byte) in enumerate(key):
+            digit = bisect.bisect_left(self.alphabet, byte)
+            if digit == self.radix:
+                # beyond the alphabet, so after every key with this prefix
+                return (num + 1) * self.radix ** (self.length - i) - 1
+            if self.alphabet[digit] != byte:
+                # between bytes of the alphabet, so before every key starting with the next byte
+                return (num * self.radix + digit) * self.radix ** (self.length - i - 1)
+            num = num * self.radix + digit
+        # short keys are padded with the lowest byte of the alphabet
+        return num * self.radix ** (self.length - len(key))
+
+    def to_key(self, num, like):
+        """
+        Converts num back to a row key of length bytes, of the same str / bytes type as the like key
+        """
+        digits = []
+        for _ in range(self.length):
+            (num, digit) = divmod(num, self.radix)
+            digits.append(self.alphabet[digit])
+        key = bytes(bytearray(reversed(digits)))
+        if not isinstance(like, bytes):
+            key = key.decode('latin-1')
+        return key
+
+
+def key_bytes(key):
+    """
+    Returns the row key as a bytearray of byte values, whether it is a str or bytes
+    """
+    if not isinstance(key, bytes):
+        key = key.encode('latin-1')
+    return bytearray(key)
 
 
 class HBaseTableRegionRowDistribution(CLI):
@@ -93,12 +172,27 @@ class HBaseTableRegionRowDistribution(CLI):
         self.sort = False
         self.sort_desc = False
         self.prefix_length = 1
+        self.batch_size = None
+        self.sample = False
+        self.sample_rows = None
+        self.sample_points = None
+        self.confidence = None
+        self.num_regions = 0
+        self.num_samples = 0
+        self.rows_sampled = 0
+        self.num_complete = 0
+        # prefix => [sum of u_ps ** 2 / n_s, sum of u_ps * u_s / n_s, sum of u_ps] over the extrapolated segments,
+        # and the sums of u_s ** 2 / n_s and u_s, see calculate_confidence_intervals()
+        self.variance_sums = {}
+        self.density_variance = 0
+        self.unscanned_rows = 0
         self.key_prefix_header = 'Key Prefix'
         self.key_prefix_width = len(self.key_prefix_header)
         self.row_count_header = 'Row Count'
         self.row_count_width = len(self.row_count_header)
         self.row_count_pc_header = '% of Total Rows'
         self.row_count_pc_width = len(self.row_count_pc_header)
+        self.ci_header = None
         self.separator = '    '
         self.total_width = (self.key_prefix_width +
                             self.row_count_width +
@@ -114,6 +208,18 @@ class HBaseTableRegionRowDistribution(CLI):
                      '. Use with increasing sizes for more granular analysis')
         self.add_opt('-s', '--sort', action='store_true', help='Sort by row count')
         self.add_opt('-d', '--desc', action='store_true', help='Descending sort order')
+        self.add_opt('-b', '--batch-size', metavar='num', type='int', default=10000,
+                     help='Number of row keys to fetch per Thrift call while scanning (default: 10000)')
+        self.add_opt('-a', '--sample', action='store_true',
+                     help='Estimate the distribution by sampling rows from each region instead of a full table scan')
+        self.add_opt('-n', '--sample-rows', metavar='num', type='int', default=1000,
+                     help='Number of consecutive rows to scan from each sample point in --sample mode (default: 1000)')
+        self.add_opt('-p', '--sample-points', metavar='num', type='int', default=10,
+                     help='Number of start keys spread across each region to sample from in --sample mode ' +
+                     '(default: 10)')
+        self.add_opt('-c', '--confidence', choices=sorted(Z_SCORES), default='95',
+                     help='Confidence level %% for the intervals in --sample mode (default: 95, choices: {0})'
+                     .format(', '.join(sorted(Z_SCORES))))
         self.add_opt('-l', '--list-tables', action='store_true', help='List tables and exit')
 
     def process_args(self):
@@ -133,6 +239,23 @@ class HBaseTableRegionRowDistribution(CLI):
             validate_chars(self.table, 'hbase table', 'A-Za-z0-9:._-')
             validate_int(self.prefix_length, 'row key prefix length', 1, 10)
             self.prefix_length = int(self.prefix_length)
+            self.batch_size = self.get_opt('batch_size')
+            validate_int(self.batch_size, 'batch size', 1, 1000000)
+            self.batch_size = int(self.batch_size)
+            self.sample = self.get_opt('sample')
+            if self.sample:
+                self.sample_rows = self.get_opt('sample_rows')
+                validate_int(self.sample_rows, 'sample rows', 1, 1000000)
+                self.sample_rows = int(self.sample_rows)
+                self.sample_points = self.get_opt('sample_points')
+                validate_int(self.sample_points, 'sample points', 1, 1000)
+                self.sample_points = int(self.sample_points)
+                self.confidence = self.get_opt('confidence')
+                self.row_count_header = 'Weighted Rows'
+                self.row_count_width = len(self.row_count_header)
+                self.row_count_pc_header = 'Est. % of Rows'
+                self.row_count_pc_width = len(self.row_count_pc_header)
+                self.ci_header = '{0}% Confidence Interval'.format(self.confidence)
 
     def get_tables(self):
         try:
@@ -167,9 +290,12 @@ class HBaseTableRegionRowDistribution(CLI):
     def populate_row_counts(self, table_conn):
         if not self.conn.is_table_enabled(self.table):
             die("table '{0}' is not enabled".format(self.table))
+        if self.sample:
+            self.populate_sample_counts(table_conn)
+            return
         log.info('getting row counts (this may take a long time)')
-        #rows = table_conn.scan(columns=[])
-        rows = table_conn.scan() # columns=[]) doesn't return without cf
+        # columns=[] doesn't limit the returned cells at all, only the filter does
+        rows = table_conn.scan(filter=KEY_ONLY_FILTER, batch_size=self.batch_size)
         if self.verbose < 2:
             print('progress dots (one per 10,000 rows): ', file=sys.stderr, end='')
         for row in rows:
@@ -186,6 +312,216 @@ class HBaseTableRegionRowDistribution(CLI):
         if self.verbose < 2:
             print(file=sys.stderr)
 
+    def populate_sample_counts(self, table_conn):
+        regions = table_conn.regions()
+        self.num_regions = len(regions)
+        log.info('sampling %s rows from %s points in each of %s regions',
+                 self.sample_rows, self.sample_points, self.num_regions)
+        if self.verbose < 2:
+            print('progress dots (1 per region sampled): ', file=sys.stderr, end='')
+        for region in regions:
+            (estimates, rows_sampled, extrapolated) = self.sample_region(table_conn, region)
+            if not rows_sampled:
+                continue
+            if not extrapolated:
+                self.num_complete += 1
+            self.add_sample(estimates, rows_sampled, extrapolated)
+            if self.verbose < 2:
+                print('.', file=sys.stderr, end='')
+        if self.verbose < 2:
+            print(file=sys.stderr)
+        self.total_rows = int(round(self.total_rows))
+        for prefix in self.rows:
+            self.rows[prefix]['row_count'] = int(round(self.rows[prefix]['row_count']))
+
+    def sample_region(self, table_conn, region):
+        """
+        Scans up to --sample-rows rows from each of --sample-points start keys across the region
+
+        Returns a dict of prefix => estimated row count in the region, the number of rows sampled and the list of
+        segments extrapolated, empty if every row in the region was seen
+        """
+        keys = self.sample_scan(table_conn, region['start_key'], region['end_key'])
+        if len(keys) < self.sample_rows:
+            return (self.count_prefixes(keys), len(keys), [])
+        # bound the sample points by the region's last row key rather than its end key, beyond which there are often
+        # no rows, especially for the last region whose end key is empty meaning the end of the key space
+        end_key = self.get_last_key(table_conn, region['end_key']) or region['end_key']
+        # from the first row rather than the region start key, which is empty for the first region
+        points = [keys[0]] + self.get_sample_points(keys, end_key)
+        scans = [keys]
+        for start_row in points[1:]:
+            keys = self.sample_scan(table_conn, start_row, region['end_key'])
+            scans.append(keys)
+            if len(keys) < self.sample_rows:
+                # reached the end of the region, any later sample points would only re-scan the same rows
+                break
+        return self.estimate_region(points, scans, end_key)
+
+    def estimate_region(self, points, scans, end_key):
+        """
+        Estimates the region's row count by prefix from the rows scanned from each sample point
+
+        The segment of the region from each sample point to the next is counted exactly if its scan reached the next
+        point or the end of the region. Otherwise the rest of the segment after the rows scanned is estimated at the
+        same density of rows per key range, split between the prefixes the rest of the segment covers. Estimating each
+        segment separately rather than the whole region from one density copes with row keys packed unevenly across
+        the key space, and a region whose segments were all scanned through is complete, counted exactly the same as
+        a region small enough to be scanned in one go
+
+        Returns the estimates with the number of rows sampled and a list of (prefix => rows estimated beyond the scan,
+        rows scanned) for each extrapolated segment
+        """
+        # sample points may land in sparse parts of the key space and scan into the next point's rows
+        seen = sorted(set(key for keys in scans for key in keys))
+        key_space = KeySpace(seen, max([len(key) for key in seen] + [len(end_key), 8]))
+        estimates = {}
+        extrapolated = []
+        for (i, keys) in enumerate(scans):
+            last = i == len(scans) - 1
+            bound = end_key if last else points[i + 1]
+            if len(keys) < self.sample_rows or (bound and keys[-1] >= bound):
+                low = bisect.bisect_left(seen, points[i])
+                high = len(seen) if last else bisect.bisect_left(seen, bound)
+                self.count_prefixes(seen[low:high], counts=estimates)
+                continue
+            if not bound:
+                # no last row key to bound the segment so the rest of the key space can't be extrapolated over
+                self.count_prefixes(keys, counts=estimates)
+                continue
+            self.count_prefixes(keys, counts=estimates)
+            start = key_space.to_int(points[i])
+            scanned = key_space.to_int(keys[-1])
+            # rows per unit of the key space
+            density = len(keys) / max(scanned - start, 1)
+            unscanned = self.spread_prefixes(key_space, scanned, key_space.to_int(bound), density, keys)
+            for (prefix, rows) in unscanned.items():
+                estimates[prefix] = estimates.get(prefix, 0) + rows
+            extrapolated.append((unscanned, len(keys)))
+        return (estimates, len(seen), extrapolated)
+
+    def spread_prefixes(self, key_space, low, high, density, keys):
+        """
+        Returns a dict of prefix => rows estimated between the key space positions low and high at the given density,
+        split between prefixes by their key ranges. If the range spans too many prefixes to be worth estimating each
+        one, the rows are split in proportion to the prefixes of the keys scanned instead
+        """
+        if high <= low:
+            return {}
+        # the key space range of each prefix
+        unit = key_space.radix ** max(key_space.length - self.prefix_length, 0)
+        (first, last) = (low // unit, (high - 1) // unit)
+        if last - first >= MAX_SPREAD_PREFIXES:
+            return self.count_prefixes(keys, density * (high - low) / len(keys))
+        rows = {}
+        for num in range(first, last + 1):
+            prefix = self.bytes_to_str(key_space.to_key(num * unit, keys[0])[:self.prefix_length])
+            rows[prefix] = rows.get(prefix, 0) + density * (min(high, (num + 1) * unit) - max(low, num * unit))
+        return rows
+
+    def sample_scan(self, table_conn, start_row, end_row):
+        """
+        Returns the list of up to --sample-rows row keys scanned from start_row
+        """
+        log.debug("sampling from row '%s'", self.bytes_to_str(start_row))
+        rows = table_conn.scan(row_start=start_row,
+                               row_stop=end_row,
+                               filter=KEY_ONLY_FILTER,
+                               limit=self.sample_rows,
+                               batch_size=min(self.batch_size, self.sample_rows))
+        return [row[0] for row in rows]
+
+    def count_prefixes(self, keys, weight=1, counts=None):
+        """
+        Adds weight to counts for the prefix of each row key, returning counts
+        """
+        if counts is None:
+            counts = {}
+        for key in keys:
+            prefix = self.bytes_to_str(key[0:min(self.prefix_length, len(key))])
+            counts[prefix] = counts.get(prefix, 0) + weight
+        return counts
+
+    def get_last_key(self, table_conn, end_key):
+        """
+        Returns the last row key before end_key, or in the table if end_key is empty
+        """
+        try:
+            # a reverse scan includes its start row, which would be the first row of the next region
+            for row in table_conn.scan(row_start=end_key or None, reverse=True, filter=KEY_ONLY_FILTER, limit=2):
+                if not end_key or row[0] < end_key:
+                    return row[0]
+        except TypeError:
+            # reverse scans need HappyBase 1.0+
+            log.debug('reverse scan not supported, sampling up to the end of the key space')
+        return ''
+
+    def get_sample_points(self, keys, end_key):
+        """
+        Returns sample_points - 1 keys interpolated evenly between the first of the keys and end_key, which may be
+        empty meaning the end of the key space, within the alphabet of the keys
+        """
+        points = []
+        start_key = keys[0]
+        # at least 8 bytes for enough resolution to split short keys
+        key_space = KeySpace(keys, max(len(start_key), len(end_key), 8))
+        low = key_space.to_int(start_key)
+        high = key_space.to_int(end_key) if end_key else key_space.end
+        step = (high - low) // self.sample_points
+        if step > 0:
+            for i in range(1, self.sample_points):
+                points.append(key_space.to_key(low + step * i, start_key))
+        return points
+
+    def add_sample(self, estimates, rows_sampled, extrapolated):
+        """
+        Records the estimated prefix row counts of one region, keeping only the running sums needed for the
+        estimates and their confidence intervals
+        """
+        self.num_samples += 1
+        self.rows_sampled += rows_sampled
+        for (prefix, estimate) in estimates.items():
+            if prefix not in self.rows:
+                self.rows[prefix] = {'row_count': 0}
+                self.variance_sums[prefix] = [0, 0, 0]
+            self.rows[prefix]['row_count'] += estimate
+        self.total_rows += sum(estimates.values())
+        for (unscanned, num_rows) in extrapolated:
+            total = sum(unscanned.values())
+            self.density_variance += total ** 2 / num_rows
+            self.unscanned_rows += total
+            for (prefix, rows) in unscanned.items():
+                self.variance_sums[prefix][0] += rows ** 2 / num_rows
+                self.variance_sums[prefix][1] += rows * total / num_rows
+                self.variance_sums[prefix][2] += rows
+
+    def calculate_confidence_intervals(self):
+        """
+        Every region is sampled and every row outside the extrapolated segments s is counted exactly, so the only
+        uncertainty is in the u_s rows estimated beyond each scan, u_ps of them with the prefix. Their row density is
+        measured from the n_s rows scanned with the relative variance 1 / n_s of a Poisson count, and the rows actually
+        there vary around it as Poisson counts too, so the variance of the prefix's share p of the T estimated rows is:
+
+        var(p) = sum((u_ps - p * u_s) ** 2 / n_s + u_ps * (1 - 2 * p) + p ** 2 * u_s) / T ** 2
+
+        which is zero when every region is scanned completely
+        """
+        log.info('calculating %s%% confidence intervals', self.confidence)
+        prefixes = list(self.rows)
+        counts = np.array([self.rows[prefix]['row_count'] for prefix in prefixes], dtype=float)
+        squares = np.array([self.variance_sums[prefix][0] for prefix in prefixes], dtype=float)
+        products = np.array([self.variance_sums[prefix][1] for prefix in prefixes], dtype=float)
+        unscanned = np.array([self.variance_sums[prefix][2] for prefix in prefixes], dtype=float)
+        estimates = counts / self.total_rows
+        variances = (squares - 2 * estimates * products + estimates ** 2 * self.density_variance +
+                     unscanned * (1 - 2 * estimates) + estimates ** 2 * self.unscanned_rows) / self.total_rows ** 2
+        margins = Z_SCORES[self.confidence] * np.sqrt(np.maximum(variances, 0))
+        lows = np.maximum(estimates - margins, 0) * 100
+        highs = np.minimum(estimates + margins, 1) * 100
+        for (prefix, low, high) in zip(prefixes, lows, highs):
+            self.rows[prefix]['ci'] = '{0:.2f} - {1:.2f}'.format(low, high)
+            self.rows[prefix]['ci_high'] = high
+
     def bytes_to_str(self, arg):
         # unfortunately this is passed in a type str, must encode char by char
         #if isStr(arg):
@@ -216,6 +552,8 @@ class HBaseTableRegionRowDistribution(CLI):
                             self.row_count_width +
                             self.row_count_pc_width +
                             len(self.separator) * 2)
+        if self.sample:
+            self.total_width += len(self.separator) + len(self.ci_header)
 
     def calculate_row_percentages(self):
         log.info('calculating row percentages')
@@ -230,6 +568,8 @@ class HBaseTableRegionRowDistribution(CLI):
         for row_prefix in self.rows:
             self.rows[row_prefix]['pc'] = '{0:.2f}'.format(self.rows[row_prefix]['row_count'] /
                                                            max(self.total_rows, 1) * 100)
+        if self.sample:
+            self.calculate_confidence_intervals()
 
     def print_table_row_prefix_counts(self):
         print('=' * self.total_width)
@@ -240,8 +580,11 @@ class HBaseTableRegionRowDistribution(CLI):
         print('{0:{1}}{2}{3}'.format(self.row_count_header,
                                      self.row_count_width,
                                      self.separator,
-                                     self.row_count_pc_header)
-             )
+                                     self.row_count_pc_header),
+              end='')
+        if self.sample:
+            print('{0}{1}'.format(self.separator, self.ci_header), end='')
+        print()
         print('=' * self.total_width)
         tmp_list = [merge_dicts({'key_prefix': key}, self.rows[key]) for key in self.rows]
         if self.sort:
@@ -257,14 +600,22 @@ class HBaseTableRegionRowDistribution(CLI):
             print('{0:{1}}{2}{3:>10}'.format(item['row_count'],
                                              self.row_count_width,
                                              self.separator,
-                                             item['pc']))
+                                             item['pc']),
+                  end='')
+            if self.sample:
+                print('{0}{1:>{2}}'.format(self.separator, item['ci'], self.row_count_pc_width), end='')
+            print()
 
     def print_summary(self):
         np_rows = np.array([int(self.rows[row]['row_count']) for row in self.rows])
         avg_rows = np_rows.mean()
         (first_quartile, median, third_quartile) = np.percentile(np_rows, [25, 50, 75]) # pylint: disable=no-member
         print()
-        print('Total Rows: {0:d}'.format(self.total_rows))
+        if self.sample:
+            print('Rows Sampled: {0:d} (from {1} of {2} regions, {3} scanned completely, weighted to {4:d} rows)'
+                  .format(self.rows_sampled, self.num_samples, self.num_regions, self.num_complete, self.total_rows))
+        else:
+            print('Total Rows: {0:d}'.format(self.total_rows))
         print('Unique Row Key Prefixes (length \'{0}\'): {1}'.format(self.prefix_length, len(self.rows)))
         print('Average Rows Per Prefix: {0:.2f} ({1:.2f}%)'.format(avg_rows, avg_rows / self.total_rows * 100))
         width = 0
@@ -278,6 +629,18 @@ class HBaseTableRegionRowDistribution(CLI):
         print('median:        {0:{1}} ({2:.2f}%)'.format(median, width, median / self.total_rows * 100))
         print('3rd quartile:  {0:{1}} ({2:.2f}%)'.format(third_quartile, width, third_quartile / self.total_rows * 100))
         print()
+        if self.sample:
+            self.print_skew(avg_rows)
+
+    def print_skew(self, avg_rows):
+        (prefix, largest) = max(self.rows.items(), key=lambda _: _[1]['row_count'])
+        print('Largest Prefix: \'{0}\' estimated {1}% of rows ({2}% confidence interval {3}%)'
+              .format(prefix, largest['pc'], self.confidence, largest['ci']))
+        print('Skew: {0:.2f}x the average prefix'.format(largest['row_count'] / avg_rows), end='')
+        if 'ci_high' in largest:
+            print(', up to {0:.2f}x'.format(largest['ci_high'] / 100 * self.total_rows / avg_rows), end='')
+        print()
+        print()
 
 
 if __name__ == '__main__':
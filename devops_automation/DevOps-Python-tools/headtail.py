@@ -19,6 +19,10 @@
 Tool to show the first and last N lines. Works like a standard unix filter program for all files passed as arguments
 or if no files are given then it applies to standard input.
 
+Regular files are not read into memory, the head is read from the start and the tail found by seeking backwards from
+the end of the file in blocks, so this is fast even on multi-GB logs. Standard input and other unseekable inputs are
+streamed through a ring buffer holding only the last N lines.
+
 """
 
 from __future__ import absolute_import
@@ -27,12 +31,14 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import os
+import stat
 import sys
+from collections import deque
 libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
 sys.path.append(libdir)
 try:
     # pylint: disable=wrong-import-position
-    from harisekhon.utils import die, ERRORS, log_option, isInt
+    from harisekhon.utils import die, ERRORS, log_option, isInt, validate_int
     from harisekhon import CLI
 except ImportError as _:
     print('module import failed: %s' % _, file=sys.stderr)
@@ -41,7 +47,7 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.3.2'
+__version__ = '0.4.0'
 
 class HeadTail(CLI):
 
@@ -61,6 +67,9 @@ class HeadTail(CLI):
         self.docsep = '=' * 80
         self.quiet = False
         self.timeout_default = None
+        self.blocksize = 64 * 1024
+        # write bytes so files of any encoding pass through unchanged and blocks can be copied without decoding
+        self.stdout = getattr(sys.stdout, 'buffer', sys.stdout)
 
     def add_options(self):
         #self.timeout_default = 300
@@ -75,6 +84,7 @@ class HeadTail(CLI):
 
     def run(self):
         self.num_lines = self.get_opt('num')
+        validate_int(self.num_lines, 'number of lines', 1)
         log_option('number of lines', self.num_lines)
         self.quiet = self.get_opt('quiet')
         log_option('quiet', self.quiet)
@@ -94,22 +104,122 @@ class HeadTail(CLI):
                 die("path '%s' could not be determined as either a file or directory" % arg)
         for filename in self.args:
             if filename == '-':
-                self.headtail(sys.stdin.read())
+                self.headtail_stream(getattr(sys.stdin, 'buffer', sys.stdin))
             else:
-                with open(filename) as _:
-                    self.headtail(_.read())
+                with open(filename, 'rb') as filehandle:
+                    if stat.S_ISREG(os.fstat(filehandle.fileno()).st_mode):
+                        self.headtail_file(filehandle)
+                    else:
+                        self.headtail_stream(filehandle)
             if not self.quiet and len(self.args) > 1:
-                print(self.docsep)
-
-    def headtail(self, content):
-        lines = content.split(os.linesep)
-        if self.num_lines >= len(lines) / 2:
-            print(content, end='')
-        else:
-            print(os.linesep.join(lines[:self.num_lines]))
-            if not self.quiet:
-                print(self.sep)
-            print(os.linesep.join(lines[-self.num_lines:]).rstrip(os.linesep))
+                self.write_line(self.docsep)
+            self.stdout.flush()
+
+    def write_line(self, line):
+        if not isinstance(line, bytes):
+            line = line.encode('utf-8')
+        self.stdout.write(line + b'\n')
+
+    def copy_range(self, filehandle, start, end):
+        filehandle.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = filehandle.read(min(self.blocksize, remaining))
+            if not block:
+                break
+            self.stdout.write(block)
+            remaining -= len(block)
+
+    def find_head_newline(self, filehandle):
+        """
+        Returns the offset of the Nth newline from the start of the file or None if there are fewer than N
+        """
+        filehandle.seek(0)
+        offset = 0
+        count = 0
+        while True:
+            block = filehandle.read(self.blocksize)
+            if not block:
+                return None
+            pos = -1
+            while True:
+                pos = block.find(b'\n', pos + 1)
+                if pos == -1:
+                    break
+                count += 1
+                if count == self.num_lines:
+                    return offset + pos
+            offset += len(block)
+
+    def find_tail_newline(self, filehandle, size):
+        """
+        Returns the offset of the Nth newline from the end of the file, reading backwards from the end in blocks,
+        or None if there are fewer than N
+        """
+        end = size
+        count = 0
+        while end > 0:
+            start = max(0, end - self.blocksize)
+            filehandle.seek(start)
+            block = filehandle.read(end - start)
+            pos = len(block)
+            while True:
+                pos = block.rfind(b'\n', 0, pos)
+                if pos == -1:
+                    break
+                count += 1
+                if count == self.num_lines:
+                    return start + pos
+            end = start
+        return None
+
+    # The output is the same as splitting the whole content on newlines and printing the first and last N items,
+    # or the entire content if there are no more than 2N items, including the quirk that a trailing newline counts
+    # as an empty last item
+    def headtail_file(self, filehandle):
+        filehandle.seek(0, os.SEEK_END)
+        size = filehandle.tell()
+        tail_newline = self.find_tail_newline(filehandle, size)
+        head_newline = None
+        if tail_newline is not None:
+            head_newline = self.find_head_newline(filehandle)
+        if head_newline is None or head_newline >= tail_newline:
+            self.copy_range(filehandle, 0, size)
+            return
+        self.copy_range(filehandle, 0, head_newline)
+        self.stdout.write(b'\n')
+        if not self.quiet:
+            self.write_line(self.sep)
+        filehandle.seek(tail_newline + 1)
+        self.write_line(filehandle.read(size - tail_newline - 1).rstrip(b'\n'))
+
+    def headtail_stream(self, filehandle):
+        head = []
+        # ring buffer so memory use is bounded by N lines regardless of the input size
+        tail = deque(maxlen=self.num_lines)
+        newlines = 0
+        line = b''
+        for line in filehandle:
+            if line.endswith(b'\n'):
+                newlines += 1
+            if len(head) < self.num_lines:
+                head.append(line)
+            else:
+                tail.append(line)
+        if newlines < 2 * self.num_lines:
+            # nothing was dropped from the ring buffer in this case
+            for _ in head:
+                self.stdout.write(_)
+            for _ in tail:
+                self.stdout.write(_)
+            return
+        self.stdout.write(b''.join(head))
+        if not self.quiet:
+            self.write_line(self.sep)
+        if line.endswith(b'\n'):
+            # a trailing newline counts as an empty last line
+            tail.popleft()
+        self.write_line(b''.join(tail).rstrip(b'\n'))
 
 
 if __name__ == '__main__':
@@ -34,6 +34,19 @@ or further manipulated easily in shell pipelines, eg. piped in to HDFS or underg
 
 Broken json documents are printed to standard error for collecting to an error log
 
+Files are converted in parallel across a pool of processes (--parallelism, one per core by default), handed out in
+batches of --batch-size files to keep the overhead low for directories of millions of small json files, with the output
+order preserved both within and across input files. The output of big multi-record files is passed back through
+temporary spool files a chunk at a time rather than held in memory
+
+--fast mode is for input that is already known to be valid json. It skips parsing and re-serializing each document,
+only stripping the newlines out of single document files and passing through the non-blank lines of multi-record files
+
+--bulk mode outputs Elasticsearch Bulk API format, with an action metadata line (eg. {"index": {"_index": "myindex"}})
+before each document. --output-prefix writes the output to numbered files <prefix>.00000.json, <prefix>.00001.json...
+rotating to the next file before exceeding --max-bytes or --max-docs, so each file can be posted as a single bulk
+request within the cluster's request size limits. An action line and its document are never split across files
+
 Single quoted JSON while not technically valid is supported as some systems like MongoDB permit it, and it has handling
 which permits detecting and escaping embedded double quotes if necessary, as well as skipping blank lines in
 multi-record json for convenience
@@ -47,14 +60,18 @@ from __future__ import print_function
 
 import json
 import os
+import pickle
 import re
+import shutil
 import sys
+import tempfile
+from multiprocessing import Pool, cpu_count
 libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
 sys.path.append(libdir)
 try:
     # pylint: disable=wrong-import-position
     from harisekhon.utils import isJson, die, printerr, ERRORS, log_option, uniq_list_ordered, validate_regex
-    from harisekhon.utils import log
+    from harisekhon.utils import log, validate_int
     from harisekhon import CLI
 except ImportError as _:
     print('module import failed: %s' % _, file=sys.stderr)
@@ -63,11 +80,224 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.6.0'
+__version__ = '0.8.2'
 
 # TODO: unify all validate_* and this programs in to a class hierarchy as a lot of the code is similar
 
 
+def convert_single_quoted(content):
+    return content.replace("'", '"')
+
+
+def convert_single_quoted_escaped(content):
+    return convert_single_quoted(content.replace('"', r'\"'))
+
+
+# set in each worker process by init_worker() rather than pickling them with every file
+OPTIONS = {
+    'permit_single_quotes': False,
+    'continue_on_error': False,
+    'fast': False,
+    'spool_dir': None,
+}
+
+# content per chunk of converted documents written out or passed back from a worker process at a time
+CHUNK_BYTES = 1024 * 1024
+
+
+def init_worker(permit_single_quotes, continue_on_error, fast, spool_dir=None):
+    OPTIONS['permit_single_quotes'] = permit_single_quotes
+    OPTIONS['continue_on_error'] = continue_on_error
+    OPTIONS['fast'] = fast
+    OPTIONS['spool_dir'] = spool_dir
+
+
+def strip_newlines(content):
+    # raw newlines can only occur between tokens in valid json, never inside strings, so are safe to remove
+    return content.replace('\r', '').replace('\n', '')
+
+
+def convert_json(content, permit_single_quotes=False):
+    """
+    Returns the content re-serialized as a single line of JSON, or None if it isn't valid JSON
+    """
+    if isJson(content):
+        return json.dumps(json.loads(content))
+    elif permit_single_quotes:
+        # check if it's regular single quoted JSON a la MongoDB
+        # then check if it's single quoted JSON with double quotes that aren't escaped,
+        # by pre-escaping them before converting single quotes to doubles for processing
+        for converted in (convert_single_quoted(content), convert_single_quoted_escaped(content)):
+            if isJson(converted):
+                return json.dumps(json.loads(converted))
+    return None
+
+
+def is_multirecord_json(filehandle):
+    """
+    Checks if it's a Big Data format file with json doc on one of the first lines
+
+    This is more efficient than slurping a large file only to fail with out of memory
+    """
+    for _ in range(1, 10):
+        line = filehandle.readline()
+        if line:
+            if isJson(line) or \
+               isJson(convert_single_quoted(line)) or \
+               isJson(convert_single_quoted_escaped(line)):
+                return True
+    return False
+
+
+def iter_file(filename):
+    """
+    Generates (is_doc, content) for each converted single line json document of a file of either a single json
+    document or multi-record json with one document per line, or (False, content) for each invalid document, in order
+
+    Multi-record files are read line by line so they are never held in memory. Stops after the first invalid document
+    unless continue_on_error. Raises IOError
+    """
+    permit_single_quotes = OPTIONS['permit_single_quotes']
+    continue_on_error = OPTIONS['continue_on_error']
+    fast = OPTIONS['fast']
+    with open(filename) as filehandle:
+        if is_multirecord_json(filehandle):
+            log.debug("header line of '%s' detected as a valid JSON document, " +
+                      "assuming Big Data format multi-line json", filename)
+            lines = None
+        else:
+            filehandle.seek(0)
+            try:
+                lines = [filehandle.read()]
+            except MemoryError:
+                # may be a big data format after all and perhaps the first record was broken
+                log.warning("memory error validating contents from file '%s', " +
+                            "assuming Big Data multi-record json and re-trying validation line-by-line", filename)
+                lines = None
+        if lines is None:
+            filehandle.seek(0)
+            lines = filehandle
+        elif fast:
+            yield (True, strip_newlines(lines[0]).strip())
+            return
+        for line in lines:
+            if line.strip() == '' and lines is filehandle:
+                continue
+            if fast:
+                yield (True, line.rstrip('\r\n'))
+                continue
+            doc = convert_json(line, permit_single_quotes)
+            if doc is None:
+                yield (False, line)
+                if not continue_on_error:
+                    break
+            else:
+                yield (True, doc)
+
+
+def iter_chunks(events, chunk_bytes=CHUNK_BYTES):
+    """
+    Groups the (is_doc, content) events in to lists of roughly chunk_bytes of content
+    """
+    chunk = []
+    size = 0
+    for event in events:
+        chunk.append(event)
+        size += len(event[1])
+        if size >= chunk_bytes:
+            yield chunk
+            chunk = []
+            size = 0
+    if chunk:
+        yield chunk
+
+
+def iter_spool(spool):
+    """
+    Generates the chunks pickled to a spool file by convert_file()
+    """
+    with open(spool, 'rb') as filehandle:
+        while True:
+            try:
+                yield pickle.load(filehandle)
+            except EOFError:
+                break
+
+
+# module level function so it can be pickled to the process pool
+def convert_file(filename):
+    """
+    Converts a file in a worker process
+
+    Returns (filename, chunks, spool, error) where chunks is the list of chunks of (is_doc, content) events from
+    iter_file() for files with up to one chunk of output, otherwise None and spool is the path of a temporary file
+    in the spool_dir the chunks were pickled to instead, so that big multi-record files are streamed through disk
+    rather than held in memory and pickled back to the parent whole. error is None or an IOError message
+    """
+    chunks = []
+    spool = None
+    error = None
+    try:
+        for chunk in iter_chunks(iter_file(filename)):
+            chunks.append(chunk)
+            if len(chunks) > 1:
+                if spool is None:
+                    spool = tempfile.NamedTemporaryFile(dir=OPTIONS['spool_dir'], suffix='.spool', delete=False)
+                for _ in chunks:
+                    pickle.dump(_, spool, pickle.HIGHEST_PROTOCOL)
+                chunks = []
+    except IOError as _:
+        error = str(_)
+    if spool is None:
+        return (filename, chunks, None, error)
+    for _ in chunks:
+        pickle.dump(_, spool, pickle.HIGHEST_PROTOCOL)
+    spool.close()
+    return (filename, None, spool.name, error)
+
+
+class BulkFileWriter(object):
+    """
+    Writes to numbered files <prefix>.00000.json, <prefix>.00001.json... rotating before exceeding max_bytes or
+    max_docs (0 meaning unlimited). Each write is one document unit which is never split across files
+    """
+
+    buffer_size = 1024 * 1024
+
+    def __init__(self, prefix, max_bytes=0, max_docs=0):
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_docs = max_docs
+        self.filehandle = None
+        self.file_num = -1
+        self.num_bytes = 0
+        self.num_docs = 0
+
+    def rotate(self):
+        self.close()
+        self.file_num += 1
+        filename = '{0}.{1:05d}.json'.format(self.prefix, self.file_num)
+        log.info("writing to '%s'", filename)
+        self.filehandle = open(filename, 'wb', self.buffer_size)
+        self.num_bytes = 0
+        self.num_docs = 0
+
+    def write(self, unit):
+        data = unit.encode('utf-8')
+        if self.filehandle is None or \
+           (self.num_docs and self.max_bytes and self.num_bytes + len(data) > self.max_bytes) or \
+           (self.max_docs and self.num_docs >= self.max_docs):
+            self.rotate()
+        self.filehandle.write(data)
+        self.num_bytes += len(data)
+        self.num_docs += 1
+
+    def close(self):
+        if self.filehandle is not None:
+            self.filehandle.close()
+            self.filehandle = None
+
+
 class JsonDocsToBulkMultiline(CLI):
 
     def __init__(self):
@@ -75,13 +305,17 @@ class JsonDocsToBulkMultiline(CLI):
         super(JsonDocsToBulkMultiline, self).__init__()
         # Python 3.x
         # super().__init__()
-        self.iostream = None
         self.re_json_suffix = re.compile(r'.*\.json$', re.I)
         self.permit_single_quotes = False
         self.failed = False
         self.continue_on_error = False
-        self.single_quotes_detected = False
         self.exclude = None
+        self.parallelism = None
+        self.batch_size = None
+        self.fast = False
+        self.pool = None
+        self.action_line = None
+        self.writer = None
 
     def add_options(self):
         self.add_opt('-s', '--permit-single-quotes', dest='permit_single_quotes', action='store_true', default=False,
@@ -93,12 +327,59 @@ class JsonDocsToBulkMultiline(CLI):
                           'broken documents are printed to standard error for collection redirect to an error log')
         self.add_opt('-e', '--exclude', metavar='regex', default=os.getenv('EXCLUDE'),
                      help='Regex of file / directory paths to exclude from checking ($EXCLUDE)')
+        self.add_opt('-n', '--parallelism', metavar='num', type='int', default=cpu_count(),
+                     help='Number of processes to convert files with in parallel ' +
+                     '(default: number of cores: {0})'.format(cpu_count()))
+        self.add_opt('-z', '--batch-size', metavar='num', type='int', default=100,
+                     help='Number of files to hand to each process at a time (default: 100)')
+        self.add_opt('-f', '--fast', action='store_true', default=False,
+                     help='Fast path for input already known to be valid json, skips parsing and only strips ' +
+                     'newlines, invalid json will NOT be detected')
+        self.add_opt('-b', '--bulk', action='store_true', default=False,
+                     help='Output Elasticsearch Bulk API format with an action line before each document')
+        self.add_opt('-i', '--index', help='Index name to put in the --bulk action lines (optional, ' +
+                     'if not given the index must be specified in the bulk request URL instead)')
+        self.add_opt('-a', '--action', default='index', choices=['index', 'create'],
+                     help='Bulk action for each document in --bulk mode (index or create, default: index)')
+        self.add_opt('-o', '--output-prefix', metavar='path',
+                     help='Write output to numbered files <path>.00000.json, <path>.00001.json... ' +
+                     'rotating according to --max-bytes and --max-docs, instead of to standard output')
+        self.add_opt('-B', '--max-bytes', metavar='bytes', type='int', default=10 * 1024 * 1024,
+                     help='Rotate --output-prefix files before they exceed this many bytes ' +
+                     '(default: 10MB, 0 for unlimited)')
+        self.add_opt('--max-docs', metavar='num', type='int', default=0,
+                     help='Rotate --output-prefix files after this many documents (default: 0 for unlimited)')
 
     def process_options(self):
         self.exclude = self.get_opt('exclude')
         if self.exclude:
             validate_regex(self.exclude, 'exclude')
             self.exclude = re.compile(self.exclude, re.I)
+        self.parallelism = self.get_opt('parallelism')
+        validate_int(self.parallelism, 'parallelism', 1, 1000)
+        self.parallelism = int(self.parallelism)
+        self.batch_size = self.get_opt('batch_size')
+        validate_int(self.batch_size, 'batch size', 1)
+        self.batch_size = int(self.batch_size)
+        self.fast = self.get_opt('fast')
+        if self.fast and self.get_opt('permit_single_quotes'):
+            self.usage('--fast and --permit-single-quotes are mutually exclusive as --fast does not parse the json')
+        if self.get_opt('bulk'):
+            action = {}
+            if self.get_opt('index'):
+                action['_index'] = self.get_opt('index')
+            self.action_line = json.dumps({self.get_opt('action'): action})
+            log_option('bulk action', self.action_line)
+        elif self.get_opt('index'):
+            self.usage('--index can only be used with --bulk')
+        output_prefix = self.get_opt('output_prefix')
+        if output_prefix:
+            validate_int(self.get_opt('max_bytes'), 'max bytes', 0)
+            validate_int(self.get_opt('max_docs'), 'max docs', 0)
+            log_option('output prefix', output_prefix)
+            self.writer = BulkFileWriter(output_prefix,
+                                         max_bytes=int(self.get_opt('max_bytes')),
+                                         max_docs=int(self.get_opt('max_docs')))
 
     def is_excluded(self, path):
         if self.exclude and self.exclude.search(path):
@@ -111,6 +392,9 @@ class JsonDocsToBulkMultiline(CLI):
         self.continue_on_error = self.get_opt('continue_on_error')
         log_option('permit single quotes', self.permit_single_quotes)
         log_option('continue on error', self.continue_on_error)
+        log_option('fast', self.fast)
+        worker_options = (self.permit_single_quotes, self.continue_on_error, self.fast)
+        init_worker(*worker_options)
         if not self.args:
             self.args.append('-')
         args = uniq_list_ordered(self.args)
@@ -122,89 +406,65 @@ class JsonDocsToBulkMultiline(CLI):
             if not os.path.exists(arg):
                 print("'{0}' not found".format(arg))
                 sys.exit(ERRORS['CRITICAL'])
-        for arg in args:
-            self.process_path(arg)
+        spool_dir = None
+        if self.parallelism > 1:
+            # workers spool the output of big files here for the parent to copy out in order
+            spool_dir = tempfile.mkdtemp(prefix='json_docs_to_bulk_multiline.')
+            self.pool = Pool(processes=self.parallelism, initializer=init_worker,
+                             initargs=worker_options + (spool_dir,))
+        try:
+            for arg in args:
+                self.process_path(arg)
+        finally:
+            if self.pool is not None:
+                self.pool.terminate()
+            if spool_dir is not None:
+                shutil.rmtree(spool_dir, ignore_errors=True)
+            if self.writer is not None:
+                self.writer.close()
         if self.failed:
             sys.exit(ERRORS['CRITICAL'])
 
-    @staticmethod
-    def convert_single_quoted(content):
-        return content.replace("'", '"')
-
-    def convert_single_quoted_escaped(self, content):
-        return self.convert_single_quoted(content.replace('"', r'\"'))
+    def output(self, docs):
+        if self.action_line:
+            docs = [self.action_line + '\n' + doc for doc in docs]
+        if self.writer is not None:
+            for doc in docs:
+                self.writer.write(doc + '\n')
+        elif docs:
+            # one write per file rather than per document
+            sys.stdout.write('\n'.join(docs) + '\n')
 
-    def process_multirecord_json(self, filename):
-        log.debug('process_multirecord_json()')
-        log.debug('rewinding I/O stream')
-        self.iostream.seek(0)
-        for line in self.iostream:
-            if line.strip() == '':
-                continue
-            if self.process_json(line, filename):
-                continue
-        if self.failed:
-            return False
-        return True
-
-    def process_json(self, content, filename):
-        log.debug('process_json()')
-        if not content:
-            log.warning("blank content passed to process_json for contents of file '%s'", filename)
-        if isJson(content):
-            print(json.dumps(json.loads(content)))
-            return True
-        elif self.permit_single_quotes:
-            log.debug('checking for single quoted JSON')
-            # check if it's regular single quoted JSON a la MongoDB
-            json_single_quoted = self.convert_single_quoted(content)
-            if self.process_json_single_quoted(json_single_quoted, filename):
-                return True
-            log.debug('single quoted JSON check failed, trying with pre-escaping double quotes')
-            # check if it's single quoted JSON with double quotes that aren't escaped,
-            # by pre-escaping them before converting single quotes to doubles for processing
-            json_single_quoted_escaped = self.convert_single_quoted_escaped(content)
-            if self.process_json_single_quoted(json_single_quoted_escaped, filename):
-                log.debug("processed single quoted json with non-escaped double quotes in '%s'", filename)
-                return True
-            log.debug('single quoted JSON check failed even with pre-escaping any double quotes')
+    def broken(self, content, filename):
         self.failed = True
         log.error("invalid json detected in '%s':", filename)
         printerr(content)
         if not self.continue_on_error:
             sys.exit(ERRORS['CRITICAL'])
-        return False
 
-    def process_json_single_quoted(self, content, filename):
-        if isJson(content):
-            if not self.single_quotes_detected:
-                log.debug("detected single quoted json in '%s'", filename)
-                self.single_quotes_detected = True
-            print(json.dumps(json.loads(content)))
-            return True
-        return False
-
-    # looks like this does a .read() anyway, not buying any efficiency enhancement
-    #
-    #  usage:
-    # self.process_json_fp(self.iostream)
-    # must reset afterwards, otherwise next check will result in Invalid JSON due to blank
-    # self.iostream.seek(0)
-    #
-    # def process_json_fp(self, fp):
-    #     try:
-    #         json.load(fp)
-    #         return True
-    #     except ValueError:
-    #         die(self.invalid_json_msg)
+    def process_json(self, content, filename):
+        log.debug('process_json()')
+        if not content:
+            log.warning("blank content passed to process_json for contents of file '%s'", filename)
+        if self.fast:
+            doc = strip_newlines(content).strip()
+        else:
+            doc = convert_json(content, self.permit_single_quotes)
+        if doc is None:
+            self.broken(content, filename)
+            return False
+        self.output([doc])
+        return True
 
     def process_path(self, path):
         if self.is_excluded(path):
             return
-        if path == '-' or os.path.isfile(path):
-            self.process_file(path)
+        if path == '-':
+            self.process_json(sys.stdin.read(), '<STDIN>')
+        elif os.path.isfile(path):
+            self.process_files([path])
         elif os.path.isdir(path):
-            self.walk(path)
+            self.process_files(self.walk(path))
         else:
             die("path '{0}' could not be determined as either a file or directory".format(path))
 
@@ -218,44 +478,44 @@ class JsonDocsToBulkMultiline(CLI):
             dirs[:] = [d for d in dirs if not self.is_excluded(os.path.join(root, d))]
             for filename in files:
                 file_path = os.path.join(root, filename)
-                if self.re_json_suffix.match(file_path):
-                    self.process_file(file_path)
+                if self.re_json_suffix.match(file_path) and not self.is_excluded(file_path):
+                    yield file_path
 
-    def process_file(self, filename):
-        if self.is_excluded(filename):
+    def output_chunk(self, chunk, filename):
+        docs = []
+        for (is_doc, content) in chunk:
+            if is_doc:
+                docs.append(content)
+            else:
+                # docs before the broken document are output first, same as converting serially
+                self.output(docs)
+                docs = []
+                self.broken(content, filename)
+        self.output(docs)
+
+    def process_files(self, filenames):
+        if self.pool is None:
+            # stream straight to the output
+            for filename in filenames:
+                try:
+                    for chunk in iter_chunks(iter_file(filename)):
+                        self.output_chunk(chunk, filename)
+                except IOError as _:
+                    die("ERROR: %s" % _)
             return
-        if filename == '-':
-            self.iostream = sys.stdin
-            self.process_json(sys.stdin.read(), '<STDIN>')
-        else:
-            # reset this flag which we use to only print single quote detection once per file
-            self.single_quotes_detected = False
+        # imap rather than imap_unordered to preserve the output order
+        for (filename, chunks, spool, error) in self.pool.imap(convert_file, filenames, chunksize=self.batch_size):
+            if error is not None:
+                die("ERROR: %s" % error)
+            if spool is None:
+                for chunk in chunks:
+                    self.output_chunk(chunk, filename)
+                continue
             try:
-                with open(filename) as self.iostream:
-                    # check if it's a Big Data format file with json doc on first line
-                    # this is more efficient than slurping a large file only to fail with out of memory
-                    for _ in range(1, 10):
-                        line = self.iostream.readline()
-                        if line:
-                            if isJson(line) or \
-                               isJson(self.convert_single_quoted(line)) or \
-                               isJson(self.convert_single_quoted_escaped(line)):
-                                log.debug("header line of '{0}' detected as a valid JSON document".format(filename) +
-                                          ", assuming Big Data format multi-line json")
-                                self.process_multirecord_json(filename)
-                                break
-                    else:
-                        try:
-                            self.iostream.seek(0)
-                            content = self.iostream.read()
-                            self.process_json(content, filename)
-                        except MemoryError:
-                            # may be a big data format after all and perhaps the first record was broken
-                            log.warning("memory error validating contents from file '{0}', ".format(filename) +
-                                        "assuming Big Data multi-record json and re-trying validation line-by-line")
-                            self.process_multirecord_json(filename)
-            except IOError as _:
-                die("ERROR: %s" % _)
+                for chunk in iter_spool(spool):
+                    self.output_chunk(chunk, filename)
+            finally:
+                os.unlink(spool)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+#  vim:ts=4:sts=4:sw=4:et
+#
+#  Author: Hari Sekhon
+#  Date: 2026-10-19 10:12:41 +0100 (Mon, 19 Oct 2026)
+#
+#  https://github.com/HariSekhon/DevOps-Python-tools
+#
+#  License: see accompanying Hari Sekhon LICENSE file
+#
+#  If you're using my code you're welcome to connect with me on LinkedIn
+#  and optionally send me feedback to help steer this or other code I publish
+#
+#  https://www.linkedin.com/in/HariSekhon
+#
+
+"""
+
+Batch directory to directory conversion shared by the json_to_yaml.py / yaml_to_json.py / xml_to_yaml.py /
+xml_to_json.py tools for their --output-dir mode
+
+Mirrors each input directory tree under the output directory, converting files in parallel on a process pool,
+skipping any output files that are already newer than their input files, and reporting per-file failures
+without aborting the rest of the batch
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import sys
+import time
+from multiprocessing import Pool, cpu_count
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pylib'))
+sys.path.append(libdir)
+try:
+    # pylint: disable=wrong-import-position
+    from harisekhon.utils import die, log, log_option, validate_int
+except ImportError as _:
+    print('module import failed: %s' % _, file=sys.stderr)
+    print("Did you remember to build the project by running 'make'?", file=sys.stderr)
+    print("Alternatively perhaps you tried to copy this program out without it's adjacent libraries?", file=sys.stderr)
+    sys.exit(4)
+
+__author__ = 'Hari Sekhon'
+__version__ = '0.1.1'
+
+
+# module level function so it can be pickled to the process pool
+def convert_file(args):
+    """
+    Converts src to dest using converter, which must be a picklable function taking the file content and returning
+    the converted string or bytes, and raising an exception on failure
+
+    Returns (src, dest, error) where error is None on success
+    """
+    (converter, src, dest) = args
+    try:
+        with open(src) as filehandle:
+            output = converter(filehandle.read())
+        dest_dir = os.path.dirname(dest)
+        if dest_dir and not os.path.isdir(dest_dir):
+            try:
+                os.makedirs(dest_dir)
+            except OSError:
+                # another worker may have created it in the meantime
+                if not os.path.isdir(dest_dir):
+                    raise
+        # write to a tmp file and rename so an interrupted run never leaves a partial file newer than its input
+        tmp = '{0}.tmp.{1}'.format(dest, os.getpid())
+        with open(tmp, 'wb' if isinstance(output, bytes) else 'w') as filehandle:
+            filehandle.write(output)
+            if not isinstance(output, bytes) and not output.endswith('\n'):
+                filehandle.write('\n')
+        os.rename(tmp, dest)
+    except Exception as _:  # pylint: disable=broad-except
+        return (src, dest, '{0}: {1}'.format(type(_).__name__, _))
+    return (src, dest, None)
+
+
+class BatchConverter(object):
+
+    def __init__(self, cli, converter, re_suffix, output_ext):
+        self.cli = cli
+        self.converter = converter
+        self.re_suffix = re_suffix
+        self.output_ext = output_ext
+        self.output_dir = None
+        self.parallelism = None
+        self.force = False
+
+    def add_options(self):
+        self.cli.add_opt('-o', '--output-dir', metavar='dir',
+                         help='Write each converted file to this directory, mirroring the input directory tree, ' +
+                         'converting files in parallel instead of printing to stdout')
+        self.cli.add_opt('-n', '--parallelism', metavar='num', type='int', default=cpu_count(),
+                         help='Number of processes to convert files with in --output-dir mode ' +
+                         '(default: number of cores: {0})'.format(cpu_count()))
+        self.cli.add_opt('-f', '--force', action='store_true',
+                         help='Convert all files in --output-dir mode, even if the output is newer than the input')
+
+    def process_options(self):
+        self.output_dir = self.cli.get_opt('output_dir')
+        if not self.output_dir:
+            return
+        log_option('output dir', self.output_dir)
+        self.parallelism = self.cli.get_opt('parallelism')
+        validate_int(self.parallelism, 'parallelism', 1, 1000)
+        self.parallelism = int(self.parallelism)
+        self.force = self.cli.get_opt('force')
+        if '-' in self.cli.args or not self.cli.args:
+            self.cli.usage('--output-dir requires files or directories as arguments, cannot read from stdin')
+
+    def output_path(self, relpath):
+        return os.path.join(self.output_dir, os.path.splitext(relpath)[0] + self.output_ext)
+
+    def find_jobs(self, paths):
+        """
+        Yields (src, dest) for each file to convert, mirroring directory trees under the output dir
+        and placing explicitly given files at the top level of the output dir
+
+        Dies if two different input files map to the same output file, such as dir1/x.json and dir2/x.json when given
+        dir1 and dir2, or x.yml and x.yaml, rather than letting one silently overwrite the other. As run() finds all
+        the jobs before starting the pool this happens before anything is converted
+        """
+        srcs = {}
+        for (src, dest) in self.walk_paths(paths):
+            dest = os.path.normpath(dest)
+            if dest in srcs:
+                # the same file found twice, eg. given both explicitly and in its directory, is only converted once
+                if os.path.realpath(src) != os.path.realpath(srcs[dest]):
+                    die("input files '{0}' and '{1}' would both be converted to '{2}', ".format(srcs[dest], src, dest) +
+                        'convert them in separate runs to different output directories')
+                continue
+            srcs[dest] = src
+            yield (src, dest)
+
+    def walk_paths(self, paths):
+        for path in paths:
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    for filename in files:
+                        src = os.path.join(root, filename)
+                        if self.re_suffix.match(src):
+                            yield (src, self.output_path(os.path.relpath(src, path)))
+            else:
+                yield (path, self.output_path(os.path.basename(path)))
+
+    def is_up_to_date(self, src, dest):
+        if self.force:
+            return False
+        try:
+            return os.path.getmtime(dest) >= os.path.getmtime(src)
+        except OSError:
+            return False
+
+    def run(self, paths):
+        """
+        Converts all files found under paths, returns the number of failures
+        """
+        start = time.time()
+        jobs = []
+        skipped = 0
+        for (src, dest) in self.find_jobs(paths):
+            if self.is_up_to_date(src, dest):
+                log.info("skipping '%s', output '%s' is up to date", src, dest)
+                skipped += 1
+                continue
+            jobs.append((self.converter, src, dest))
+        log.info('converting %s files in %s processes', len(jobs), self.parallelism)
+        failed = 0
+        pool = Pool(processes=self.parallelism)
+        try:
+            for (src, dest, error) in pool.imap_unordered(convert_file, jobs):
+                if error is None:
+                    print('{0} => {1}'.format(src, dest))
+                else:
+                    failed += 1
+                    print("ERROR: failed to convert '{0}': {1}".format(src, error), file=sys.stderr)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+        log.info('converted %s files, %s failed, %s skipped as up to date in %.2f secs',
+                 len(jobs) - failed, failed, skipped, time.time() - start)
+        return failed
@@ -0,0 +1,588 @@
+#!/usr/bin/env python3
+#  vim:ts=4:sts=4:sw=4:et
+#
+#  Author: Hari Sekhon
+#  Date: 2026-10-19 11:02:17 +0100 (Mon, 19 Oct 2026)
+#
+#  https://github.com/HariSekhon/DevOps-Python-tools
+#
+#  License: see accompanying Hari Sekhon LICENSE file
+#
+#  If you're using my code you're welcome to connect with me on LinkedIn
+#  and optionally send me feedback to help steer this or other code I publish
+#
+#  https://www.linkedin.com/in/HariSekhon
+#
+
+"""
+
+Asyncio prober engine for find_active_server.py and all the find_active_*.py subclasses
+
+Runs the socket / http / https / ping checks as coroutines on a single event loop with bounded concurrency, returning
+the first successful result and cancelling all outstanding probes the moment it arrives, with an optional global
+deadline after which any still running probes are abandoned
+
+HTTP(S) is spoken directly over asyncio streams so probes can be cancelled mid-request, following redirects and
+applying the --regex to the decoded content the same as the requests library based checks, and verifying certificates
+against the same $REQUESTS_CA_BUNDLE / $CURL_CA_BUNDLE. Proxies aren't supported, find_active_server.py uses its
+threads engine for checks that would go through a proxy from the environment. Idle keep-alive
+connections are kept for reuse by later probes of the same host, eg. in --rank and --watch modes, and the body is
+streamed through the regex matcher, stopping as soon as it matches
+
+Ping checks can be done in-process instead of forking the ping command per host, either by sending ICMP echo requests
+to all the hosts over a single unprivileged ICMP datagram socket per address family (Linux permits this for the groups
+in sysctl net.ipv4.ping_group_range, macOS for all users) or by TCP connecting to a port, where a refused connection
+still proves the host is up
+
+Python 3.5+ only, find_active_server.py falls back to its thread pool engine on Python 2
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import asyncio
+import codecs
+import os
+import random
+import re
+import socket
+import ssl
+import struct
+import sys
+from urllib.parse import urljoin, urlsplit
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pylib'))
+sys.path.append(libdir)
+try:
+    # pylint: disable=wrong-import-position
+    from harisekhon.utils import log
+except ImportError as _:
+    print('module import failed: %s' % _, file=sys.stderr)
+    print("Did you remember to build the project by running 'make'?", file=sys.stderr)
+    print("Alternatively perhaps you tried to copy this program out without it's adjacent libraries?", file=sys.stderr)
+    sys.exit(4)
+
+__author__ = 'Hari Sekhon'
+__version__ = '0.3.1'
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+# same limit as the requests library
+MAX_REDIRECTS = 30
+CHUNK_SIZE = 8192
+CHARSET_REGEX = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+
+def icmp_socket(family=socket.AF_INET):
+    proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+    return socket.socket(family, socket.SOCK_DGRAM, proto)
+
+
+def icmp_permitted():
+    """
+    Returns True if this user is permitted to open unprivileged ICMP datagram sockets
+    """
+    try:
+        icmp_socket().close()
+    except OSError as _:
+        log.debug('unprivileged ICMP socket not permitted: %s', _)
+        return False
+    return True
+
+
+def icmp_checksum(data):
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack('!{0}H'.format(len(data) // 2), data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+async def resolve(host, port=None, socktype=socket.SOCK_DGRAM):
+    """
+    Returns (family, sockaddr) for host without blocking the event loop, preferring IPv4 the same as ping does
+    """
+    infos = await asyncio.get_event_loop().getaddrinfo(host, port, type=socktype)
+    infos.sort(key=lambda _: _[0] != socket.AF_INET)
+    return (infos[0][0], infos[0][4])
+
+
+class IcmpProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, pinger):
+        self.pinger = pinger
+
+    def datagram_received(self, data, addr):
+        self.pinger.reply_received(data, addr)
+
+    def error_received(self, exc):
+        log.debug('ICMP socket error: %s', exc)
+
+
+class IcmpPinger(object):
+    """
+    Sends ICMP echo requests to any number of hosts concurrently over one unprivileged ICMP datagram socket per address
+    family, matching the replies back to the waiting pings by sequence number, source address and payload
+
+    The kernel sets the ICMP identifier to the socket's port and only delivers replies to that socket, so no privileges
+    are needed and other ping processes' traffic is never seen
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        # family => (socket, transport)
+        self.sockets = {}
+        # sequence => (address, future)
+        self.pending = {}
+        self.sequence = random.randint(0, 0xffff)
+        self.payload = os.urandom(16)
+
+    def close(self):
+        for (_, transport) in self.sockets.values():
+            transport.close()
+        self.sockets = {}
+
+    async def get_socket(self, family):
+        if family not in self.sockets:
+            sock = icmp_socket(family)
+            sock.setblocking(False)
+            (transport, _) = await self.loop.create_datagram_endpoint(lambda: IcmpProtocol(self), sock=sock)
+            self.sockets[family] = (sock, transport)
+        return self.sockets[family][0]
+
+    def next_sequence(self):
+        while True:
+            self.sequence = (self.sequence + 1) & 0xffff
+            if self.sequence not in self.pending:
+                return self.sequence
+
+    def reply_received(self, data, addr):
+        # macOS includes the IPv4 header, Linux doesn't
+        if data and data[0] >> 4 == 4:
+            data = data[(data[0] & 0x0f) * 4:]
+        if len(data) < 8:
+            return
+        (icmp_type, _, _, _, sequence) = struct.unpack('!BBHHH', data[:8])
+        if icmp_type not in (ICMP_ECHO_REPLY, ICMPV6_ECHO_REPLY) or data[8:] != self.payload:
+            return
+        pending = self.pending.get(sequence)
+        if pending and pending[0] == addr[0] and not pending[1].done():
+            pending[1].set_result(True)
+
+    async def ping(self, host, timeout):
+        """
+        Returns True if host replies within timeout secs, raises OSError if the ICMP socket can't be opened
+        """
+        try:
+            (family, sockaddr) = await resolve(host)
+        except OSError as _:
+            log.info("failed to resolve host '%s': %s", host, _)
+            return False
+        sock = await self.get_socket(family)
+        sequence = self.next_sequence()
+        if family == socket.AF_INET:
+            header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, 0, sequence)
+            checksum = icmp_checksum(header + self.payload)
+            header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, 0, sequence)
+        else:
+            # the kernel fills in the ICMPv6 checksum as it covers the IPv6 pseudo header
+            header = struct.pack('!BBHHH', ICMPV6_ECHO_REQUEST, 0, 0, 0, sequence)
+        future = self.loop.create_future()
+        self.pending[sequence] = (sockaddr[0], future)
+        try:
+            try:
+                sock.sendto(header + self.payload, sockaddr)
+            except OSError as _:
+                # eg. network unreachable, fail this host immediately rather than waiting for the timeout
+                log.info("failed to send ICMP echo request to host '%s': %s", host, _)
+                return False
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            del self.pending[sequence]
+
+
+class AsyncProber(object):
+
+    def __init__(self, regex=None, request_timeout=2, method='GET', matcher_class=None):
+        # compiled regex to search for in http content, or None
+        self.regex = regex
+        # applies to each connect / read individually, same as the requests library timeout
+        self.request_timeout = request_timeout
+        # GET, HEAD or RANGE, which is a GET for just the first byte
+        self.method = method
+        # class with feed(text) / finish() methods for streamed early exit regex matching, see find_active_server.py
+        self.matcher_class = matcher_class
+        # created on first https check, see get_ssl_context()
+        self.ssl_context = None
+        self.user_agent = 'find_active_server/{0}'.format(__version__)
+        # kept for the life of the prober so idle keep-alive connections can be reused across runs
+        self.loop = asyncio.new_event_loop()
+        # (scheme, host, port) => list of idle keep-alive (reader, writer) connections
+        self.connections = {}
+        # shared ICMP sockets for all ping probes, opened on first use
+        self.pinger = IcmpPinger(self.loop)
+
+    def close(self):
+        for connections in self.connections.values():
+            for (_, writer) in connections:
+                writer.close()
+        self.connections = {}
+        self.pinger.close()
+        self.loop.close()
+
+    async def with_timeout(self, coro):
+        return await asyncio.wait_for(coro, self.request_timeout)
+
+    async def check_socket(self, host, port):
+        log.info("checking host '%s' port '%s' socket", host, port)
+        try:
+            (_, writer) = await self.with_timeout(asyncio.open_connection(host, int(port)))
+        except (OSError, asyncio.TimeoutError):
+            return None
+        writer.close()
+        log.info("socket connected to host '%s' port '%s'", host, port)
+        return (host, port)
+
+    @staticmethod
+    async def check_ping(host, cmd):
+        log.info("pinging host '%s'", host)
+        log.debug('cmd: %s', ' '.join(cmd))
+        try:
+            process = await asyncio.create_subprocess_exec(*cmd,
+                                                           stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.PIPE)
+        except OSError as _:
+            raise OSError('error calling ping: {0}'.format(_))
+        try:
+            (stdout, stderr) = await process.communicate()
+        except asyncio.CancelledError:
+            # don't leave ping processes behind once another host has already won
+            process.kill()
+            raise
+        log.debug('stdout: %s', stdout)
+        log.debug('stderr: %s', stderr)
+        log.debug('exitcode: %s', process.returncode)
+        if process.returncode == 0:
+            log.info("host '%s' responded to ping", host)
+            return host
+        return None
+
+    async def check_icmp(self, host):
+        log.info("ICMP pinging host '%s'", host)
+        try:
+            if not await self.pinger.ping(host, self.request_timeout):
+                return None
+        except PermissionError as _:
+            raise OSError('error opening ICMP socket: {0}'.format(_))
+        log.info("host '%s' responded to ping", host)
+        return host
+
+    async def check_tcp_ping(self, host, port):
+        log.info("TCP pinging host '%s' port '%s'", host, port)
+        try:
+            # resolved first to connect to only one address, otherwise refusals from all of them are
+            # raised as one generic OSError that can't be told apart from other failures
+            (_, sockaddr) = await self.with_timeout(resolve(host, port, socket.SOCK_STREAM))
+            (_, writer) = await self.with_timeout(asyncio.open_connection(sockaddr[0], sockaddr[1]))
+            writer.close()
+        except ConnectionRefusedError:
+            # a reset means the host is up, there just isn't anything listening on the port
+            pass
+        except (OSError, asyncio.TimeoutError):
+            return None
+        log.info("host '%s' responded to TCP ping", host)
+        return host
+
+    async def check_http(self, host, port, protocol='http', url_path=''):
+        if not isinstance(url_path, str):
+            url_path = ''
+        url = '{protocol}://{host}:{port}/{url_path}'.format(protocol=protocol,
+                                                             host=host,
+                                                             port=port,
+                                                             url_path=url_path.lstrip('/'))
+        log.info('%s %s', self.method, url)
+        try:
+            if await self._check_http(url):
+                log.info("%s - passed all checks", url)
+                return (host, port)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as _:
+            log.info('%s - returned exception: %s', url, str(_) or type(_).__name__)
+        return None
+
+    async def _check_http(self, url):
+        (key, reader, writer, status, headers) = await self.fetch(url)
+        # only connections whose response has been fully read can be reused
+        reusable = False
+        try:
+            log.debug("%s - response: %s", url, status)
+            ok_status_codes = (200, 206) if self.method == 'RANGE' else (200,)
+            if status not in ok_status_codes:
+                log.info('%s - status code %s != 200', url, status)
+                return False
+            if self.regex:
+                log.info('%s - checking regex against content', url)
+                (matched, reusable) = await self.match_body(url, reader, headers)
+                if not matched:
+                    log.info('%s - regex did not match http output', url)
+                    return False
+                log.info('%s - regex matched http output', url)
+            elif self.method == 'HEAD':
+                reusable = True
+            elif self.method == 'RANGE' and status == 206:
+                reusable = await self.read_body(reader, headers, lambda _: False)
+            # otherwise don't download a body that nothing is going to check
+            return True
+        finally:
+            self.release(key, reader, writer, reusable and headers.get('connection', '').lower() != 'close')
+
+    async def connect(self, key, pooled=True):
+        """
+        Returns (reader, writer, reused) reusing an idle keep-alive connection if there is one
+        """
+        idle = self.connections.get(key)
+        while pooled and idle:
+            (reader, writer) = idle.pop()
+            if not reader.at_eof():
+                return (reader, writer, True)
+            writer.close()
+        (scheme, host, port) = key
+        (reader, writer) = await self.with_timeout(
+            asyncio.open_connection(host, port, ssl=self.get_ssl_context() if scheme == 'https' else None))
+        return (reader, writer, False)
+
+    def get_ssl_context(self):
+        """
+        Returns the SSL context verifying against $REQUESTS_CA_BUNDLE / $CURL_CA_BUNDLE if set, same as the requests
+        library used by the threads engine, raises OSError if the CA bundle can't be read which fails the check
+        """
+        if self.ssl_context is None:
+            ca_bundle = os.getenv('REQUESTS_CA_BUNDLE') or os.getenv('CURL_CA_BUNDLE')
+            if ca_bundle and os.path.isdir(ca_bundle):
+                self.ssl_context = ssl.create_default_context(capath=ca_bundle)
+            else:
+                self.ssl_context = ssl.create_default_context(cafile=ca_bundle or None)
+        return self.ssl_context
+
+    def release(self, key, reader, writer, reusable):
+        if reusable:
+            self.connections.setdefault(key, []).append((reader, writer))
+        else:
+            writer.close()
+
+    async def send_request(self, key, request):
+        """
+        Returns (reader, writer, status, headers), retrying once on a new connection if a pooled connection turns out
+        to have been closed by the server since it was last used
+        """
+        for pooled in (True, False):
+            (reader, writer, reused) = await self.connect(key, pooled)
+            done = False
+            try:
+                writer.write(request)
+                (status, headers) = await self.read_headers(reader)
+                done = True
+                return (reader, writer, status, headers)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                if not reused:
+                    raise
+                log.debug('pooled connection to %s:%s was closed, reconnecting', key[1], key[2])
+            finally:
+                if not done:
+                    writer.close()
+        raise IOError('failed to send request')
+
+    async def fetch(self, url):
+        """
+        Requests url following redirects, returns (key, reader, writer, status_code, headers) of the final response
+        with the body still to be read from the reader
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            default_port = 443 if parts.scheme == 'https' else 80
+            port = parts.port or default_port
+            key = (parts.scheme, parts.hostname, port)
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            host_header = parts.hostname if port == default_port else '{0}:{1}'.format(parts.hostname, port)
+            request = '{method} {path} HTTP/1.1\r\n' \
+                      'Host: {host}\r\n' \
+                      'User-Agent: {user_agent}\r\n' \
+                      'Accept: */*\r\n' \
+                      'Accept-Encoding: identity\r\n'.format(method='HEAD' if self.method == 'HEAD' else 'GET',
+                                                              path=path,
+                                                              host=host_header,
+                                                              user_agent=self.user_agent)
+            if self.method == 'RANGE':
+                request += 'Range: bytes=0-0\r\n'
+            request += '\r\n'
+            (reader, writer, status, headers) = await self.send_request(key, request.encode('utf-8'))
+            if status in REDIRECT_CODES and 'location' in headers:
+                writer.close()
+                url = urljoin(url, headers['location'])
+                log.debug('redirected to %s', url)
+                continue
+            return (key, reader, writer, status, headers)
+        raise IOError('exceeded {0} redirects'.format(MAX_REDIRECTS))
+
+    async def read_headers(self, reader):
+        status_line = await self.with_timeout(reader.readline())
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b'HTTP/') or not parts[1].isdigit():
+            raise ValueError('invalid http status line: {0!r}'.format(status_line[:100]))
+        status = int(parts[1])
+        headers = {}
+        while True:
+            line = await self.with_timeout(reader.readline())
+            if line in (b'\r\n', b'\n', b''):
+                break
+            (name, _, value) = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return (status, headers)
+
+    async def match_body(self, url, reader, headers):
+        """
+        Streams the body through the regex matcher, stopping as soon as it matches
+
+        Returns (matched, reusable) where reusable is whether the whole body was read
+        """
+        match = CHARSET_REGEX.search(headers.get('content-type', ''))
+        charset = match.group(1) if match else 'utf-8'
+        try:
+            decoder = codecs.getincrementaldecoder(charset)('replace')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        matcher = self.matcher_class(self.regex)
+        reusable = await self.read_body(reader, headers, lambda chunk: matcher.feed(decoder.decode(chunk)))
+        matched = matcher.matched or matcher.feed(decoder.decode(b'', True)) or matcher.finish()
+        log.debug("%s - content:\n%s\n%s\n%s", url, '='*80, matcher.text.strip(), '='*80)
+        return (matched, reusable)
+
+    async def read_body(self, reader, headers, callback):
+        """
+        Reads the body in chunks passed to callback, stopping early as soon as callback returns True
+
+        Returns True if the whole body was read and the connection can be reused
+        """
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            while True:
+                line = await self.with_timeout(reader.readline())
+                size = int(line.split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    # trailers
+                    while (await self.with_timeout(reader.readline())) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return True
+                if await self.read_exactly(reader, size, callback):
+                    return False
+                await self.with_timeout(reader.readline())
+        if 'content-length' in headers:
+            return not await self.read_exactly(reader, int(headers['content-length']), callback)
+        # body delimited by the server closing the connection
+        while True:
+            chunk = await self.with_timeout(reader.read(CHUNK_SIZE))
+            if not chunk or callback(chunk):
+                return False
+
+    async def read_exactly(self, reader, size, callback):
+        """
+        Reads size bytes in chunks passed to callback, returns True if callback stopped it early
+        """
+        while size > 0:
+            chunk = await self.with_timeout(reader.read(min(size, CHUNK_SIZE)))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b'', size)
+            size -= len(chunk)
+            if callback(chunk):
+                return True
+        return False
+
+    @staticmethod
+    async def timed(probe):
+        """
+        Returns (result, secs) for the given probe coroutine
+        """
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        result = await probe
+        return (result, loop.time() - start)
+
+    async def _run(self, probes, concurrency, deadline, first_success):
+        """
+        Returns a dict of probe index => result for all probes completed before the deadline,
+        returning as soon as any succeeds if first_success
+        """
+        loop = asyncio.get_event_loop()
+        end_time = None
+        if deadline:
+            end_time = loop.time() + deadline
+        probes = iter(probes)
+        results = {}
+        # task => index of its probe so simultaneous successes resolve in host list order
+        pending = {}
+        index = 0
+        try:
+            while True:
+                while len(pending) < concurrency:
+                    probe = next(probes, None)
+                    if probe is None:
+                        break
+                    pending[asyncio.ensure_future(probe)] = index
+                    index += 1
+                if not pending:
+                    return results
+                timeout = None
+                if end_time is not None:
+                    timeout = end_time - loop.time()
+                    if timeout <= 0:
+                        log.info('deadline of %s secs reached, abandoning %s outstanding probes',
+                                 deadline, len(pending))
+                        return results
+                (done, _) = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=pending.get):
+                    # probes return None for failed checks, anything raised is fatal, eg. ping not installed
+                    results[pending.pop(task)] = task.result()
+                    if first_success and task.result():
+                        return results
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                log.debug('cancelled %s outstanding probes', len(pending))
+                await asyncio.wait(list(pending))
+            # close any probe coroutines never started to avoid 'never awaited' warnings
+            for probe in probes:
+                probe.close()
+
+    def run(self, probes, concurrency, deadline=None, first_success=False):
+        return self.loop.run_until_complete(self._run(probes, concurrency, deadline, first_success))
+
+    def first_success(self, probes, concurrency, deadline=None):
+        """
+        Runs the probe coroutines at most concurrency at a time in the order given, returning the result of the first
+        to succeed and cancelling all the rest, or None if none succeed before the optional deadline in secs
+
+        Exceptions raised by a probe are re-raised after cancelling all the rest
+        """
+        results = self.run(probes, concurrency, deadline, first_success=True)
+        for index in sorted(results):
+            if results[index]:
+                return results[index]
+        return None
+
+    def run_all(self, probes, concurrency, deadline=None):
+        """
+        Runs all the probe coroutines at most concurrency at a time, returning a list of their results in the order
+        given, with None for any not completed before the optional deadline in secs
+        """
+        probes = list(probes)
+        results = self.run(probes, concurrency, deadline)
+        return [results.get(index) for index in range(len(probes))]
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#  vim:ts=4:sts=4:sw=4:et
+#
+#  Author: Hari Sekhon
+#  Date: 2026-10-19 15:07:48 +0100 (Mon, 19 Oct 2026)
+#
+#  https://github.com/HariSekhon/DevOps-Python-tools
+#
+#  License: see accompanying Hari Sekhon LICENSE file
+#
+#  If you're using my code you're welcome to connect with me on LinkedIn
+#  and optionally send me feedback to help steer this or other code I publish
+#
+#  https://www.linkedin.com/in/HariSekhon
+#
+
+"""
+
+Concurrent HBase RegionServer JMX collector shared by the hbase_region*.py tools and the --schedule mode of
+hbase_compact_tables.py / hbase_flush_tables.py
+
+Fetches the given beans from all the RegionServers at the same time on a thread pool over a pooled keep-alive
+requests session, asking the JMX servlet for only the beans needed via its ?qry= parameter instead of downloading
+the full multi-MB /jmx dump from one RegionServer after another, so a snapshot of a large cluster takes roughly one
+round trip
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import os
+import sys
+from multiprocessing.pool import ThreadPool
+import requests
+from requests.adapters import HTTPAdapter
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pylib'))
+sys.path.append(libdir)
+try:
+    # pylint: disable=wrong-import-position
+    from harisekhon.utils import log
+except ImportError as _:
+    print('module import failed: %s' % _, file=sys.stderr)
+    print("Did you remember to build the project by running 'make'?", file=sys.stderr)
+    print("Alternatively perhaps you tried to copy this program out without it's adjacent libraries?", file=sys.stderr)
+    sys.exit(4)
+
+__author__ = 'Hari Sekhon'
+__version__ = '0.1.0'
+
+SERVER_BEAN = 'Hadoop:service=HBase,name=RegionServer,sub=Server'
+REGIONS_BEAN = 'Hadoop:service=HBase,name=RegionServer,sub=Regions'
+RUNTIME_BEAN = 'java.lang:type=Runtime'
+
+
+class HBaseJMXCollector(object):
+
+    def __init__(self, port=16030, jobs=300, timeout=30):
+        # port for hosts given without an explicit :port
+        self.port = port
+        self.jobs = jobs
+        self.timeout = timeout
+        self.pool = None
+        self.session = requests.Session()
+        # one keep-alive connection pool per RegionServer, enough connections each for a few beans at once
+        adapter = HTTPAdapter(pool_connections=jobs, pool_maxsize=4)
+        self.session.mount('http://', adapter)
+
+    def fetch(self, host_bean):
+        """
+        Returns (bean, error) for the given (host, bean_name), bean is None if the RegionServer doesn't have it
+        """
+        (host, bean_name) = host_bean
+        if ':' not in host:
+            host = '{0}:{1}'.format(host, self.port)
+        url = 'http://{0}/jmx'.format(host)
+        log.debug('querying %s for %s', host, bean_name)
+        try:
+            req = self.session.get(url, params={'qry': bean_name}, timeout=self.timeout)
+            log.debug('response: %s %s', req.status_code, req.reason)
+            req.raise_for_status()
+            for bean in json.loads(req.text)['beans']:
+                if bean['name'] == bean_name:
+                    return (bean, None)
+        except (requests.RequestException, ValueError, KeyError) as _:
+            return (None, '{0}: {1}'.format(type(_).__name__, _))
+        return (None, None)
+
+    def collect(self, hosts, bean_names):
+        """
+        Fetches all the bean_names from all the hosts concurrently
+
+        Returns [(host, {bean_name: bean}, error)] in the order of hosts, error is the first error fetching any of
+        that host's beans or None
+        """
+        tasks = [(host, bean_name) for host in hosts for bean_name in bean_names]
+        if not tasks:
+            return []
+        if self.pool is None:
+            # kept for reuse by the tools which poll the same RegionServers every interval
+            self.pool = ThreadPool(min(self.jobs, len(tasks)))
+        results = iter(self.pool.map(self.fetch, tasks))
+        collected = []
+        for host in hosts:
+            beans = {}
+            error = None
+            for bean_name in bean_names:
+                (bean, _) = next(results)
+                if bean is not None:
+                    beans[bean_name] = bean
+                error = error or _
+            collected.append((host, beans, error))
+        return collected
@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+#  vim:ts=4:sts=4:sw=4:et
+#
+#  Author: Hari Sekhon
+#  Date: 2026-10-19 14:21:05 +0100 (Mon, 19 Oct 2026)
+#
+#  https://github.com/HariSekhon/DevOps-Python-tools
+#
+#  License: see accompanying Hari Sekhon LICENSE file
+#
+#  If you're using my code you're welcome to connect with me on LinkedIn
+#  and optionally send me feedback to help steer this or other code I publish
+#
+#  https://www.linkedin.com/in/HariSekhon
+#
+
+"""
+
+Load aware throttled scheduler shared by hbase_compact_tables.py and hbase_flush_tables.py for their --schedule mode
+
+Runs the per-table compactions / flushes at most N at a time, biggest first by store file count or size from the
+RegionServer JMX region metrics, only starting the next table when no RegionServer's compaction queue, flush queue or
+request rate is above its limit, and stops starting new tables once the maintenance window end time is reached or the
+next table wouldn't be expected to finish before it at the rate the previous tables were processed
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+import os
+import sys
+import time
+from collections import deque
+from multiprocessing.pool import ThreadPool
+import numpy as np
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pylib'))
+sys.path.append(libdir)
+try:
+    # pylint: disable=wrong-import-position
+    from harisekhon.utils import log, log_option, die, validate_int, validate_hostport_list, plural, ERRORS
+    from hbase_jmx import HBaseJMXCollector, SERVER_BEAN, REGIONS_BEAN
+    from hbase_region_metrics import RegionMetrics, RegionMetricsParser
+except ImportError as _:
+    print('module import failed: %s' % _, file=sys.stderr)
+    print("Did you remember to build the project by running 'make'?", file=sys.stderr)
+    print("Alternatively perhaps you tried to copy this program out without it's adjacent libraries?", file=sys.stderr)
+    sys.exit(4)
+
+__author__ = 'Hari Sekhon'
+__version__ = '0.3.2'
+
+REGION_METRICS = ('storeCount', 'storeFileCount', 'storeFileSize', 'memStoreSize', 'compactionsCompletedCount')
+ORDERS = ('storefiles', 'size', 'name')
+
+
+class HBaseMaintenanceScheduler(object):
+
+    def __init__(self, cli, action):
+        self.cli = cli
+        # 'compact' or 'flush', used in messages and to pick the size metric that predicts how long a table takes
+        self.action = action
+        self.size_metric = 'memStoreSize' if action == 'flush' else 'storeFileSize'
+        self.enabled = False
+        self.jobs = 1
+        self.regionservers = []
+        self.port = 16030
+        self.max_compaction_queue = 10
+        self.max_flush_queue = 10
+        self.max_request_rate = None
+        self.order = 'storefiles'
+        self.interval = 10
+        self.window_end = None
+        self.max_wait = 3 * 3600
+        # consecutive failures to get the region metrics while waiting for a compaction before failing the table
+        self.max_metric_failures = 5
+        self.collector = None
+        self.parser = RegionMetricsParser(REGION_METRICS, namespace=None)
+        self.last_requests = {}
+        self.bytes_done = 0
+        self.secs_done = 0
+
+    def add_options(self):
+        self.cli.add_opt('-s', '--schedule', action='store_true',
+                         help='Throttled scheduler mode: {0} --jobs tables at a time, '.format(self.action) +
+                         'biggest first, waiting while any RegionServer is busy and finishing by the --window-end time')
+        self.cli.add_opt('-j', '--jobs', metavar='num', default=self.jobs,
+                         help='Max number of tables to {0} at the same time in --schedule mode (default: {1})'\
+                              .format(self.action, self.jobs))
+        self.cli.add_opt('-R', '--regionservers', metavar='host1[:port],host2[:port]...',
+                         default=os.getenv('HBASE_REGIONSERVERS'),
+                         help='RegionServers to read the JMX load and region metrics from in --schedule mode ' +
+                         '($HBASE_REGIONSERVERS)')
+        self.cli.add_opt('--regionserver-port', metavar='port',
+                         default=os.getenv('HBASE_REGIONSERVER_PORT', self.port),
+                         help='RegionServer info port for hosts without an explicit port ' +
+                         '($HBASE_REGIONSERVER_PORT, default: {0})'.format(self.port))
+        self.cli.add_opt('-q', '--max-compaction-queue', metavar='num', default=self.max_compaction_queue,
+                         help="Wait while any RegionServer's compaction queue is longer than this " +
+                         '(default: {0})'.format(self.max_compaction_queue))
+        self.cli.add_opt('-Q', '--max-flush-queue', metavar='num', default=self.max_flush_queue,
+                         help="Wait while any RegionServer's flush queue is longer than this " +
+                         '(default: {0})'.format(self.max_flush_queue))
+        self.cli.add_opt('-m', '--max-request-rate', metavar='num',
+                         help='Wait while any RegionServer is serving more than this many requests per second')
+        self.cli.add_opt('-o', '--order', default=self.order,
+                         help='Order to {0} tables in: {1} (default: {2}, size is the {3})'\
+                              .format(self.action, ' / '.join(ORDERS), self.order,
+                                      'memstore size' if self.action == 'flush' else 'store file size'))
+        self.cli.add_opt('-i', '--interval', metavar='secs', default=self.interval,
+                         help='Secs between checks of the RegionServer load (default: {0})'.format(self.interval))
+        self.cli.add_opt('-w', '--window-end', metavar='HH:MM',
+                         help='End of the maintenance window, no new tables are started after this time ' +
+                         'or if the next table is not expected to finish before it')
+        if self.action == 'compact':
+            self.cli.add_opt('--max-wait', metavar='secs', default=self.max_wait,
+                             help='Fail a table whose compaction has not finished after this many secs ' +
+                             '(default: {0})'.format(self.max_wait))
+
+    def process_options(self, regionservers_required=True):
+        self.enabled = self.cli.get_opt('schedule')
+        if not self.enabled:
+            return
+        self.jobs = self.cli.get_opt('jobs')
+        validate_int(self.jobs, 'jobs', 1, 100)
+        self.jobs = int(self.jobs)
+        self.port = self.cli.get_opt('regionserver_port')
+        validate_int(self.port, 'regionserver port', 1, 65535)
+        self.collector = HBaseJMXCollector(port=self.port)
+        regionservers = self.cli.get_opt('regionservers')
+        if regionservers:
+            regionservers = [_.strip() for _ in regionservers.split(',') if _.strip()]
+            validate_hostport_list(regionservers, port_optional=True)
+            self.regionservers = [_ if ':' in _ else '{0}:{1}'.format(_, self.port) for _ in regionservers]
+            log_option('regionservers', self.regionservers)
+        elif regionservers_required:
+            self.cli.usage('--regionservers must be given in --schedule mode')
+        self.max_compaction_queue = self.cli.get_opt('max_compaction_queue')
+        validate_int(self.max_compaction_queue, 'max compaction queue', 0)
+        self.max_compaction_queue = int(self.max_compaction_queue)
+        self.max_flush_queue = self.cli.get_opt('max_flush_queue')
+        validate_int(self.max_flush_queue, 'max flush queue', 0)
+        self.max_flush_queue = int(self.max_flush_queue)
+        self.max_request_rate = self.cli.get_opt('max_request_rate')
+        if self.max_request_rate is not None:
+            validate_int(self.max_request_rate, 'max request rate', 1)
+            self.max_request_rate = int(self.max_request_rate)
+        self.order = self.cli.get_opt('order')
+        if self.order not in ORDERS:
+            self.cli.usage('invalid --order given, must be one of: {0}'.format(', '.join(ORDERS)))
+        log_option('order', self.order)
+        self.interval = self.cli.get_opt('interval')
+        validate_int(self.interval, 'interval', 1, 3600)
+        self.interval = int(self.interval)
+        window_end = self.cli.get_opt('window_end')
+        if window_end:
+            self.window_end = self.parse_window_end(window_end)
+            log_option('window end', self.window_end)
+        if self.action == 'compact':
+            self.max_wait = self.cli.get_opt('max_wait')
+            validate_int(self.max_wait, 'max wait', self.interval)
+            self.max_wait = int(self.max_wait)
+
+    def parse_window_end(self, window_end):
+        try:
+            end_time = datetime.datetime.strptime(window_end, '%H:%M').time()
+        except ValueError:
+            self.cli.usage("invalid --window-end '{0}', must be in HH:MM format".format(window_end))
+        now = datetime.datetime.now()
+        end = datetime.datetime.combine(now.date(), end_time)
+        # a window end earlier than now means tomorrow morning when run from an evening cron job
+        if end <= now:
+            end += datetime.timedelta(days=1)
+        return end
+
+    def secs_remaining(self):
+        if self.window_end is None:
+            return None
+        return (self.window_end - datetime.datetime.now()).total_seconds()
+
+    def window_ended(self):
+        remaining = self.secs_remaining()
+        return remaining is not None and remaining <= 0
+
+    def get_region_metrics(self):
+        """
+        Returns RegionMetrics across all the RegionServers, tables outside the default namespace are named
+        namespace:table to match the table list
+        """
+        metrics = RegionMetrics(REGION_METRICS)
+        for (regionserver, beans, error) in self.collector.collect(self.regionservers, [REGIONS_BEAN]):
+            if error:
+                raise IOError("failed to get JMX stats from RegionServer '{0}': {1}".format(regionserver, error))
+            if REGIONS_BEAN in beans:
+                metrics.extend(self.parser.parse(regionserver, beans[REGIONS_BEAN]))
+        return metrics
+
+    def get_table_totals(self, tables):
+        totals = dict([(table, {'storeFileCount': 0, 'size': 0}) for table in tables])
+        try:
+            metrics = self.get_region_metrics()
+        except Exception as _:  # pylint: disable=broad-except
+            log.warning('failed to get region metrics, cannot order tables by %s: %s', self.order, _)
+            return totals
+        store_files = metrics.table_totals('storeFileCount')
+        sizes = metrics.table_totals(self.size_metric)
+        for table in tables:
+            totals[table]['storeFileCount'] = int(store_files.get(table, 0))
+            totals[table]['size'] = int(sizes.get(table, 0))
+        return totals
+
+    def order_tables(self, tables, totals):
+        tables = sorted(tables)
+        if self.order == 'storefiles':
+            tables.sort(key=lambda table: totals[table]['storeFileCount'], reverse=True)
+        elif self.order == 'size':
+            tables.sort(key=lambda table: totals[table]['size'], reverse=True)
+        for table in tables:
+            log.info("table '%s' store files = %s, %s = %s",
+                     table, totals[table]['storeFileCount'], self.size_metric, totals[table]['size'])
+        return tables
+
+    def busy_reason(self):
+        """
+        Returns why the cluster is too busy to start another table or None if it isn't
+        """
+        collected = self.collector.collect(self.regionservers, [SERVER_BEAN])
+        rates = self.update_request_rates(collected)
+        for (regionserver, beans, error) in collected:
+            # if we can't see the load then don't risk adding to it
+            if error:
+                return "failed to get JMX stats from RegionServer '{0}': {1}".format(regionserver, error)
+            if SERVER_BEAN not in beans:
+                return "no {0} bean found on RegionServer '{1}'".format(SERVER_BEAN, regionserver)
+            bean = beans[SERVER_BEAN]
+            compaction_queue = bean.get('compactionQueueLength', 0)
+            if compaction_queue > self.max_compaction_queue:
+                return "RegionServer '{0}' compaction queue length {1} > {2}"\
+                       .format(regionserver, compaction_queue, self.max_compaction_queue)
+            flush_queue = bean.get('flushQueueLength', 0)
+            if flush_queue > self.max_flush_queue:
+                return "RegionServer '{0}' flush queue length {1} > {2}"\
+                       .format(regionserver, flush_queue, self.max_flush_queue)
+            if self.max_request_rate is None:
+                continue
+            rate = rates.get(regionserver)
+            if rate is None:
+                return "waiting for a second sample to calculate RegionServer '{0}' request rate".format(regionserver)
+            if rate > self.max_request_rate:
+                return "RegionServer '{0}' request rate {1:.0f}/sec > {2}/sec"\
+                       .format(regionserver, rate, self.max_request_rate)
+        return None
+
+    def update_request_rates(self, collected):
+        """
+        Records the request count of every RegionServer collected before any of them is checked, so that one busy
+        RegionServer or one without a previous sample doesn't stop the rest being sampled in the same poll
+
+        Returns a dict of regionserver => requests per sec since its previous sample
+        """
+        rates = {}
+        if self.max_request_rate is None:
+            return rates
+        now = time.time()
+        for (regionserver, beans, error) in collected:
+            if error or SERVER_BEAN not in beans:
+                continue
+            requests = beans[SERVER_BEAN].get('totalRequestCount', 0)
+            last = self.last_requests.get(regionserver)
+            self.last_requests[regionserver] = (requests, now)
+            if last is not None and now > last[1]:
+                rates[regionserver] = (requests - last[0]) / (now - last[1])
+        return rates
+
+    def expected_secs(self, size):
+        if not self.secs_done or not self.bytes_done:
+            return None
+        return size / (self.bytes_done / self.secs_done)
+
+    def wait_for_compaction(self, table, baseline):
+        """
+        Blocks until every region of the table found in the baseline region metrics taken before the compaction was
+        requested has completed a compaction since and is down to at most one store file per store, as the Thrift
+        compact call only queues the compaction. Returns False if the maintenance window ends first
+
+        Raises IOError if it is still waiting after --max-wait secs or the region metrics can't be fetched several
+        times in a row, so the table is reported as failed rather than waited on forever
+        """
+        start = time.time()
+        before_rows = [row for (row, name) in enumerate(baseline.tables) if name == table]
+        failures = 0
+        while True:
+            time.sleep(self.interval)
+            try:
+                metrics = self.get_region_metrics()
+                failures = 0
+            except Exception as _:  # pylint: disable=broad-except
+                failures += 1
+                log.warning("failed to get region metrics while waiting for table '%s' compaction (%s/%s): %s",
+                            table, failures, self.max_metric_failures, _)
+                if failures >= self.max_metric_failures:
+                    raise IOError('failed to get region metrics {0} times in a row: {1}'.format(failures, _))
+                metrics = None
+            if metrics is not None:
+                remaining = self.regions_compacting(table, baseline, before_rows, metrics)
+                if not remaining:
+                    return True
+                log.info("table '%s' compaction still running on %s region%s", table, remaining, plural(remaining))
+            if self.window_ended():
+                return False
+            if time.time() - start > self.max_wait:
+                raise IOError('compaction still not finished after {0} secs'.format(self.max_wait))
+
+    @staticmethod
+    def regions_compacting(table, baseline, before_rows, metrics):
+        """
+        Returns the number of the table's baseline regions yet to complete a compaction down to one store file per store
+        """
+        index = metrics.index()
+        # regions that have split or moved away since are compacted by their new RegionServer
+        pairs = [(row, index[(table, baseline.regions[row])]) for row in before_rows
+                 if (table, baseline.regions[row]) in index]
+        if not pairs:
+            return 0
+        (before, now) = [np.array(_, dtype=int) for _ in zip(*pairs)]
+        store_files = np.nan_to_num(metrics['storeFileCount'][now])
+        stores = metrics['storeCount'][now]
+        stores = np.where(np.isnan(stores), 1, stores)
+        compacted = np.nan_to_num(metrics['compactionsCompletedCount'][now]) > \
+                    np.nan_to_num(baseline['compactionsCompletedCount'][before])
+        done = (store_files == 0) | (compacted & (store_files <= stores))
+        return int(np.count_nonzero(~done))
+
+    def run_job(self, func, table):
+        start = time.time()
+        try:
+            if func(table) is False:
+                return (time.time() - start, 'still {0}ing at the end of the maintenance window'.format(self.action))
+        except Exception as _:  # pylint: disable=broad-except
+            return (time.time() - start, '{0}: {1}'.format(type(_).__name__, _))
+        return (time.time() - start, None)
+
+    def run(self, tables, func):
+        """
+        Calls func(table) for each table in the worker threads, func must block until the table is done and raise
+        an exception on failure rather than exit. Exits with an error if any tables failed or a warning if the
+        maintenance window ended before all the tables were done
+        """
+        start = time.time()
+        totals = self.get_table_totals(tables)
+        pending = deque(self.order_tables(tables, totals))
+        running = {}
+        done = 0
+        failed = []
+        skipped = []
+        pool = ThreadPool(self.jobs)
+        try:
+            while pending or running:
+                for table in [_ for _ in running if running[_].ready()]:
+                    (secs, error) = running.pop(table).get()
+                    if error:
+                        log.error("failed to %s table '%s' after %.1f secs: %s", self.action, table, secs, error)
+                        failed.append(table)
+                        continue
+                    log.info("finished %sing table '%s' in %.1f secs", self.action, table, secs)
+                    done += 1
+                    self.bytes_done += totals[table]['size']
+                    self.secs_done += secs
+                if pending and self.window_ended():
+                    log.warning('maintenance window ended, not starting remaining %s table%s',
+                                len(pending), plural(len(pending)))
+                    skipped.extend(pending)
+                    pending.clear()
+                if pending and len(running) < self.jobs:
+                    reason = self.busy_reason()
+                    if reason:
+                        log.info('waiting %s secs: %s', self.interval, reason)
+                    else:
+                        table = pending.popleft()
+                        expected = self.expected_secs(totals[table]['size'])
+                        remaining = self.secs_remaining()
+                        if expected is not None and remaining is not None and expected > remaining:
+                            log.warning("skipping table '%s', expected to take %.0f secs but only %.0f secs left " +
+                                        'in the maintenance window', table, expected, remaining)
+                            skipped.append(table)
+                            continue
+                        log.info("%sing table '%s' (%s running)", self.action, table, len(running) + 1)
+                        running[table] = pool.apply_async(self.run_job, (func, table))
+                if pending or running:
+                    time.sleep(self.interval)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+        log.info('%sed %s table%s, %s failed, %s skipped in %.1f secs',
+                 self.action, done, plural(done), len(failed), len(skipped), time.time() - start)
+        if failed:
+            msg = 'ERROR: failed to {0} table{1}: {2}'.format(self.action, plural(len(failed)), ', '.join(failed))
+            if skipped:
+                msg += ', did not start: {0}'.format(', '.join(skipped))
+            die(msg)
+        if skipped:
+            print('WARNING: maintenance window too short, did not {0} table{1}: {2}'\
+                  .format(self.action, plural(len(skipped)), ', '.join(skipped)))
+            sys.exit(ERRORS['WARNING'])
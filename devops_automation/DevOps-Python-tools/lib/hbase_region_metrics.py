@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+#  vim:ts=4:sts=4:sw=4:et
+#
+#  Author: Hari Sekhon
+#  Date: 2026-10-19 15:52:31 +0100 (Mon, 19 Oct 2026)
+#
+#  https://github.com/HariSekhon/DevOps-Python-tools
+#
+#  License: see accompanying Hari Sekhon LICENSE file
+#
+#  If you're using my code you're welcome to connect with me on LinkedIn
+#  and optionally send me feedback to help steer this or other code I publish
+#
+#  https://www.linkedin.com/in/HariSekhon
+#
+
+"""
+
+HBase RegionServer JMX Regions bean parsing shared by the hbase_region*.py tools and the --schedule mode of
+hbase_compact_tables.py / hbase_flush_tables.py
+
+The Regions bean has dozens of Namespace_<namespace>_table_<table>_region_<region>_metric_<metric> keys per region,
+so the parser compiles its regex once and only runs it against keys ending in one of the wanted metrics, collecting
+the values into numpy columns indexed by region for the tools to sort, filter and diff without nested dicts
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import re
+import sys
+import numpy as np
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pylib'))
+sys.path.append(libdir)
+try:
+    # pylint: disable=wrong-import-position
+    from harisekhon.utils import log
+except ImportError as _:
+    print('module import failed: %s' % _, file=sys.stderr)
+    print("Did you remember to build the project by running 'make'?", file=sys.stderr)
+    print("Alternatively perhaps you tried to copy this program out without it's adjacent libraries?", file=sys.stderr)
+    sys.exit(4)
+
+__author__ = 'Hari Sekhon'
+__version__ = '0.1.0'
+
+
+class RegionMetrics(object):
+    """
+    Columnar region metrics, row i is region regions[i] of table tables[i] on RegionServer hosts[i] and each metric
+    is a float numpy array with NaN where the RegionServer didn't report that metric for the region
+    """
+
+    def __init__(self, metrics, hosts=None, tables=None, regions=None, values=None):
+        self.metrics = tuple(metrics)
+        self.hosts = hosts or []
+        self.tables = tables or []
+        self.regions = regions or []
+        self.values = values or dict([(metric, np.array([], dtype=float)) for metric in self.metrics])
+        self._index = None
+
+    def __len__(self):
+        return len(self.regions)
+
+    def __getitem__(self, metric):
+        return self.values[metric]
+
+    def index(self):
+        """
+        Returns {(table, region): row}
+        """
+        if self._index is None:
+            self._index = dict([((self.tables[row], self.regions[row]), row) for row in range(len(self))])
+        return self._index
+
+    def extend(self, other):
+        self.hosts.extend(other.hosts)
+        self.tables.extend(other.tables)
+        self.regions.extend(other.regions)
+        for metric in self.metrics:
+            self.values[metric] = np.concatenate((self.values[metric], other.values[metric]))
+        self._index = None
+
+    def align(self, other):
+        """
+        Returns a numpy array of the row in other of each region in this, or None if any region isn't in other,
+        eg. after a region split or move
+        """
+        index = other.index()
+        rows = [index.get(key) for key in zip(self.tables, self.regions)]
+        if None in rows:
+            return None
+        return np.array(rows, dtype=int)
+
+    def derive(self, values):
+        """
+        Returns new RegionMetrics for the same regions with the given {metric: numpy array} values
+        """
+        return RegionMetrics(values.keys(), list(self.hosts), list(self.tables), list(self.regions), values)
+
+    def argsort(self, metric, reverse=False):
+        """
+        Returns the rows ordered by metric, keeping the parse order for equal values
+        """
+        values = self.values[metric]
+        return np.argsort(-values if reverse else values, kind='mergesort')
+
+    def order_by_name(self):
+        return sorted(range(len(self)), key=lambda row: (self.tables[row], self.regions[row]))
+
+    def table_totals(self, metric):
+        """
+        Returns {table: sum of the metric across its regions}, ignoring missing values
+        """
+        totals = {}
+        for (table, value) in zip(self.tables, self.values[metric]):
+            if not np.isnan(value):
+                totals[table] = totals.get(table, 0) + value
+        return totals
+
+
+class RegionMetricsParser(object):
+    """
+    Parses the given metrics out of Regions beans for tables matching table_regex in the given namespace, or in all
+    namespaces if namespace is None in which case tables outside the default namespace are named namespace:table
+    """
+
+    def __init__(self, metrics, namespace='default', table_regex=None):
+        self.metrics = tuple(metrics)
+        self.namespace = namespace
+        if namespace is None:
+            self.prefix = 'Namespace_'
+            namespace = '(.+?)'
+        else:
+            self.prefix = 'Namespace_{0}_table_'.format(namespace)
+            namespace = '({0})'.format(re.escape(namespace))
+        self.suffixes = tuple(['_metric_' + metric for metric in self.metrics])
+        self.regex = re.compile('^Namespace_{namespace}_table_({table})_region_(.+)_metric_({metrics})$'\
+                                .format(namespace=namespace,
+                                        table=table_regex or '.+',
+                                        metrics='|'.join([re.escape(metric) for metric in self.metrics])))
+
+    def parse(self, host, bean):
+        prefix = self.prefix
+        suffixes = self.suffixes
+        regex = self.regex
+        qualify = self.namespace is None
+        index = {}
+        tables = []
+        regions = []
+        columns = dict([(metric, []) for metric in self.metrics])
+        for key in bean:
+            # cheap string checks first as the vast majority of keys are for other metrics
+            if not key.endswith(suffixes) or not key.startswith(prefix):
+                continue
+            match = regex.match(key)
+            if not match:
+                continue
+            (namespace, table, region, metric) = match.groups()
+            if qualify and namespace != 'default':
+                table = '{0}:{1}'.format(namespace, table)
+            row = index.get((table, region))
+            if row is None:
+                row = index[(table, region)] = len(regions)
+                tables.append(table)
+                regions.append(region)
+                for column in columns.values():
+                    column.append(np.nan)
+            columns[metric][row] = bean[key]
+        log.debug('parsed %s metrics for %s regions from %s', ', '.join(self.metrics), len(regions), host)
+        values = dict([(metric, np.array(columns[metric], dtype=float)) for metric in self.metrics])
+        return RegionMetrics(self.metrics, [host] * len(regions), tables, regions, values)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+#  vim:ts=4:sts=4:sw=4:et
+#
+#  Author: Hari Sekhon
+#  Date: 2026-10-19 16:38:12 +0100 (Mon, 19 Oct 2026)
+#
+#  https://github.com/HariSekhon/DevOps-Python-tools
+#
+#  License: see accompanying Hari Sekhon LICENSE file
+#
+#  If you're using my code you're welcome to connect with me on LinkedIn
+#  and optionally send me feedback to help steer this or other code I publish
+#
+#  https://www.linkedin.com/in/HariSekhon
+#
+
+"""
+
+Request rate history shared by hbase_region_requests.py and hbase_regionserver_requests.py for their --history mode
+
+--record appends each interval's region / RegionServer request rates to a local SQLite file, deleting anything older
+than the --retention hours, so that it can be left running to build up a history of the cluster load
+
+--query reads back the top N hottest regions or busiest RegionServers by average request rate over any window within
+the retention using --since / --until, instead of having to sample the cluster again for hotspot analysis
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+import os
+import re
+import sqlite3
+import sys
+import time
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pylib'))
+sys.path.append(libdir)
+try:
+    # pylint: disable=wrong-import-position
+    from harisekhon.utils import log, log_option, validate_int
+except ImportError as _:
+    print('module import failed: %s' % _, file=sys.stderr)
+    print("Did you remember to build the project by running 'make'?", file=sys.stderr)
+    print("Alternatively perhaps you tried to copy this program out without it's adjacent libraries?", file=sys.stderr)
+    sys.exit(4)
+
+__author__ = 'Hari Sekhon'
+__version__ = '0.1.0'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS regions (
+    id INTEGER PRIMARY KEY,
+    host TEXT NOT NULL,
+    tbl TEXT NOT NULL,
+    region TEXT NOT NULL,
+    UNIQUE (host, tbl, region)
+);
+CREATE TABLE IF NOT EXISTS region_requests (
+    ts INTEGER NOT NULL,
+    region_id INTEGER NOT NULL,
+    read REAL,
+    write REAL
+);
+CREATE INDEX IF NOT EXISTS region_requests_ts ON region_requests (ts);
+CREATE TABLE IF NOT EXISTS regionserver_requests (
+    ts INTEGER NOT NULL,
+    host TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    rate REAL
+);
+CREATE INDEX IF NOT EXISTS regionserver_requests_ts ON regionserver_requests (ts);
+"""
+
+# only these are ever interpolated in to the queries
+REGION_METRIC_SQL = {
+    'read': 'q.read',
+    'write': 'q.write',
+    'total': 'q.read + q.write',
+}
+
+RELATIVE_TIME_REGEX = re.compile(r'^(\d+)\s*([smhd])$')
+TIME_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d')
+
+
+def parse_time(value, now=None):
+    """
+    Returns epoch secs for either a relative time ago such as 30m / 6h / 2d or a local date time such as
+    '2026-10-19 14:00', or None if it can't be parsed
+    """
+    if now is None:
+        now = time.time()
+    value = value.strip()
+    match = RELATIVE_TIME_REGEX.match(value)
+    if match:
+        return int(now - int(match.group(1)) * TIME_UNITS[match.group(2)])
+    for time_format in TIME_FORMATS:
+        try:
+            return int(time.mktime(datetime.datetime.strptime(value, time_format).timetuple()))
+        except ValueError:
+            pass
+    return None
+
+
+class HBaseRequestHistory(object):
+
+    def __init__(self, cli):
+        self.cli = cli
+        self.path = None
+        self.record = False
+        self.query = False
+        self.retention = 7 * 24
+        self.since = None
+        self.until = None
+        self.top_n = 10
+        self.conn = None
+        self.region_ids = {}
+
+    def add_options(self):
+        self.cli.add_opt('--history', metavar='file', default=os.getenv('HBASE_REQUESTS_HISTORY'),
+                         help='SQLite file of request rate history for --record / --query ($HBASE_REQUESTS_HISTORY)')
+        self.cli.add_opt('--record', action='store_true',
+                         help='Append each interval\'s request rates to the --history file as well as printing them')
+        self.cli.add_opt('--retention', metavar='hours', default=self.retention,
+                         help='Hours of history to keep when recording, older rates are deleted ' +
+                         '(default: {0})'.format(self.retention))
+        self.cli.add_opt('--query', action='store_true',
+                         help='Print the top request rates averaged over --since / --until from the --history file ' +
+                         'instead of querying the RegionServers')
+        self.cli.add_opt('--since', metavar='time', default='1h',
+                         help='Start of the --query window, either a time ago such as 30m, 6h or 2d, ' +
+                         "or a local time such as '2026-10-19 14:00' (default: 1h)")
+        self.cli.add_opt('--until', metavar='time',
+                         help='End of the --query window in the same format as --since (default: now)')
+        self.cli.add_opt('--top', metavar='N', default=self.top_n,
+                         help='Number of results to print in --query mode (default: {0})'.format(self.top_n))
+
+    def process_options(self):
+        self.record = self.cli.get_opt('record')
+        self.query = self.cli.get_opt('query')
+        if not self.record and not self.query:
+            return
+        if self.record and self.query:
+            self.cli.usage('--record and --query are mutually exclusive')
+        self.path = self.cli.get_opt('history')
+        if not self.path:
+            self.cli.usage('--history file must be given for --record / --query')
+        log_option('history', self.path)
+        if self.record:
+            if self.cli.get_opt('average'):
+                self.cli.usage('--record cannot be used with --average, only interval rates are recorded')
+            self.retention = self.cli.get_opt('retention')
+            validate_int(self.retention, 'retention hours', 1)
+            self.retention = int(self.retention)
+        else:
+            if not os.path.isfile(self.path):
+                self.cli.usage("--history file '{0}' not found".format(self.path))
+            now = time.time()
+            self.since = parse_time(self.cli.get_opt('since'), now)
+            if self.since is None:
+                self.cli.usage("invalid --since '{0}'".format(self.cli.get_opt('since')))
+            self.until = int(now)
+            if self.cli.get_opt('until'):
+                self.until = parse_time(self.cli.get_opt('until'), now)
+                if self.until is None:
+                    self.cli.usage("invalid --until '{0}'".format(self.cli.get_opt('until')))
+            if self.since >= self.until:
+                self.cli.usage('--since must be before --until')
+            self.top_n = self.cli.get_opt('top')
+            validate_int(self.top_n, 'top N', 1)
+            self.top_n = int(self.top_n)
+        self.open()
+
+    def open(self):
+        self.conn = sqlite3.connect(self.path)
+        if self.record:
+            # lets --query read the history while it's being recorded
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.executescript(SCHEMA)
+            self.prune()
+
+    def prune(self):
+        cutoff = int(time.time() - self.retention * 3600)
+        with self.conn:
+            deleted = self.conn.execute('DELETE FROM region_requests WHERE ts < ?', (cutoff,)).rowcount
+            deleted += self.conn.execute('DELETE FROM regionserver_requests WHERE ts < ?', (cutoff,)).rowcount
+            if not self.region_ids:
+                # only while no region ids are cached, ie. at startup
+                self.conn.execute('DELETE FROM regions WHERE id NOT IN ' +
+                                  '(SELECT DISTINCT region_id FROM region_requests)')
+        if deleted:
+            log.info('deleted %s rates older than %s hours from history', deleted, self.retention)
+
+    def region_id(self, host, table, region):
+        key = (host, table, region)
+        region_id = self.region_ids.get(key)
+        if region_id is None:
+            self.conn.execute('INSERT OR IGNORE INTO regions (host, tbl, region) VALUES (?, ?, ?)', key)
+            region_id = self.conn.execute('SELECT id FROM regions WHERE host = ? AND tbl = ? AND region = ?',
+                                          key).fetchone()[0]
+            self.region_ids[key] = region_id
+        return region_id
+
+    def record_regions(self, tstamp, stats, namespace='default'):
+        """
+        Stores the read / write rates of RegionMetrics stats, tables outside the default namespace as namespace:table
+        """
+        rows = []
+        for (host, table, region, read, write) in zip(stats.hosts, stats.tables, stats.regions,
+                                                      stats['read'], stats['write']):
+            if namespace != 'default':
+                table = '{0}:{1}'.format(namespace, table)
+            rows.append((tstamp, self.region_id(host, table, region), float(read), float(write)))
+        self.conn.executemany('INSERT INTO region_requests (ts, region_id, read, write) VALUES (?, ?, ?, ?)', rows)
+
+    def record_regionserver(self, tstamp, host, rates):
+        """
+        Stores the {metric: rate} of one RegionServer
+        """
+        self.conn.executemany('INSERT INTO regionserver_requests (ts, host, metric, rate) VALUES (?, ?, ?, ?)',
+                              [(tstamp, host, metric, rate) for (metric, rate) in rates.items()])
+
+    def commit(self):
+        self.conn.commit()
+        self.prune()
+
+    def print_window(self, what):
+        print('Top {0} {1} by average requests per second from {2} to {3}\n'\
+              .format(self.top_n, what,
+                      time.strftime('%F %T', time.localtime(self.since)),
+                      time.strftime('%F %T', time.localtime(self.until))))
+
+    def query_regions(self, metric='total', table=None):
+        """
+        Returns [(table, region, hosts, average, peak, samples)] of the hottest regions in the query window,
+        combining the rates of any region that moved between RegionServers
+        """
+        expr = REGION_METRIC_SQL[metric]
+        sql = 'SELECT r.tbl, r.region, GROUP_CONCAT(DISTINCT r.host), AVG({0}), MAX({0}), COUNT(*) '.format(expr) + \
+              'FROM region_requests q JOIN regions r ON r.id = q.region_id WHERE q.ts >= ? AND q.ts <= ? '
+        params = [self.since, self.until]
+        if table:
+            sql += 'AND r.tbl = ? '
+            params.append(table)
+        sql += 'GROUP BY r.tbl, r.region ORDER BY AVG({0}) DESC LIMIT ?'.format(expr)
+        params.append(self.top_n)
+        return self.conn.execute(sql, params).fetchall()
+
+    def query_regionservers(self, metric='total'):
+        """
+        Returns [(host, average, peak, samples)] of the busiest RegionServers in the query window
+        """
+        return self.conn.execute('SELECT host, AVG(rate), MAX(rate), COUNT(*) FROM regionserver_requests ' +
+                                 'WHERE ts >= ? AND ts <= ? AND metric = ? ' +
+                                 'GROUP BY host ORDER BY AVG(rate) DESC LIMIT ?',
+                                 (self.since, self.until, metric, self.top_n)).fetchall()
@@ -20,6 +20,9 @@ Strip ANSI Escape Codes from Text String input
 
 Works as a standard unix filter program, reading from file arguments or standard input and printing to standard output
 
+Input is processed in large blocks of whole lines, blocks without any escape characters are passed straight through
+without running the regex at all, which makes this fast on huge mostly escape-free CI logs
+
 """
 
 from __future__ import absolute_import
@@ -42,18 +45,23 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.2'
+__version__ = '0.3'
+
+
+# native str on both Python 2 and 3 to avoid implicit unicode decoding of the input on Python 2
+ESC = str('\x1b')
 
 
 # pylint: disable=too-few-public-methods
 
 class StripAnsiEscapeCodes(CLI):
 
-#    def __init__(self):
-#        # Python 2.x
-#        super(StripAnsiEscapeCodes, self).__init__()
-#        # Python 3.x
-#        # super().__init__()
+    def __init__(self):
+        # Python 2.x
+        super(StripAnsiEscapeCodes, self).__init__()
+        # Python 3.x
+        # super().__init__()
+        self.blocksize = 1024 * 1024
 
     def run(self):
         if not self.args:
@@ -72,12 +80,23 @@ class StripAnsiEscapeCodes(CLI):
                 die("path '%s' could not be determined as either a file or directory" % arg)
         for filename in self.args:
             if filename == '-':
-                for line in sys.stdin:
-                    print(strip_ansi_escape_codes(line), end='')
+                self.strip(sys.stdin)
             else:
                 with open(filename) as filehandle:
-                    for line in filehandle:
-                        print(strip_ansi_escape_codes(line), end='')
+                    self.strip(filehandle)
+        sys.stdout.flush()
+
+    def strip(self, filehandle):
+        while True:
+            # whole lines only so escape codes are never split across blocks
+            # and the regex matches exactly as it would line by line
+            lines = filehandle.readlines(self.blocksize)
+            if not lines:
+                break
+            block = str().join(lines)
+            if ESC in block:
+                block = str().join([strip_ansi_escape_codes(line) if ESC in line else line for line in lines])
+            sys.stdout.write(block)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,81 @@
+#!/usr/bin/env bash
+#  vim:ts=4:sts=4:sw=4:et
+#
+#  Author: Hari Sekhon
+#  Date: 2026-10-19 14:21:06 +0100 (Mon, 19 Oct 2026)
+#
+#  https://github.com/HariSekhon/DevOps-Python-tools
+#
+#  License: see accompanying Hari Sekhon LICENSE file
+#
+#  If you're using my code you're welcome to connect with me on LinkedIn and optionally send me feedback to help steer this or other code I publish
+#
+#  https://www.linkedin.com/in/HariSekhon
+#
+
+# Benchmarks find_active_server.py --ping methods against each other by pinging every host in a list of loopback
+# addresses, using --rank with 1 probe per host so that all hosts are pinged rather than stopping at the first reply
+#
+# Usage: tests/benchmark_find_active_ping.sh [num_hosts]
+#
+# Results, best of 2 runs pinging 250 hosts on a 1 CPU Linux 6.18 VM with Python 3.11.7:
+#
+#   exec ping per host, threads engine:     0.510 secs *
+#   exec ping per host, asyncio engine:     0.507 secs *
+#   in-process ICMP, asyncio engine:        0.558 secs
+#   in-process TCP, threads engine:         0.498 secs
+#   in-process TCP, asyncio engine:         0.533 secs
+#
+# About 0.27 secs of each is startup, the same methods pinging 50 hosts took 0.27 - 0.29 secs.
+#
+# * this host has no ping binary so the exec rows were measured, best of 7 runs, with a compiled C no-op named ping
+#   first in $PATH, ie. only the cost of spawning a process per host. A real ping adds its own startup and socket
+#   setup on top so these are lower bounds, replace them when run on a host with ping installed. Timings on this VM
+#   vary by 0.1 - 0.2 secs between runs
+
+set -euo pipefail
+[ -n "${DEBUG:-}" ] && set -x
+
+srcdir="$(cd "$(dirname "$0")" && pwd)"
+
+cd "$srcdir/.."
+
+num_hosts="${1:-250}"
+
+if ! [[ "$num_hosts" =~ ^[[:digit:]]+$ ]] || [ "$num_hosts" -lt 1 ] || [ "$num_hosts" -gt 250 ]; then
+    echo "usage: ${0##*/} [num_hosts]    (1-250, default: 250)" >&2
+    exit 3
+fi
+
+hosts=()
+for ((i=1; i <= num_hosts; i++)); do
+    hosts+=("127.0.0.$i")
+done
+
+TIMEFORMAT="%R secs"
+
+benchmark(){
+    local name="$1"
+    shift
+    printf "%-40s" "$name:"
+    if ! time ./find_active_server.py --ping --rank --rank-probes 1 "$@" "${hosts[@]}" > /dev/null; then
+        echo "FAILED"
+    fi
+}
+
+echo "pinging $num_hosts hosts"
+echo
+
+if type -P ping &>/dev/null; then
+    benchmark "exec ping per host, threads engine" --ping-method exec --engine threads --num-threads 100
+    benchmark "exec ping per host, asyncio engine" --ping-method exec --engine asyncio --num-threads 1000
+else
+    echo "ping command not found, skipping exec benchmarks"
+fi
+if python -c "import socket; socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP).close()" &>/dev/null; then
+    benchmark "in-process ICMP, asyncio engine" --ping-method icmp --num-threads 1000
+else
+    echo "unprivileged ICMP sockets not permitted, see sysctl net.ipv4.ping_group_range, skipping icmp benchmark"
+fi
+benchmark "in-process TCP, threads engine" --ping-method tcp --port 1 --engine threads --num-threads 100
+benchmark "in-process TCP, asyncio engine" --ping-method tcp --port 1 --engine asyncio --num-threads 1000
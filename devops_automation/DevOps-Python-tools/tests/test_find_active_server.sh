@@ -106,6 +106,17 @@ echo
 
 run_grep "^$WEBSITE2$" ./find_active_server.py $opts -n1 --ping 0.0.0.1 4.4.4.4 $WEBSITE2:80
 
+echo "testing TCP ping returns only functional server, counting refused connections as up:"
+echo
+
+run_grep "^127.0.0.1$" ./find_active_server.py $opts --ping --ping-method tcp --port 1 4.4.4.4 127.0.0.1
+
+run_grep "^127.0.0.1$" ./find_active_server.py $opts --ping --ping-method tcp --engine threads --port 1 4.4.4.4 127.0.0.1
+
+echo "checking --ping-method icmp requires the asyncio engine:"
+echo
+run_fail 3 ./find_active_server.py $opts --ping --ping-method icmp --engine threads 127.0.0.1
+
 # ============================================================================ #
 
 echo "testing http ordering result consistency:"
@@ -162,6 +173,132 @@ run_grep "^$WEBSITE1$" ./find_active_server.py $opts --https --regex "(?:$SITE1)
 
 # ============================================================================ #
 
+echo "testing streamed regex checks of a large page on both engines:"
+echo
+
+page_dir="$(mktemp -d /tmp/find_active_server_page.XXXXXX)"
+python -c "
+import json, sys
+sys.stdout.write((json.dumps({'name': 'Hadoop:service=NameNode', 'value': 12345}) + '\n') * 170000)
+sys.stdout.write(json.dumps({'State': 'active'}) + '\n')
+" > "$page_dir/jmx"
+if python -c 'import http.server' 2>/dev/null; then
+    http_server=http.server
+else
+    http_server=SimpleHTTPServer
+fi
+(cd "$page_dir" && exec python -m "$http_server" 18099 >/dev/null 2>&1) &
+page_pid=$!
+sleep 2
+
+for engine in asyncio threads; do
+    run_grep "^127.0.0.1:18099$" ./find_active_server.py $opts --engine "$engine" --url /jmx --regex '"State"\s*:\s*"active"' 127.0.0.1:18099
+
+    ERRCODE=1 run_grep "^NO_AVAILABLE_SERVER$" ./find_active_server.py $opts --engine "$engine" --url /jmx --regex '"State"\s*:\s*"standby"' 127.0.0.1:18099
+
+    ERRCODE=1 run_grep "^NO_AVAILABLE_SERVER$" ./find_active_server.py $opts --engine "$engine" --url /jmx --regex '^ok$' 127.0.0.1:18099
+done
+
+kill "$page_pid"
+wait "$page_pid" || :
+rm -fr "$page_dir"
+
+
+echo "testing HEAD and range limited GET checks:"
+echo
+
+run_grep "^$WEBSITE1$" ./find_active_server.py $opts -n1 --https --method HEAD $WEBSITE1 $WEBSITE2
+
+run_grep "^$WEBSITE1$" ./find_active_server.py $opts -n1 --https --method RANGE $WEBSITE1 $WEBSITE2
+
+run_grep "^$WEBSITE1$" ./find_active_server.py $opts -n1 --engine threads --https --method HEAD $WEBSITE1 $WEBSITE2
+
+echo "checking --method and --regex switch conflict fails:"
+echo
+run_fail 3 ./find_active_server.py $opts --https --method HEAD --regex "$SITE1" $WEBSITE1
+
+
+echo "testing threads engine ordering result consistency:"
+echo
+
+run_grep "^$WEBSITE1$" ./find_active_server.py $opts -n1 --engine threads --http 0.0.0.1 $WEBSITE1 $WEBSITE2
+
+run_grep "^$WEBSITE1$" ./find_active_server.py $opts --engine threads --https --regex "(?:$SITE1)" $WEBSITE2 $WEBSITE1
+
+
+echo "testing both engines honour the proxy environment the same as requests:"
+echo
+
+# the proxy isn't listening so the checks can only pass if the proxy is bypassed
+ERRCODE=1 run_grep "^NO_AVAILABLE_SERVER$" env HTTPS_PROXY=http://127.0.0.1:1 ./find_active_server.py $opts --https $WEBSITE1
+
+ERRCODE=1 run_grep "^NO_AVAILABLE_SERVER$" env HTTPS_PROXY=http://127.0.0.1:1 ./find_active_server.py $opts --engine threads --https $WEBSITE1
+
+run_grep "^$WEBSITE1$" env HTTPS_PROXY=http://127.0.0.1:1 NO_PROXY="$WEBSITE1" ./find_active_server.py $opts --https $WEBSITE1
+
+echo "testing both engines verify against \$REQUESTS_CA_BUNDLE:"
+echo
+
+ERRCODE=1 run_grep "^NO_AVAILABLE_SERVER$" env REQUESTS_CA_BUNDLE=/nonexistent.pem ./find_active_server.py $opts --https $WEBSITE1
+
+ERRCODE=1 run_grep "^NO_AVAILABLE_SERVER$" env REQUESTS_CA_BUNDLE=/nonexistent.pem ./find_active_server.py $opts --engine threads --https $WEBSITE1
+
+
+echo "testing --deadline returns NO_AVAILABLE_SERVER before unresponsive probes time out:"
+echo
+
+ERRCODE=1 run_grep "^NO_AVAILABLE_SERVER$" ./find_active_server.py --deadline 1 --request-timeout 10 10.255.255.1 10.255.255.2
+
+ERRCODE=1 run_grep "^NO_AVAILABLE_SERVER$" ./find_active_server.py --engine threads --deadline 1 --request-timeout 10 10.255.255.1 10.255.255.2
+
+
+echo "testing --cache-ttl returns the same answer from cache:"
+echo
+
+cache_file="$(mktemp /tmp/find_active_server_cache.XXXXXX)"
+
+run_grep "^$WEBSITE1$" ./find_active_server.py $opts -n1 --cache-ttl 60 --cache-file "$cache_file" --port 80 $WEBSITE1 $WEBSITE2
+
+run_grep "^$WEBSITE1$" ./find_active_server.py $opts -n1 --cache-ttl 60 --cache-file "$cache_file" --port 80 $WEBSITE2 $WEBSITE1
+
+run_grep "^$WEBSITE1$" ./find_active_server.py $opts --cache-ttl 60 --cache-file "$cache_file" --http --regex "$SITE1" $WEBSITE2 $WEBSITE1
+
+rm -f "$cache_file"
+
+
+echo "testing --watch publishes the active server to a file and unix socket:"
+echo
+
+publish_dir="$(mktemp -d /tmp/find_active_server_watch.XXXXXX)"
+
+./find_active_server.py --watch 1 --publish-file "$publish_dir/active" --publish-socket "$publish_dir/active.sock" --port 80 $WEBSITE1 &
+watch_pid=$!
+sleep 5
+
+run_grep "^$WEBSITE1$" cat "$publish_dir/active"
+
+run_grep "^$WEBSITE1$" python -c "
+import socket, sys
+sock = socket.socket(socket.AF_UNIX)
+sock.connect('$publish_dir/active.sock')
+sys.stdout.write(sock.recv(1024).decode('utf-8'))
+"
+
+kill "$watch_pid"
+wait "$watch_pid" || :
+rm -fr "$publish_dir"
+
+
+echo "testing --rank returns only functional servers ordered by latency:"
+echo
+
+run_grep "^$WEBSITE1[[:space:]]" ./find_active_server.py $opts --rank --rank-probes 3 --port 80 0.0.0.1 $WEBSITE1
+
+run_grep "^$WEBSITE2[[:space:]].*3/3$" ./find_active_server.py $opts --rank --rank-probes 3 --rank-by p95 --engine threads --port 80 0.0.0.1 $WEBSITE2
+
+ERRCODE=1 run_grep "^NO_AVAILABLE_SERVER$" ./find_active_server.py --rank --port 9999 localhost
+
+
 echo "testing random socket select 10 times contains both $SITE1 and $SITE2 results:"
 echo
 
@@ -42,6 +42,9 @@ export ZOOKEEPER_PORT_DEFAULT=2181
 
 export HBASE_VERSIONS="${*:-latest 0.96 0.98 1.0 1.1 1.2 1.3}"
 
+# doesn't need HBase, checks the --sample estimates against a simulated table where the true distribution is known
+run ./tests/test_hbase_table_row_key_distribution.py
+
 check_docker_available
 
 trap_debug_env hbase
@@ -164,6 +167,10 @@ EOF
 
     run ./hbase_generate_data.py -n 10 --drop-table --skew
 
+    run ./hbase_generate_data.py -n 10000 --drop-table --threads 4 --batch-size 100
+
+    run ./hbase_generate_data.py -n 10 --drop-table --threads 20 --batch-size 3 --skew
+
     run ./hbase_generate_data.py -n 10000 --use-existing-table --skew --skew-percent 50 -T UniformSplitTable
 
     run ./hbase_generate_data.py -n 10000 --use-existing-table -T HexStringSplitTable
@@ -185,6 +192,18 @@ EOF
 
     run ./hbase_compact_tables.py --regex .1
 
+    run ./hbase_compact_tables.py --regex .1 --schedule -R "$HBASE_HOST:$HBASE_REGIONSERVER_PORT" --interval 1
+
+    run ./hbase_compact_tables.py --schedule -R "$HBASE_HOST:$HBASE_REGIONSERVER_PORT" -j 2 --order size -i 1 -m 1000000
+
+    run_usage ./hbase_compact_tables.py --schedule --order nonexistent
+
+    run_usage ./hbase_compact_tables.py --schedule --window-end 25:00
+
+    run ./hbase_compact_tables.py --regex .1 --schedule -R "$HBASE_HOST:$HBASE_REGIONSERVER_PORT" -i 1 --max-wait 600
+
+    run_usage ./hbase_compact_tables.py --schedule -R "$HBASE_HOST:$HBASE_REGIONSERVER_PORT" -i 10 --max-wait 5
+
     # ============================================================================ #
     ERRCODE=3 docker_exec hbase_flush_tables.py --list-tables
 
@@ -192,6 +211,10 @@ EOF
 
     docker_exec hbase_flush_tables.py -r Disabled.*
 
+    docker_exec hbase_flush_tables.py --schedule -R localhost -j 2 -i 1
+
+    ERRCODE=3 docker_exec hbase_flush_tables.py --schedule
+
     # ============================================================================ #
     run_fail 3 ./hbase_show_table_region_ranges.py --list-tables
 
@@ -230,6 +253,32 @@ EOF
 
     run ./hbase_table_region_row_distribution.py -T HexStringSplitTable --short-region-name --sort count --desc
 
+    run ./hbase_table_region_row_distribution.py -T HexStringSplitTable --jobs 1 --batch-size 10 --stats
+
+    checkpoint_file="/tmp/hbase_table_region_row_distribution.checkpoint.$$"
+    echo "checking hbase_table_region_row_distribution.py resumes from checkpoint file:"
+    # checkpoint a real region with the row count from a full run so the resumed total must still add up
+    region="$(./hbase_show_table_region_ranges.py -T HexStringSplitTable | awk '/^HexStringSplitTable,/{print $1; exit}')"
+    output="$(./hbase_table_region_row_distribution.py -T HexStringSplitTable)"
+    row_count="$(awk -v region="$region" '$1 == region {print $(NF-1)}' <<< "$output")"
+    total_rows="$(awk '/^Total Rows:/{print $3}' <<< "$output")"
+    if [ -z "$region" ] || [ -z "$row_count" ] || [ -z "$total_rows" ]; then
+        die "failed to get region row count to checkpoint"
+    fi
+    echo "{\"table\": \"HexStringSplitTable\", \"region\": \"$region\", \"row_count\": $row_count, \"secs\": 1}" > "$checkpoint_file"
+    output="$(./hbase_table_region_row_distribution.py -T HexStringSplitTable --checkpoint-file "$checkpoint_file" --stats -vv 2>&1)"
+    echo "$output"
+    grep -Fq "region '$region' row count $row_count loaded from checkpoint" <<< "$output" ||
+        die "region '$region' was not loaded from checkpoint"
+    grep -q "^1 regions resumed from checkpoint$" <<< "$output" ||
+        die "resumed region count was not reported"
+    grep -q "^Total Rows: $total_rows$" <<< "$output" ||
+        die "total rows after resuming from checkpoint did not match full scan total of $total_rows"
+
+    if [ -f "$checkpoint_file" ]; then
+        die "checkpoint file '$checkpoint_file' was not removed on completion"
+    fi
+
     # ============================================================================ #
     run_fail 3 ./hbase_table_row_key_distribution.py -T DisabledTable --list-tables
 
@@ -247,6 +296,18 @@ EOF
 
     run ./hbase_table_row_key_distribution.py -T HexStringSplitTable
 
+    run ./hbase_table_row_key_distribution.py -T HexStringSplitTable --batch-size 1
+
+    run ./hbase_table_row_key_distribution.py -T HexStringSplitTable --sample
+
+    # every region is smaller than --sample-rows so is scanned completely and the estimate is the exact row count
+    run_grep "scanned completely, weighted to 10000 rows)$" ./hbase_table_row_key_distribution.py -T HexStringSplitTable --sample --sample-rows 5000
+
+    # with nothing extrapolated the confidence interval narrows to the exact percentage
+    run_grep "confidence interval ([[:digit:].]+) - \1%\)$" ./hbase_table_row_key_distribution.py -T HexStringSplitTable --sample --sample-rows 5000
+
+    run ./hbase_table_row_key_distribution.py -T UniformSplitTable --sample --sample-rows 10 --sample-points 3 --confidence 99 --key-prefix-length 2
+
     run_conn_refused ./hbase_table_row_key_distribution.py -T HexStringSplitTable
 
     # ============================================================================ #
@@ -263,6 +324,16 @@ EOF
     run ./hbase_region_requests.py -T HS_test_data localhost "$HBASE_HOST" -c 2
     run ./hbase_region_requests.py -T HS_test_data localhost "$HBASE_HOST" --count 2 -i 2
     run ./hbase_region_requests.py -T HS_test_data localhost "$HBASE_HOST" -c 2 --average
+    run ./hbase_region_requests.py -T HS_test_data localhost "$HBASE_HOST" -c 2 --average --jobs 1
+
+    history="$(mktemp -t hbase_requests_history.XXXXXX)"
+    run ./hbase_region_requests.py -T HS_test_data "$HBASE_HOST" -c 3 --history "$history" --record --retention 1
+    run_grep "HS_test_data:" ./hbase_region_requests.py --history "$history" --query --since 10m --top 5
+    run_grep "HS_test_data:" ./hbase_region_requests.py --history "$history" --query -T HS_test_data --reads
+    run_fail 1 ./hbase_region_requests.py --history "$history" --query --since 2d --until 1d
+    run_usage ./hbase_region_requests.py --history "$history" --query --since 1h --until 2h
+    run_usage ./hbase_region_requests.py --history "$history" --record --average "$HBASE_HOST"
+    run_usage ./hbase_region_requests.py --record "$HBASE_HOST"
 
     # ============================================================================ #
     run ./hbase_regionserver_requests.py "$HBASE_HOST" -c 1
@@ -276,6 +347,13 @@ EOF
     run ./hbase_regionserver_requests.py localhost "$HBASE_HOST" -c 1
     run ./hbase_regionserver_requests.py localhost "$HBASE_HOST" --count 2 -i 2
     run ./hbase_regionserver_requests.py localhost "$HBASE_HOST" -c 1 --average
+    run ./hbase_regionserver_requests.py localhost "$HBASE_HOST" localhost "$HBASE_HOST" -c 2 -j 1
+
+    run ./hbase_regionserver_requests.py "$HBASE_HOST" -c 3 --history "$history" --record
+    run_grep "$HBASE_HOST" ./hbase_regionserver_requests.py --history "$history" --query --since 10m
+    run_grep "$HBASE_HOST" ./hbase_regionserver_requests.py --history "$history" --query -T read,write
+    run_usage ./hbase_regionserver_requests.py --history "$history" --query --record
+    rm -f "$history" "$history-wal" "$history-shm"
 
     # ============================================================================ #
     run ./hbase_regions_by_size.py "$HBASE_HOST"
@@ -284,6 +362,7 @@ EOF
     run ./hbase_regions_by_size.py "$HBASE_HOST" --human -s
     run ./hbase_regions_by_size.py "$HBASE_HOST" --human --top 10
     run ./hbase_regions_by_size.py "$HBASE_HOST" --human --top 10 --smallest
+    run ./hbase_regions_by_size.py "$HBASE_HOST" localhost "$HBASE_HOST" --jobs 2
 
     run ./hbase_regions_by_memstore_size.py "$HBASE_HOST"
     run ./hbase_regions_by_memstore_size.py "$HBASE_HOST" --smallest
@@ -297,6 +376,8 @@ EOF
     run ./hbase_regions_least_used.py "$HBASE_HOST" -r 0
     run ./hbase_regions_least_used.py "$HBASE_HOST" --human --requests 20000
     run ./hbase_regions_least_used.py "$HBASE_HOST" --human --requests 20000 --top 10
+    run ./hbase_regions_least_used.py "$HBASE_HOST" localhost --requests 20000 -j 1
+    run ./hbase_regions_least_used.py "$HBASE_HOST" -T HS_test_data --requests 20000 --smallest --top 5
 
     [ -z "${KEEPDOCKER:-}" ] ||
     docker-compose down
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+#  vim:ts=4:sts=4:sw=4:et
+#
+#  Author: Hari Sekhon
+#  Date: 2026-10-19 18:02:44 +0100 (Mon, 19 Oct 2026)
+#
+#  https://github.com/HariSekhon/DevOps-Python-tools
+#
+#  License: see accompanying Hari Sekhon LICENSE file
+#
+#  If you're using my code you're welcome to connect with me on LinkedIn
+#  and optionally send me feedback to help steer this or other code I publish
+#
+#  https://www.linkedin.com/in/HariSekhon
+#
+
+"""
+
+Tests hbase_table_row_key_distribution.py --sample estimates against a simulated table of uniform random hex row keys
+split in to 16 regions like HexStringSplit, where the true distribution is known
+
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import bisect
+import os
+import random
+import sys
+
+srcdir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(srcdir, '..'))
+
+# pylint: disable=wrong-import-position
+from hbase_table_row_key_distribution import HBaseTableRegionRowDistribution
+
+SPLITS = [''] + ['{0:x}0000000'.format(_) for _ in range(1, 16)] + ['']
+
+
+class SimulatedTable(object):
+
+    def __init__(self, num_rows):
+        random.seed(0)
+        self.keys = sorted(set(['{0:08x}'.format(random.getrandbits(32)) for _ in range(num_rows)]))
+
+    @staticmethod
+    def regions():
+        return [{'start_key': SPLITS[i], 'end_key': SPLITS[i + 1]} for i in range(len(SPLITS) - 1)]
+
+    def scan(self, row_start=None, row_stop=None, limit=None, reverse=False, **_):
+        if reverse:
+            high = bisect.bisect_right(self.keys, row_start) if row_start else len(self.keys)
+            return [(key, {}) for key in reversed(self.keys[max(high - limit, 0):high])]
+        low = bisect.bisect_left(self.keys, row_start or '')
+        high = bisect.bisect_left(self.keys, row_stop) if row_stop else len(self.keys)
+        return [(key, {}) for key in self.keys[low:min(high, low + limit)]]
+
+
+def sample(table, sample_rows):
+    tool = HBaseTableRegionRowDistribution()
+    tool.verbose = 2
+    tool.sample = True
+    tool.sample_rows = sample_rows
+    tool.sample_points = 10
+    tool.batch_size = 10000
+    tool.confidence = '95'
+    tool.populate_sample_counts(table)
+    tool.calculate_row_percentages()
+    return tool
+
+
+def check(condition, msg):
+    if not condition:
+        print('FAILED: {0}'.format(msg))
+        sys.exit(1)
+    print('SUCCEEDED: {0}'.format(msg))
+
+
+def main():
+    table = SimulatedTable(200000)
+    num_rows = len(table.keys)
+
+    tool = sample(table, 100)
+    check(tool.num_complete == 0, 'no regions scanned completely with --sample-rows 100')
+    check(abs(tool.total_rows - num_rows) < num_rows * 0.1,
+          'estimated {0} rows within 10% of {1}'.format(tool.total_rows, num_rows))
+    for prefix in sorted(tool.rows):
+        share = tool.rows[prefix]['row_count'] / tool.total_rows * 100
+        check(abs(share - 100 / 16) < 1, "prefix '{0}' estimated {1:.2f}% of rows, within 1% of 6.25%"
+              .format(prefix, share))
+        (low, high) = [float(_) for _ in tool.rows[prefix]['ci'].split(' - ')]
+        check(0 < high - low < 2, "prefix '{0}' confidence interval {1} has width between 0 and 2%"
+              .format(prefix, tool.rows[prefix]['ci']))
+
+    table = SimulatedTable(10000)
+    num_rows = len(table.keys)
+    tool = sample(table, 5000)
+    check(tool.num_complete == 16, 'all 16 regions scanned completely with --sample-rows 5000')
+    check(tool.total_rows == num_rows, 'estimated {0} rows is exactly {1}'.format(tool.total_rows, num_rows))
+    for prefix in sorted(tool.rows):
+        (low, high) = tool.rows[prefix]['ci'].split(' - ')
+        check(low == high, "prefix '{0}' confidence interval {1} has zero width"
+              .format(prefix, tool.rows[prefix]['ci']))
+
+
+if __name__ == '__main__':
+    main()
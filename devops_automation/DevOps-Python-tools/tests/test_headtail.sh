@@ -73,6 +73,8 @@ check "cat $testfile | ./headtail.py -n10" "$expected_checksum" "noarg"
 
 check "./headtail.py $testfile -n 20" "$expected_checksum2" "file -n 20"
 
+check "./headtail.py -n 20 <(cat $testfile)" "$expected_checksum2" "unseekable file -n 20"
+
 check "cat $testfile | ./headtail.py - $testfile -n 20" "$expected_checksum3" "mixed - file -n 20"
 
 check "cat $testfile | ./headtail.py - $testfile - -n 20" "$expected_checksum4" "mixed - file - -n 20"
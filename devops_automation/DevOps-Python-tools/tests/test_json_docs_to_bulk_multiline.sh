@@ -213,6 +213,56 @@ echo "checking for non-existent file"
 check_broken nonexistentfile 2
 echo
 
+# ==================================================
+hr2
+echo "testing serial and parallel output are identical"
+[ "$(./json_docs_to_bulk_multiline.py -n 1 --exclude "$exclude" . | cksum)" = "$(./json_docs_to_bulk_multiline.py -n 4 --exclude "$exclude" . | cksum)" ] ||
+    { echo "parallel output order differs from serial output!"; exit 1; }
+echo
+
+echo "testing batched parallel output is identical to serial output"
+[ "$(./json_docs_to_bulk_multiline.py -n 1 --exclude "$exclude" . | cksum)" = "$(./json_docs_to_bulk_multiline.py -n 4 --batch-size 2 --exclude "$exclude" . | cksum)" ] ||
+    { echo "batched parallel output order differs from serial output!"; exit 1; }
+echo
+
+echo "testing parallel output of multi-record files bigger than a chunk is identical to serial output"
+big_json="$(mktemp -t json_docs_to_bulk_multiline_test.XXXXX)"
+for ((i=0; i < 50000; i++)); do
+    echo "{\"id\": $i, \"name\": \"hari\"}"
+done > "$big_json"
+[ "$(./json_docs_to_bulk_multiline.py -n 1 "$big_json" "$data_dir/multirecord.json" | cksum)" = "$(./json_docs_to_bulk_multiline.py -n 4 "$big_json" "$data_dir/multirecord.json" | cksum)" ] ||
+    { echo "spooled parallel output differs from serial output!"; exit 1; }
+[ "$(./json_docs_to_bulk_multiline.py -n 4 "$big_json" | wc -l)" = 50000 ] ||
+    { echo "spooled parallel output line count test failed!"; exit 1; }
+rm -f "$big_json"
+echo
+
+echo "testing --fast mode"
+[ "$(./json_docs_to_bulk_multiline.py --fast "$data_dir/multirecord.json" | cksum)" = "$(grep -v '^[[:space:]]*$' "$data_dir/multirecord.json" | cksum)" ] ||
+    { echo "--fast multi-record output differs from input!"; exit 1; }
+[ "$(./json_docs_to_bulk_multiline.py --fast "$data_dir/test.json" | wc -l)" = 1 ] ||
+    { echo "--fast single document output is not a single line!"; exit 1; }
+echo
+
+# ==================================================
+hr2
+echo "testing elasticsearch bulk format"
+[ "$(./json_docs_to_bulk_multiline.py --bulk --index myindex "$data_dir/multirecord.json" | head -n 1)" = '{"index": {"_index": "myindex"}}' ] ||
+    { echo "bulk action line test failed!"; exit 1; }
+[ "$(./json_docs_to_bulk_multiline.py --bulk "$data_dir/multirecord.json" | wc -l)" = 4 ] ||
+    { echo "bulk output line count test failed!"; exit 1; }
+echo
+
+echo "testing bulk output file rotation"
+bulk_dir="$(mktemp -d json_docs_to_bulk_multiline_test.XXXXX)"
+./json_docs_to_bulk_multiline.py --bulk --output-prefix "$bulk_dir/bulk" --max-docs 1 "$data_dir/multirecord.json"
+[ -f "$bulk_dir/bulk.00000.json" ] && [ -f "$bulk_dir/bulk.00001.json" ] ||
+    { echo "bulk output files not rotated by --max-docs!"; exit 1; }
+[ "$(cat "$bulk_dir"/bulk.*.json | cksum)" = "$(./json_docs_to_bulk_multiline.py --bulk "$data_dir/multirecord.json" | cksum)" ] ||
+    { echo "rotated bulk output differs from stdout output!"; exit 1; }
+rm -fr "$bulk_dir"
+echo
+
 echo "======="
 echo "SUCCESS"
 echo "======="
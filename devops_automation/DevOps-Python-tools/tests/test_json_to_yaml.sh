@@ -47,4 +47,24 @@ echo "recursing directory to convert all json files under a directory tree to ya
 # TODO: fix validate_yaml.py to work on multi-yamls with --- and re-enable
 #echo "now validating generated yaml"
 #./validate_yaml.py "$tmpfile"
+echo "converting directory tree to an output directory in parallel"
+outdir="$(mktemp -d json_to_yaml_test.XXXXX)"
+# want var splitting
+# shellcheck disable=SC2086
+trap 'rm -fr "$tmpfile" "$outdir"' $TRAP_SIGNALS
+./json_to_yaml.py --output-dir "$outdir" cloudformation/
+echo "now validating generated yaml files"
+./validate_yaml.py "$outdir"
+echo "checking up to date files are skipped"
+[ -z "$(./json_to_yaml.py --output-dir "$outdir" cloudformation/)" ] || { echo "up to date files were not skipped!"; exit 1; }
+[ -n "$(./json_to_yaml.py --output-dir "$outdir" --force cloudformation/)" ] || { echo "--force did not reconvert files!"; exit 1; }
+echo "checking different input files converting to the same output file are refused"
+mkdir "$outdir/dup"
+cp cloudformation/centos7-1node.json "$outdir/dup/"
+if ./json_to_yaml.py --output-dir "$outdir/dup_out" cloudformation/centos7-1node.json "$outdir/dup/centos7-1node.json"; then
+    echo "duplicate output files were not refused!"
+    exit 1
+fi
+[ ! -e "$outdir/dup_out" ] || { echo "files were converted despite duplicate output files!"; exit 1; }
+rm -fr "$outdir"
 echo "Success"
@@ -63,6 +63,19 @@ tee /dev/stderr |
     exit 1
 fi
 
+echo
+echo "checking stripping from large mixed input spanning multiple blocks"
+run++
+if { seq 1 300000; echo "some highlighted content" | grep --color=yes highlighted; seq 1 300000; } |
+    ./strip_ansi_escape_codes.py |
+    grep -c -e '^some highlighted content$' -e '^[[:digit:]]*$' |
+    grep -q '^600001$'; then
+    echo "ANSI escape code stripping SUCCEEDED"
+ else
+    echo "ANSI escape code stripping FAILED"
+    exit 1
+fi
+
 echo
 # $run_count defined in lib
 # shellcheck disable=SC2154
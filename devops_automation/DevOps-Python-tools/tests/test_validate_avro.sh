@@ -110,6 +110,28 @@ check_broken(){
 
 check_broken_sample_files avro
 
+echo "testing --quick header / schema only mode"
+./validate_avro.py --quick "$data_dir/test.avro"
+./validate_avro.py --quick - < "$data_dir/test.avro"
+./validate_avro.py --quick --exclude "$exclude" .
+echo
+
+echo "testing --deep parallel block decoding mode"
+./validate_avro.py --deep "$data_dir/test.avro"
+./validate_avro.py --deep -n 2 - < "$data_dir/test.avro"
+./validate_avro.py --deep --exclude "$exclude" .
+echo
+
+echo "checking --quick and --deep modes detect truncated avro"
+head -c "$(($(wc -c < "$data_dir/test.avro") - 10))" "$data_dir/test.avro" > "$broken_dir/truncated.avro"
+check_broken "$broken_dir/truncated.avro" 2 --quick
+check_broken "$broken_dir/truncated.avro" 2 --deep
+
+for filename in $(sample_files avro); do
+    check_broken "$filename" 2 --quick
+    check_broken "$filename" 2 --deep
+done
+
 rm -fr "$broken_dir"
 
 echo
@@ -81,6 +81,12 @@ echo "testing stdin print mode"
 echo "successfully passed out stdin test ldif to stdout"
 echo
 
+echo "testing stream mode"
+[ "$(./validate_ldap_ldif.py --stream "$data_dir/ldap.ldif" | cksum)" = "$(cksum < "$data_dir/ldap.ldif")" ] || { echo "stream test failed!"; exit 1; }
+[ "$(./validate_ldap_ldif.py --stream - < "$data_dir/ldap.ldif" | cksum)" = "$(cksum < "$data_dir/ldap.ldif")" ] || { echo "stream stdin test failed!"; exit 1; }
+echo "successfully streamed test ldif to stdout"
+echo
+
 check_broken(){
     local filename="$1"
     local expected_exitcode="${2:-2}"
@@ -112,6 +118,22 @@ check_broken "$broken_dir/first_entry_not_dn.ldif"
 
 check_broken_sample_files ldif
 
+echo "checking broken entry line numbers are reported"
+{ cat "$data_dir/ldap.ldif"; echo; echo "notdnfirst: test"; } > "$broken_dir/last_entry_not_dn.ldif"
+output="$(./validate_ldap_ldif.py "$broken_dir/last_entry_not_dn.ldif" 2>&1 || :)"
+echo "$output"
+grep -q 'entry [[:digit:]]* lines [[:digit:]]*-[[:digit:]]*' <<< "$output" || { echo "failed to report line numbers of broken ldif entry"; exit 1; }
+check_broken "$broken_dir/last_entry_not_dn.ldif" 2 --stream
+echo
+
+echo "checking stream mode outputs the entries before a broken entry but none of the broken entry"
+{ cat "$data_dir/ldap.ldif"; echo; echo "dn: cn=broken,dc=example,dc=org"; echo "broken line"; } > "$broken_dir/last_entry_broken.ldif"
+output="$(./validate_ldap_ldif.py --stream "$broken_dir/last_entry_broken.ldif" 2>/dev/null || :)"
+[ "$(grep -c '^dn:' <<< "$output")" = "$(grep -c '^dn:' "$data_dir/ldap.ldif")" ] || { echo "stream mode failed to output entries before broken entry"; exit 1; }
+! grep -q 'broken' <<< "$output" || { echo "stream mode output broken entry"; exit 1; }
+echo "successfully streamed only the valid entries"
+echo
+
 echo "checking for non-existent file"
 check_broken nonexistentfile 2
 echo
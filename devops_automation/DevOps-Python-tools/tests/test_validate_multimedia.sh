@@ -65,6 +65,14 @@ echo "checking directory recursion (mixed with explicit file given)"
 ./validate_multimedia.py "$test_file" .
 echo
 
+echo "checking concurrent jobs with stats"
+./validate_multimedia.py --quick --jobs 4 --stats "$test_file" .
+echo
+
+echo "checking serial mode"
+./validate_multimedia.py --jobs 1 "$test_file"
+echo
+
 echo "checking regex with directory recursion"
 ./validate_multimedia.py "$test_file" -r '\.mp3$' .
 echo
@@ -109,6 +117,7 @@ check_broken "$broken_dir/broken.mp3"
 echo
 echo "Checking failure with continue switch for entire tree"
 check_broken . 2 "$test_file" -c
+check_broken . 2 "$test_file" -c --jobs 4 --stats
 echo "Checking catches broken regex"
 check_broken . 3 -r "*.mp3"
 echo
@@ -113,6 +113,30 @@ check_broken(){
 
 check_broken_sample_files parquet
 
+echo "testing --quick footer-only mode"
+./validate_parquet.py --quick "$data_dir/test.parquet"
+./validate_parquet.py --quick - < "$data_dir/test.parquet"
+./validate_parquet.py --quick --exclude "$exclude" .
+echo
+
+echo "checking --quick mode detects truncated parquet"
+head -c 100 "$data_dir/test.parquet" > "$broken_dir/truncated.parquet"
+check_broken "$broken_dir/truncated.parquet" 2 --quick
+
+for filename in $(sample_files parquet); do
+    check_broken "$filename" 2 --quick
+done
+
+if python -c 'import pyarrow' 2>/dev/null; then
+    echo "testing --deep parallel row group mode"
+    ./validate_parquet.py --deep "$data_dir/test.parquet"
+    ./validate_parquet.py --deep -n 2 --exclude "$exclude" .
+    check_broken "$broken_dir/truncated.parquet" 2 --deep
+else
+    echo "pyarrow not installed, skipping --deep tests"
+fi
+echo
+
 rm -fr "$broken_dir"
 
 echo
@@ -104,11 +104,28 @@ EOF
 
 check_broken "$broken_dir/broken_tabs.yaml"
 
-cat "$data_dir/test.yaml" >> "$broken_dir/multi-broken.yaml"
-cat "$data_dir/test.yaml" >> "$broken_dir/multi-broken.yaml"
+echo "checking multi-document yaml stream"
+cat "$data_dir/test.yaml" "$data_dir/test.yaml" > "$broken_dir/multi-document.yaml"
+./validate_yaml.py "$broken_dir/multi-document.yaml"
+echo "checking multi-document yaml stream with pure python loader"
+./validate_yaml.py --pure-python "$broken_dir/multi-document.yaml"
+echo
+
+echo "benchmarking pure python vs libyaml C loaders"
+./validate_yaml.py --benchmark "$data_dir/test.yaml" "$broken_dir/multi-document.yaml" || :
+echo
+
+cat "$data_dir/test.yaml" > "$broken_dir/multi-broken.yaml"
+cat "$broken_dir/broken_tabs.yaml" >> "$broken_dir/multi-broken.yaml"
 
 check_broken "$broken_dir/multi-broken.yaml"
 
+echo "checking broken multi-document yaml reports the failing document"
+output="$(./validate_yaml.py -t 1 "$broken_dir/multi-broken.yaml" 2>&1 || :)"
+echo "$output"
+grep -q 'document 2 line' <<< "$output" || { echo "failed to report position of broken document in multi-document yaml stream"; exit 1; }
+echo
+
 # csv, ini, json and ldif all pass Python's yaml parser
 check_broken_sample_files yaml csv ini json ldif
 
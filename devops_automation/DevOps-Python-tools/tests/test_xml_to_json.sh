@@ -42,5 +42,20 @@ echo
 echo "running xml_to_json.py on tests/data/plant_catalog.xml":
 ./xml_to_json.py "tests/data/plant_catalog.xml" | ./validate_json.py
 echo
+echo "running xml_to_json.py --stream on tests/data/plant_catalog.xml":
+./xml_to_json.py --stream CATALOG/PLANT "tests/data/plant_catalog.xml" | ./validate_json.py --multi-record
+[ "$(./xml_to_json.py --stream CATALOG/PLANT "tests/data/plant_catalog.xml" | wc -l)" = "$(grep -c '<PLANT>' "tests/data/plant_catalog.xml")" ] || { echo "stream mode did not output one json document per element!"; exit 1; }
+echo
+
+echo "running xml_to_json.py --stream with wildcard on stdin < tests/data/plant_catalog.xml":
+./xml_to_json.py --stream '*/PLANT' < "tests/data/plant_catalog.xml" | ./validate_json.py --multi-record
+echo
+echo "running xml_to_json.py --output-dir on tests/data":
+outdir="$(mktemp -d xml_to_json_test.XXXXX)"
+./xml_to_json.py --output-dir "$outdir" tests/data
+./validate_json.py "$outdir"
+[ -f "$outdir/plant_catalog.json" ] || { echo "output dir does not mirror input files!"; exit 1; }
+rm -fr "$outdir"
+echo
 echo "XML to JSON tests succeeded!"
 echo
@@ -25,6 +25,12 @@ Directories are recursed, checking all files ending in a .avro suffix.
 Works like a standard unix filter program - if no files are passed as arguments or '-' is given then reads
 from standard input
 
+--quick mode only parses the container header and schema and checks the file ends with the header's sync marker,
+which catches most truncated files without decoding any records. Useful for bulk sweeps of HDFS export directories.
+
+--deep mode reads the header once, walks the block headers verifying each block's sync marker, and then decodes all
+the records in each block in parallel across a pool of processes (one per core by default).
+
 """
 
 from __future__ import absolute_import
@@ -32,21 +38,32 @@ from __future__ import division
 from __future__ import print_function
 # from __future__ import unicode_literals
 
+import io
 import os
 import re
+import struct
 import sys
+import tempfile
+import zlib
+from multiprocessing import Pool, cpu_count
 # pylint: disable=bare-except
 try:
     from avro3.datafile import DataFileReader, DataFileException
-    from avro3.io import DatumReader
+    from avro3.io import DatumReader, BinaryDecoder
+    import avro3.schema as avro_schema
 except Exception:  # pylint: disable=broad-except
     from avro.datafile import DataFileReader, DataFileException
-    from avro.io import DatumReader
+    from avro.io import DatumReader, BinaryDecoder
+    import avro.schema as avro_schema
+try:
+    import snappy
+except ImportError:
+    snappy = None
 libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
 sys.path.append(libdir)
 try:
     # pylint: disable=wrong-import-position
-    from harisekhon.utils import log, die, ERRORS, log_option, uniq_list_ordered, validate_regex
+    from harisekhon.utils import log, die, ERRORS, log_option, uniq_list_ordered, validate_regex, validate_int
     from harisekhon import CLI
 except ImportError as _:
     print('module import failed: %s' % _, file=sys.stderr)
@@ -55,7 +72,109 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.9.2'
+__version__ = '0.10.0'
+
+AVRO_MAGIC = b'Obj\x01'
+SYNC_SIZE = 16
+
+# avro 1.8 (Python 2) uses parse(), avro-python3 uses Parse()
+parse_schema = getattr(avro_schema, 'parse', None) or getattr(avro_schema, 'Parse')
+
+
+class AvroContainerError(Exception):
+    pass
+
+
+def read_long(filehandle):
+    """
+    Reads a zig-zag variable length encoded Avro long from a binary file handle
+    """
+    result = 0
+    shift = 0
+    while True:
+        byte = filehandle.read(1)
+        if not byte:
+            raise AvroContainerError('unexpected end of file at byte {0}'.format(filehandle.tell()))
+        byte = ord(byte)
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return (result >> 1) ^ -(result & 1)
+        shift += 7
+        if shift > 63:
+            raise AvroContainerError('varint too long at byte {0}'.format(filehandle.tell()))
+
+
+def read_exactly(filehandle, length):
+    data = filehandle.read(length)
+    if len(data) != length:
+        raise AvroContainerError('unexpected end of file at byte {0}, wanted {1} bytes, got {2}'
+                                 .format(filehandle.tell(), length, len(data)))
+    return data
+
+
+def read_header(filehandle):
+    """
+    Returns (metadata, sync_marker) from the Avro container header, leaving the file handle at the first block
+    """
+    if read_exactly(filehandle, len(AVRO_MAGIC)) != AVRO_MAGIC:
+        raise AvroContainerError('Avro magic bytes not found')
+    metadata = {}
+    while True:
+        count = read_long(filehandle)
+        if count == 0:
+            break
+        # negative count is followed by the block size in bytes, which we don't need
+        if count < 0:
+            count = -count
+            read_long(filehandle)
+        for _ in range(count):
+            key = read_exactly(filehandle, read_long(filehandle)).decode('utf-8')
+            metadata[key] = read_exactly(filehandle, read_long(filehandle))
+    if 'avro.schema' not in metadata:
+        raise AvroContainerError('avro.schema not found in header metadata')
+    return (metadata, read_exactly(filehandle, SYNC_SIZE))
+
+
+def decompress_block(codec, data):
+    if codec == 'null':
+        return data
+    elif codec == 'deflate':
+        return zlib.decompress(data, -15)
+    elif codec == 'snappy':
+        if snappy is None:
+            raise AvroContainerError("snappy codec requires the python-snappy module ('pip install python-snappy')")
+        # last 4 bytes are a CRC32 checksum of the uncompressed data
+        uncompressed = snappy.decompress(data[:-4])
+        if struct.unpack('>I', data[-4:])[0] != zlib.crc32(uncompressed) & 0xffffffff:
+            raise AvroContainerError('snappy block CRC32 checksum mismatch')
+        return uncompressed
+    raise AvroContainerError("unsupported codec '{0}'".format(codec))
+
+
+# cache parsed schemas in each worker process since all blocks of a file share the same schema
+SCHEMA_CACHE = {}
+
+
+# module level function so it can be pickled to the --deep process pool
+def decode_block(args):
+    (filename, schema_json, codec, block_num, offset, size, count) = args
+    try:
+        if schema_json not in SCHEMA_CACHE:
+            SCHEMA_CACHE.clear()
+            SCHEMA_CACHE[schema_json] = DatumReader(parse_schema(schema_json))
+        datum_reader = SCHEMA_CACHE[schema_json]
+        with open(filename, 'rb') as filehandle:
+            filehandle.seek(offset)
+            data = decompress_block(codec, read_exactly(filehandle, size))
+        buf = io.BytesIO(data)
+        decoder = BinaryDecoder(buf)
+        for _ in range(count):
+            datum_reader.read(decoder)
+        if buf.tell() != len(data):
+            raise AvroContainerError('{0} trailing bytes after {1} records'.format(len(data) - buf.tell(), count))
+    except Exception as _:  # pylint: disable=broad-except
+        return (block_num, str(_))
+    return (block_num, None)
 
 
 class AvroValidatorTool(CLI):
@@ -69,16 +188,35 @@ class AvroValidatorTool(CLI):
         self.valid_avro_msg = '<unknown> => Avro OK'
         self.invalid_avro_msg = '<unknown> => Avro INVALID'
         self.exclude = None
+        self.quick = False
+        self.deep = False
+        self.parallelism = None
+        self.pool = None
 
     def add_options(self):
         self.add_opt('-e', '--exclude', metavar='regex', default=os.getenv('EXCLUDE'),
                      help='Regex of file / directory paths to exclude from checking ($EXCLUDE)')
+        self.add_opt('-q', '--quick', action='store_true',
+                     help='Only check the header, schema and trailing sync marker, does not decode any records')
+        self.add_opt('-d', '--deep', action='store_true',
+                     help='Decode every record, with blocks decoded in parallel')
+        self.add_opt('-n', '--parallelism', metavar='num', type='int', default=cpu_count(),
+                     help='Number of processes to decode blocks in parallel in --deep mode ' +
+                     '(default: number of cores: {0})'.format(cpu_count()))
 
     def process_options(self):
         self.exclude = self.get_opt('exclude')
         if self.exclude:
             validate_regex(self.exclude, 'exclude')
             self.exclude = re.compile(self.exclude, re.I)
+        self.quick = self.get_opt('quick')
+        self.deep = self.get_opt('deep')
+        if self.quick and self.deep:
+            self.usage('--quick and --deep are mutually exclusive')
+        if self.deep:
+            self.parallelism = self.get_opt('parallelism')
+            validate_int(self.parallelism, 'parallelism', 1, 1000)
+            self.parallelism = int(self.parallelism)
 
     def is_excluded(self, path):
         if self.exclude and self.exclude.search(path):
@@ -87,6 +225,80 @@ class AvroValidatorTool(CLI):
         return False
 
     def check_avro(self, filehandle):
+        if self.quick:
+            self.check_avro_header(filehandle)
+        elif self.deep:
+            self.check_avro_blocks(filehandle)
+        else:
+            self.check_avro_reader(filehandle)
+
+    def parse_header(self, filehandle):
+        try:
+            (metadata, sync_marker) = read_header(filehandle)
+            schema_json = metadata['avro.schema'].decode('utf-8')
+            parse_schema(schema_json)
+            codec = metadata.get('avro.codec', b'null').decode('utf-8')
+        # avro schema parse exceptions vary between avro library versions
+        except Exception as _:  # pylint: disable=broad-except
+            if self.verbose > 2:
+                print(_)
+            die(self.invalid_avro_msg)
+        log.info('codec: %s, schema: %s', codec, schema_json)
+        return (schema_json, codec, sync_marker)
+
+    def check_avro_header(self, filehandle):
+        (_, _, sync_marker) = self.parse_header(filehandle)
+        # every block ends with the sync marker, and if there are no blocks then the header does
+        filehandle.seek(-SYNC_SIZE, os.SEEK_END)
+        if filehandle.read(SYNC_SIZE) != sync_marker:
+            if self.verbose > 2:
+                print('file does not end with sync marker, may be truncated')
+            die(self.invalid_avro_msg)
+        print(self.valid_avro_msg)
+
+    def find_blocks(self, filehandle, sync_marker):
+        """
+        Walks the block headers, seeking over the block data and checking the sync marker after each block
+
+        Returns a list of (block_num, offset, size, count)
+        """
+        blocks = []
+        file_size = os.fstat(filehandle.fileno()).st_size
+        while filehandle.tell() < file_size:
+            count = read_long(filehandle)
+            size = read_long(filehandle)
+            offset = filehandle.tell()
+            if count < 0 or size < 0 or offset + size + SYNC_SIZE > file_size:
+                raise AvroContainerError('invalid block {0} header at byte {1} (count={2}, size={3})'
+                                         .format(len(blocks), offset, count, size))
+            filehandle.seek(size, os.SEEK_CUR)
+            if filehandle.read(SYNC_SIZE) != sync_marker:
+                raise AvroContainerError('sync marker not found after block {0} at byte {1}'
+                                         .format(len(blocks), offset + size))
+            blocks.append((len(blocks), offset, size, count))
+        return blocks
+
+    def check_avro_blocks(self, filehandle):
+        (schema_json, codec, sync_marker) = self.parse_header(filehandle)
+        try:
+            blocks = self.find_blocks(filehandle, sync_marker)
+        except AvroContainerError as _:
+            if self.verbose > 2:
+                print(_)
+            die(self.invalid_avro_msg)
+        log.info('decoding %s records in %s blocks in %s processes',
+                 sum([block[3] for block in blocks]), len(blocks), self.parallelism)
+        if self.pool is None:
+            self.pool = Pool(processes=self.parallelism)
+        args = [(filehandle.name, schema_json, codec) + block for block in blocks]
+        for (block_num, error) in self.pool.imap_unordered(decode_block, args):
+            if error is not None:
+                if self.verbose > 2:
+                    print('block {0}: {1}'.format(block_num, error))
+                die(self.invalid_avro_msg)
+        print(self.valid_avro_msg)
+
+    def check_avro_reader(self, filehandle):
         try:
             DataFileReader(filehandle, DatumReader())
             print(self.valid_avro_msg)
@@ -118,6 +330,9 @@ class AvroValidatorTool(CLI):
                 die("path '%s' could not be determined as either a file or directory" % arg)
         for arg in args:
             self.check_path(arg)
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
 
     def check_path(self, path):
         if path == '-' or os.path.isfile(path):
@@ -148,12 +363,21 @@ class AvroValidatorTool(CLI):
         self.valid_avro_msg = '%s => Avro OK' % filename
         self.invalid_avro_msg = '%s => Avro INVALID' % filename
         if filename == '<STDIN>':
-            self.check_avro(sys.stdin)
+            if self.quick or self.deep:
+                # needs to seek and the --deep worker processes need to reopen the file, so spool to a tempfile
+                with tempfile.NamedTemporaryFile() as tmp:
+                    log.debug('created tmp file from stdin: %s', tmp.name)
+                    tmp.write(getattr(sys.stdin, 'buffer', sys.stdin).read())
+                    tmp.flush()
+                    tmp.seek(0)
+                    self.check_avro(tmp)
+            else:
+                self.check_avro(sys.stdin)
         else:
             if self.is_excluded(filename):
                 return
             try:
-                with open(filename) as avrohandle:
+                with open(filename, 'rb' if self.quick or self.deep else 'r') as avrohandle:
                     self.check_avro(avrohandle)
             except IOError as _:
                 die("ERROR: %s" % _)
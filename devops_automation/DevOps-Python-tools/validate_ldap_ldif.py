@@ -26,6 +26,15 @@ Directories if given are detected and recursed, checking all files in the direct
 Works like a standard unix filter program - if no files are passed as arguments or '-' is passed then reads from
 standard input
 
+Entries are parsed incrementally one at a time so memory use is bounded regardless of the size of the directory dump.
+The number of entries is reported for valid files and the line range of the first broken entry for invalid ones.
+
+--print spools the input to a temporary file while validating and only outputs it if the whole file is valid.
+
+--stream passes each entry through to stdout on the fly as soon as it has been parsed, for use in pipelines on very
+large exports. If a broken entry is found only the preceding entries will already have been output, none of the broken
+entry itself, and the exit code is still 2
+
 """
 
 from __future__ import absolute_import
@@ -35,7 +44,9 @@ from __future__ import unicode_literals
 
 import os
 import re
+import shutil
 import sys
+import tempfile
 import traceback
 #from pprint import pprint
 #from pprint import pformat
@@ -57,7 +68,45 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.6'
+__version__ = '0.7.1'
+
+
+class LineCountingReader(object):
+    """
+    Wraps a binary file handle to count the lines read by the LDIF parser and optionally tee them to another stream
+
+    Teed lines are held back until release() is called once the parser has returned the entry they belong to, so
+    none of a broken entry is ever written out
+    """
+
+    def __init__(self, filehandle, tee=None):
+        self.filehandle = filehandle
+        self.tee = tee
+        self.line_num = 0
+        self.held = []
+        self.eof = False
+
+    def readline(self):
+        line = self.filehandle.readline()
+        if line:
+            self.line_num += 1
+            if self.tee is not None:
+                self.held.append(line)
+        else:
+            self.eof = True
+        return line
+
+    def release(self):
+        """
+        Writes out the held lines, except the line the parser has already read ahead in to the next entry
+        """
+        if self.tee is None:
+            return
+        # the parser reads one line past each entry to check it isn't folded on to the next line
+        num_lines = len(self.held) if self.eof else len(self.held) - 1
+        for line in self.held[:num_lines]:
+            self.tee.write(line)
+        del self.held[:num_lines]
 
 
 class LdifValidatorTool(CLI):
@@ -72,6 +121,7 @@ class LdifValidatorTool(CLI):
         self.valid_ldif_msg = '<UNKNOWN_FILENAME> => LDIF OK'
         self.invalid_ldif_msg = '<UNKNOWN_FILENAME> => LDIF INVALID'
         self.passthru = False
+        self.stream = False
         self.msg = None
         self.failed = False
         self.exclude = None
@@ -81,6 +131,11 @@ class LdifValidatorTool(CLI):
                      help='Print the LDIF document(s) if valid (passthrough), else print nothing (useful for shell ' +
                      'pipelines). Exit codes are still 0 for success, or %s for failure'
                      % ERRORS['CRITICAL'])
+        self.add_opt('-s', '--stream', action='store_true',
+                     help='Print each LDIF entry once it is validated (streaming passthrough). Unlike --print, ' +
+                     'entries before a broken entry will already have been output, but none of the broken entry ' +
+                     'itself, and the exit code is still %s'
+                     % ERRORS['CRITICAL'])
         self.add_opt('-e', '--exclude', metavar='regex', default=os.getenv('exclude'),
                      help='regex of file / directory paths to exclude from checking ($exclude)')
 
@@ -96,49 +151,75 @@ class LdifValidatorTool(CLI):
             return True
         return False
 
-    def print(self, filehandle):
-        if self.passthru:
-            # TODO: this works but theoretically it shouldn't and might be working off buffers for small sample files
-            #       consider changing this to collect and write to a temporary file and testing that instead
-            filehandle.seek(0)
-            print(filehandle.read(), end='')
-        else:
-            print(self.msg)
-
     @staticmethod
-    def is_invalid_ldif(filehandle):
+    def parse_ldif(reader):
+        """
+        Parses the LDIF entries one at a time from the LineCountingReader
+
+        Returns (num_entries, error) where error is None or a string giving the line range of the first broken entry
+        """
+        parser = LDIFParser(reader)
+        num_entries = 0
+        # line after the end of the last good entry, approximate as the parser reads one line ahead
+        entry_start_line = 1
         try:
-            parser = LDIFParser(filehandle)
             # returns a generator so step through to force processing and trigger exception
             for _dn, entry in parser.parse():
-                log.debug('got entry record: %s', _dn)
+                num_entries += 1
+                log.debug('got entry record %s at line %s: %s', num_entries, reader.line_num, _dn)
                 # looks the same
                 #log.debug('%s', pformat(entry))
                 log.debug('%s', entry)
-            log.debug('%s records read', parser.records_read)
-            if not parser.records_read:
-                raise ValueError('no records read')
-            return False
+                entry_start_line = reader.line_num
+                reader.release()
         except ValueError as _:
             log.debug('ValueError: %s', _)
-            return _
+            # discard the broken entry's lines
+            del reader.held[:]
+            return (num_entries, 'entry {0} lines {1}-{2}: {3}'
+                    .format(num_entries + 1, entry_start_line, reader.line_num, _))
+        log.debug('%s records read', num_entries)
+        # any trailing comments or blank lines after the last entry
+        reader.release()
+        if not num_entries:
+            return (num_entries, 'no records read')
+        return (num_entries, None)
 
     def check_ldif(self, filehandle):
         #log.debug('check_ldif()')
-        exception = self.is_invalid_ldif(filehandle)
-        if exception:
-            log.debug('invalid ldif')
-            self.failed = True
-            self.msg = self.invalid_ldif_msg
-            if not self.passthru:
-                die(self.msg)
-        else:
-            log.debug('valid ldif')
-            self.msg = self.valid_ldif_msg
-            self.print(filehandle)
+        stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+        tee = None
+        if self.stream:
+            tee = stdout
+        elif self.passthru:
+            # spool to disk rather than memory so large files can still be passed through only once fully validated
+            tee = tempfile.TemporaryFile()
+        try:
+            (num_entries, error) = self.parse_ldif(LineCountingReader(filehandle, tee))
+            if error:
+                log.debug('invalid ldif')
+                self.failed = True
+                self.msg = '{0} ({1})'.format(self.invalid_ldif_msg, error)
+                if self.stream:
+                    stdout.flush()
+                    print(self.msg, file=sys.stderr)
+                elif not self.passthru:
+                    die(self.msg)
+            else:
+                log.debug('valid ldif')
+                self.msg = '{0} ({1} entries)'.format(self.valid_ldif_msg, num_entries)
+                if self.passthru and not self.stream:
+                    tee.seek(0)
+                    shutil.copyfileobj(tee, stdout)
+                elif not self.stream:
+                    print(self.msg)
+        finally:
+            if tee is not None and tee is not stdout:
+                tee.close()
 
     def run(self):
         self.passthru = self.get_opt('passthru')
+        self.stream = self.get_opt('stream')
         if not self.args:
             self.args.append('-')
         args = uniq_list_ordered(self.args)
@@ -190,7 +271,8 @@ class LdifValidatorTool(CLI):
         if filename == '<STDIN>':
             log.debug('checking <STDIN>')
             #self.check_ldif(sys.stdin.read())
-            self.check_ldif(sys.stdin)
+            # LDIF parser requires bytes, use the underlying byte stream on Python 3
+            self.check_ldif(getattr(sys.stdin, 'buffer', sys.stdin))
         else:
             if self.is_excluded(filename):
                 return
@@ -34,6 +34,11 @@ Directories are recursed, checking any files ending in one of the following exte
 or if given a --regex will check any matching filenames in the directories given. Files explicitly given on the
 command line are always checked.
 
+Runs multiple ffmpeg / ffprobe processes concurrently, keeping up to --jobs running at a time (defaults to the
+number of cores). Results are printed in the order they complete. Use --jobs 1 to check files serially in order.
+
+--stats prints the total throughput and the slowest files at the end.
+
 """
 
 from __future__ import absolute_import
@@ -45,12 +50,16 @@ import os
 import re
 import sys
 import subprocess
+import threading
+import time
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 CalledProcessError = subprocess.CalledProcessError
 libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
 sys.path.append(libdir)
 try:
     # pylint: disable=wrong-import-position
-    from harisekhon.utils import die, log, log_option, uniq_list_ordered, which, validate_regex
+    from harisekhon.utils import die, log, log_option, uniq_list_ordered, which, validate_regex, validate_int
     from harisekhon import CLI
 except ImportError as _:
     print('module import failed: %s' % _, file=sys.stderr)
@@ -59,7 +68,7 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.7.8'
+__version__ = '0.8.0'
 
 class MediaValidatorTool(CLI):
 
@@ -77,6 +86,14 @@ class MediaValidatorTool(CLI):
         # method for checking this comes from:
         # http://superuser.com/questions/100288/how-can-i-check-the-integrity-of-a-video-file-avi-mpeg-mp4
         self.validate_cmd = "ffmpeg -v error -f null - -i"
+        self.jobs = None
+        self.files = []
+        self.timings = []
+        self.procs = set()
+        self.procs_lock = threading.Lock()
+        self.stopping = False
+        self.start_time = None
+        self.total_time = 0
 
     def add_options(self):
         self.add_opt('-r', '--regex', default=None,
@@ -86,6 +103,12 @@ class MediaValidatorTool(CLI):
                      help="Quick mode (uses 'ffprobe' instead of 'ffmpeg')")
         self.add_opt('-c', '--continue', action='store_true', default=False,
                      help='Continue checking remaining files after finding a broken multimedia file')
+        self.add_opt('-j', '--jobs', metavar='num', type='int', default=cpu_count(),
+                     help='Number of files to check concurrently (default: number of cores: {0})'.format(cpu_count()))
+        self.add_opt('-s', '--stats', action='store_true', default=False,
+                     help='Print throughput and the slowest files at the end')
+        self.add_opt('-n', '--slowest', metavar='num', type='int', default=10,
+                     help='Number of slowest files to list with --stats (default: 10)')
 
     def process_args(self):
         self.skip_errors = self.get_opt('continue')
@@ -98,6 +121,10 @@ class MediaValidatorTool(CLI):
         log_option('regex', self.regex)
         log_option('quick', self.quick)
         log_option('continue-on-error', self.skip_errors)
+        self.jobs = self.get_opt('jobs')
+        validate_int(self.jobs, 'jobs', 1, 1000)
+        self.jobs = int(self.jobs)
+        validate_int(self.get_opt('slowest'), 'slowest', 0)
         if self.regex:
             validate_regex(self.regex)
             self.regex = re.compile(self.regex, re.I)
@@ -132,14 +159,74 @@ class MediaValidatorTool(CLI):
                     self.failed = True
                 else:
                     die(_)
+        self.check_media_files()
+        if self.get_opt('stats'):
+            self.print_stats()
         if self.failed:
             sys.exit(2)
 
+    def check_media_files(self):
+        log.info('checking %s files with %s concurrent jobs', len(self.files), self.jobs)
+        self.start_time = time.time()
+        pool = ThreadPool(processes=self.jobs)
+        try:
+            for (filename, error, output) in pool.imap_unordered(self.check_media_file, self.files):
+                self.process_result(filename, error, output)
+        finally:
+            self.stop()
+            pool.terminate()
+        self.total_time = time.time() - self.start_time
+
+    def process_result(self, filename, error, output):
+        if self.stopping:
+            return
+        if error is None:
+            print('%s => OK' % filename)
+            return
+        if isinstance(error, OSError):
+            self.stop()
+            die("OSError: '{0}' when running '{1} {2}'".format(error, self.validate_cmd, filename))
+        if self.verbose > 2:
+            print(output)
+        invalid_media_msg = '%s => INVALID' % filename
+        if self.skip_errors:
+            print(invalid_media_msg)
+            self.failed = True
+            return
+        self.stop()
+        die(invalid_media_msg)
+
+    def stop(self):
+        """
+        Stops launching new validators and kills any still running, used on the first failure without --continue
+        """
+        with self.procs_lock:
+            self.stopping = True
+            for proc in self.procs:
+                try:
+                    proc.kill()
+                except OSError:
+                    pass
+
+    def print_stats(self):
+        total_bytes = sum([os.path.getsize(filename) for (_, filename) in self.timings if os.path.exists(filename)])
+        total_time = max(self.total_time, 0.001)
+        print()
+        print('checked {0} files, {1:.1f} MB in {2:.2f} secs with {3} concurrent jobs => '
+              '{4:.2f} files/sec, {5:.2f} MB/sec'
+              .format(len(self.timings), total_bytes / 1024 / 1024, total_time, self.jobs,
+                      len(self.timings) / total_time, total_bytes / 1024 / 1024 / total_time))
+        slowest = sorted(self.timings, reverse=True)[:self.get_opt('slowest')]
+        if slowest:
+            print('\nslowest files:\n')
+            for (secs, filename) in slowest:
+                print('{0:8.2f} secs  {1}'.format(secs, filename))
+
     def check_path(self, path):
         if os.path.isfile(path):
             # files given explicitly are checked regardless
             # if self.regex and self.regex.search(path):
-            self.check_media_file(path)
+            self.files.append(path)
         elif os.path.isdir(path):
             listing = []
             try:
@@ -157,44 +244,53 @@ class MediaValidatorTool(CLI):
                     self.check_path(subpath)
                 elif self.regex:
                     if self.regex.search(item):
-                        self.check_media_file(subpath)
+                        self.files.append(subpath)
                 elif self.re_media_suffix.match(item):
-                    self.check_media_file(subpath)
+                    self.files.append(subpath)
         else:
             die("failed to determine if path '%s' is file or directory" % path)
 
     def check_media_file(self, filename):
+        """
+        Runs in a pool thread, returns (filename, error, output) for the main thread to report
+        """
         #if self.is_excluded(filename):
         #    return
-        valid_media_msg = '%s => OK' % filename
-        invalid_media_msg = '%s => INVALID' % filename
         cmd = self.validate_cmd
         log.debug('cmd: %s %s', cmd, filename)
         log.info('verifying {0}'.format(filename))
         # cmd = self.validate_cmd.format(filename)
+        start = time.time()
+        stdout = None
         try:
-            # capturing stderr to stdout because ffprobe prints to stderr in all cases
-            # Python 2.7+
-            #subprocess.check_output(cmd.split() + [filename], stderr=subprocess.STDOUT)
-            proc = subprocess.Popen(cmd.split() + [filename], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            (stdout, _) = proc.communicate()
-            returncode = proc.wait()
+            with self.procs_lock:
+                if self.stopping:
+                    return (filename, None, None)
+                # capturing stderr to stdout because ffprobe prints to stderr in all cases
+                # Python 2.7+
+                #subprocess.check_output(cmd.split() + [filename], stderr=subprocess.STDOUT)
+                proc = subprocess.Popen(cmd.split() + [filename], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                self.procs.add(proc)
+            try:
+                (stdout, _) = proc.communicate()
+                returncode = proc.wait()
+            finally:
+                with self.procs_lock:
+                    self.procs.discard(proc)
+            if stdout is not None and not isinstance(stdout, str):
+                stdout = stdout.decode('utf-8', 'replace')
             if returncode != 0 or (stdout is not None and 'Error' in stdout):
                 _ = CalledProcessError(returncode, cmd)
                 _.output = stdout
                 raise _
-            print(valid_media_msg)
         except CalledProcessError as _:
-            if self.verbose > 2:
-                print(_.output)
-            if self.skip_errors:
-                print(invalid_media_msg)
-                self.failed = True
-                return False
-            die(invalid_media_msg)
+            return (filename, _, _.output)
         except OSError as _:
-            die("OSError: '{0}' when running '{1} {2}'", _, cmd, filename)
-
+            return (filename, _, None)
+        finally:
+            if not self.stopping:
+                self.timings.append((time.time() - start, filename))
+        return (filename, None, stdout)
 
 if __name__ == '__main__':
     MediaValidatorTool().main()
@@ -31,6 +31,13 @@ Parquet-tools must be either in the $PATH or adjacent to this program (it's down
 'make' build). Things like passing data through stdin requires writing out to a tempfile (which is auto-cleaned up
 afterwards) and then reading it back in parquet tools, which is non-ideal in terms of performance.
 
+--quick mode doesn't use parquet-tools at all, it only checks the PAR1 magic bytes at both ends of the file and parses
+the Thrift footer metadata via a memory-mapped read, so it only touches the first and last few pages of each file.
+This is good for bulk sweeps of data lake directories to catch truncated or corrupted files.
+
+--deep mode decodes every row group in parallel across a pool of processes (one per core by default) using PyArrow,
+which must be installed separately for this mode.
+
 """
 
 # This module doesn't have full parquet support and will therefore break on some parquet files
@@ -42,21 +49,25 @@ from __future__ import print_function
 # from __future__ import unicode_literals
 
 import glob
+import mmap
 import os
 import re
+import struct
 import subprocess
 import sys
 import tempfile
-#try:
-#    import pyarrow.parquet as pq
-#except ImportError as _:
-#    print('module import failed: %s' % _, file=sys.stderr)
-#    sys.exit(4)
+from multiprocessing import Pool, cpu_count
+# only needed for --deep mode
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
 libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
 sys.path.append(libdir)
 try:
     # pylint: disable=wrong-import-position
     from harisekhon.utils import die, ERRORS, log_option, log, which, uniq_list_ordered, validate_regex
+    from harisekhon.utils import validate_int
     from harisekhon import CLI
 except ImportError as _:
     print('module import failed: %s' % _, file=sys.stderr)
@@ -65,7 +76,121 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.9.1'
+__version__ = '0.10.0'
+
+PARQUET_MAGIC = b'PAR1'
+
+
+class ParquetFooterError(Exception):
+    pass
+
+
+class ThriftCompactReader(object):
+    """
+    Minimal Thrift Compact Protocol decoder, just enough to parse a Parquet footer into nested dicts of
+    field id => value without requiring the generated parquet.thrift classes
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read_byte(self):
+        if self.pos >= len(self.data):
+            raise ParquetFooterError('unexpected end of footer at byte {0}'.format(self.pos))
+        byte = self.data[self.pos]
+        self.pos += 1
+        # Python 2 indexes bytes as str
+        if not isinstance(byte, int):
+            byte = ord(byte)
+        return byte
+
+    def read_bytes(self, length):
+        if self.pos + length > len(self.data):
+            raise ParquetFooterError('field of length {0} overruns footer at byte {1}'.format(length, self.pos))
+        val = self.data[self.pos:self.pos + length]
+        self.pos += length
+        return val
+
+    def read_varint(self):
+        result = 0
+        shift = 0
+        while True:
+            byte = self.read_byte()
+            result |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return result
+            shift += 7
+            if shift > 63:
+                raise ParquetFooterError('varint too long at byte {0}'.format(self.pos))
+
+    def read_zigzag(self):
+        num = self.read_varint()
+        return (num >> 1) ^ -(num & 1)
+
+    def read_value(self, ttype):
+        # pylint: disable=too-many-return-statements
+        if ttype == 1:
+            return True
+        elif ttype == 2:
+            return False
+        elif ttype == 3:
+            return self.read_byte()
+        elif ttype in (4, 5, 6):
+            return self.read_zigzag()
+        elif ttype == 7:
+            return struct.unpack('<d', self.read_bytes(8))[0]
+        elif ttype == 8:
+            return self.read_bytes(self.read_varint())
+        elif ttype in (9, 10):
+            return self.read_list()
+        elif ttype == 11:
+            return self.read_map()
+        elif ttype == 12:
+            return self.read_struct()
+        raise ParquetFooterError('invalid thrift type {0} at byte {1}'.format(ttype, self.pos))
+
+    def read_list(self):
+        header = self.read_byte()
+        size = header >> 4
+        if size == 15:
+            size = self.read_varint()
+        ttype = header & 0x0f
+        # booleans inside lists are encoded as a whole byte rather than in the type nibble
+        if ttype in (1, 2):
+            return [self.read_byte() == 1 for _ in range(size)]
+        return [self.read_value(ttype) for _ in range(size)]
+
+    def read_map(self):
+        size = self.read_varint()
+        if not size:
+            return {}
+        types = self.read_byte()
+        return dict((self.read_value(types >> 4), self.read_value(types & 0x0f)) for _ in range(size))
+
+    def read_struct(self):
+        fields = {}
+        field_id = 0
+        while True:
+            header = self.read_byte()
+            if header == 0:
+                return fields
+            delta = header >> 4
+            if delta:
+                field_id += delta
+            else:
+                field_id = self.read_zigzag()
+            fields[field_id] = self.read_value(header & 0x0f)
+
+
+# module level function so it can be pickled to the --deep process pool
+def read_row_group(args):
+    (filename, row_group) = args
+    try:
+        pq.ParquetFile(filename).read_row_group(row_group)
+    except Exception as _:  # pylint: disable=broad-except
+        return (row_group, str(_))
+    return (row_group, None)
 
 
 class ParquetValidatorTool(CLI):
@@ -80,6 +205,10 @@ class ParquetValidatorTool(CLI):
         self.valid_parquet_msg = '<unknown> => Parquet OK'
         self.invalid_parquet_msg = '<unknown> => Parquet INVALID'
         self.exclude = None
+        self.quick = False
+        self.deep = False
+        self.parallelism = None
+        self.pool = None
         for _ in reversed(glob.glob(os.path.join(os.path.dirname(__file__), 'parquet-tools-*'))):
             if os.path.isdir(_):
                 log.debug('adding %s to $PATH' % _)
@@ -88,12 +217,30 @@ class ParquetValidatorTool(CLI):
     def add_options(self):
         self.add_opt('-e', '--exclude', metavar='regex', default=os.getenv('EXCLUDE'),
                      help='Regex of file / directory paths to exclude from checking ($EXCLUDE)')
+        self.add_opt('-q', '--quick', action='store_true',
+                     help='Only check the magic bytes and parse the footer metadata, ' +
+                     'fast but does not decode any data pages')
+        self.add_opt('-d', '--deep', action='store_true',
+                     help='Decode every row group in parallel using PyArrow')
+        self.add_opt('-n', '--parallelism', metavar='num', type='int', default=cpu_count(),
+                     help='Number of processes to decode row groups in parallel in --deep mode ' +
+                     '(default: number of cores: {0})'.format(cpu_count()))
 
     def process_options(self):
         self.exclude = self.get_opt('exclude')
         if self.exclude:
             validate_regex(self.exclude, 'exclude')
             self.exclude = re.compile(self.exclude, re.I)
+        self.quick = self.get_opt('quick')
+        self.deep = self.get_opt('deep')
+        if self.quick and self.deep:
+            self.usage('--quick and --deep are mutually exclusive')
+        if self.deep:
+            if pq is None:
+                die('--deep requires the pyarrow module, please pip install pyarrow')
+            self.parallelism = self.get_opt('parallelism')
+            validate_int(self.parallelism, 'parallelism', 1, 1000)
+            self.parallelism = int(self.parallelism)
 
     def is_excluded(self, path):
         if self.exclude and self.exclude.search(path):
@@ -102,6 +249,81 @@ class ParquetValidatorTool(CLI):
         return False
 
     def check_parquet(self, filename):
+        if self.quick:
+            self.check_parquet_footer(filename)
+        elif self.deep:
+            self.check_parquet_row_groups(filename)
+        else:
+            self.check_parquet_cat(filename)
+
+    @staticmethod
+    def parse_footer(filename):
+        """
+        Returns the Parquet footer FileMetaData as a dict of Thrift field id => value
+
+        Only the header magic, the trailing 8 bytes and the footer itself are read from the memory mapped file
+        """
+        with open(filename, 'rb') as filehandle:
+            size = os.fstat(filehandle.fileno()).st_size
+            # header magic + footer length + trailing magic
+            if size < 12:
+                raise ParquetFooterError('file too small to be parquet ({0} bytes)'.format(size))
+            mapped = mmap.mmap(filehandle.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if mapped[:4] != PARQUET_MAGIC:
+                    raise ParquetFooterError('header magic bytes not found')
+                if mapped[-4:] != PARQUET_MAGIC:
+                    raise ParquetFooterError('trailing magic bytes not found, file may be truncated')
+                footer_length = struct.unpack('<I', mapped[-8:-4])[0]
+                footer_start = size - 8 - footer_length
+                if footer_start < 4:
+                    raise ParquetFooterError('footer length {0} exceeds file size {1}'.format(footer_length, size))
+                reader = ThriftCompactReader(mapped[footer_start:size - 8])
+            finally:
+                mapped.close()
+        metadata = reader.read_struct()
+        if reader.pos != footer_length:
+            raise ParquetFooterError('footer metadata ended at byte {0} of {1}'.format(reader.pos, footer_length))
+        # FileMetaData required fields: 1 = version, 2 = schema, 3 = num_rows, 4 = row_groups
+        for field_id in (1, 2, 3, 4):
+            if field_id not in metadata:
+                raise ParquetFooterError('footer metadata missing required field {0}'.format(field_id))
+        # RowGroup field 3 = num_rows
+        row_group_rows = sum([row_group.get(3, 0) for row_group in metadata[4]])
+        if row_group_rows != metadata[3]:
+            raise ParquetFooterError('row groups total {0} rows but footer says {1} rows'
+                                     .format(row_group_rows, metadata[3]))
+        return metadata
+
+    def check_parquet_footer(self, filename):
+        try:
+            metadata = self.parse_footer(filename)
+        except (ParquetFooterError, IOError, ValueError) as _:
+            if self.verbose > 2:
+                print(_)
+            die(self.invalid_parquet_msg)
+        log.info('%s rows in %s row groups, %s schema elements', metadata[3], len(metadata[4]), len(metadata[2]))
+        print(self.valid_parquet_msg)
+
+    def check_parquet_row_groups(self, filename):
+        try:
+            num_row_groups = len(self.parse_footer(filename)[4])
+        except (ParquetFooterError, IOError, ValueError) as _:
+            if self.verbose > 2:
+                print(_)
+            die(self.invalid_parquet_msg)
+        log.info('decoding %s row groups in %s processes', num_row_groups, self.parallelism)
+        if self.pool is None:
+            self.pool = Pool(processes=self.parallelism)
+        args = [(filename, row_group) for row_group in range(num_row_groups)]
+        for (row_group, error) in self.pool.imap_unordered(read_row_group, args):
+            if error is not None:
+                if self.verbose > 2:
+                    print('row group {0}: {1}'.format(row_group, error))
+                die(self.invalid_parquet_msg)
+        print(self.valid_parquet_msg)
+
+    def check_parquet_cat(self, filename):
         stderr = subprocess.PIPE
         if self.verbose > 2:
             stderr = None
@@ -133,6 +355,9 @@ class ParquetValidatorTool(CLI):
                 die("path '%s' could not be determined as either a file or directory" % arg)
         for arg in args:
             self.check_path(arg)
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
 
     def check_path(self, path):
         if path == '-' or os.path.isfile(path):
@@ -174,7 +399,8 @@ class ParquetValidatorTool(CLI):
             try:
                 tmp = tempfile.NamedTemporaryFile()
                 log.debug('created tmp file from stdin: %s', tmp.name)
-                tmp.write(sys.stdin.read())
+                # parquet is binary, use the underlying byte stream on Python 3
+                tmp.write(getattr(sys.stdin, 'buffer', sys.stdin).read())
                 tmp.seek(0)
                 self.check_parquet(tmp.name)
                 tmp.close()
@@ -22,6 +22,14 @@ Validates each file passed as an argument
 
 Directories are recursed, checking all files ending in a .yml / .yaml suffix.
 
+Multi-document YAML (eg. Kubernetes manifest bundles) is parsed as a stream, one document at a time, and the
+document number, line and column of the first error is reported.
+
+Uses the libyaml C loader automatically if PyYAML was built with it, falling back to the pure Python loader.
+
+--benchmark times both the pure Python and libyaml C loaders against each file instead of validating,
+to compare them on your own corpus of YAML files.
+
 Works like a standard unix filter program - if no files are passed as arguments or '-' is given then reads
 from standard input
 
@@ -34,13 +42,19 @@ from __future__ import unicode_literals
 
 import os
 import re
+import shutil
 import sys
+import time
 import yaml
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
 sys.path.append(libdir)
 try:
     # pylint: disable=wrong-import-position
-    from harisekhon.utils import log, die, ERRORS, isYaml, log_option, uniq_list_ordered, validate_regex
+    from harisekhon.utils import log, die, ERRORS, log_option, uniq_list_ordered, validate_regex
     from harisekhon import CLI
 except ImportError as _:
     print('module import failed: %s' % _, file=sys.stderr)
@@ -49,7 +63,11 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.9.3'
+__version__ = '0.10.0'
+
+# libyaml C loader is only present if PyYAML was compiled against libyaml
+PURE_LOADER = yaml.SafeLoader
+C_LOADER = getattr(yaml, 'CSafeLoader', None)
 
 
 class YamlValidatorTool(CLI):
@@ -64,6 +82,10 @@ class YamlValidatorTool(CLI):
         self.invalid_yaml_msg = '<unknown> => YAML INVALID'
         self.failed = False
         self.exclude = None
+        self.filename = None
+        self.loader = C_LOADER or PURE_LOADER
+        self.benchmark = False
+        self.benchmark_totals = {'pure': 0.0, 'c': 0.0}
 
     def add_options(self):
         self.add_opt('-p', '--print', action='store_true',
@@ -72,12 +94,26 @@ class YamlValidatorTool(CLI):
                      % ERRORS['CRITICAL'])
         self.add_opt('-e', '--exclude', metavar='regex', default=os.getenv('EXCLUDE'),
                      help='Regex of file / directory paths to exclude from checking ($EXCLUDE)')
+        self.add_opt('-P', '--pure-python', action='store_true',
+                     help='Use the pure Python YAML loader even if the libyaml C loader is available')
+        self.add_opt('-B', '--benchmark', action='store_true',
+                     help='Time parsing each file with both the pure Python and libyaml C loaders ' +
+                     'and print the timings instead of validating')
 
     def process_options(self):
         self.exclude = self.get_opt('exclude')
         if self.exclude:
             validate_regex(self.exclude, 'exclude')
             self.exclude = re.compile(self.exclude, re.I)
+        self.benchmark = self.get_opt('benchmark')
+        if self.get_opt('pure_python'):
+            self.loader = PURE_LOADER
+        if self.benchmark:
+            if self.get_opt('print'):
+                die('--benchmark and --print are mutually exclusive')
+            if C_LOADER is None:
+                die('cannot --benchmark, libyaml C loader is not available in this PyYAML installation')
+        log_option('yaml loader', self.loader.__name__)
 
     def is_excluded(self, path):
         if self.exclude and self.exclude.search(path):
@@ -85,24 +121,67 @@ class YamlValidatorTool(CLI):
             return True
         return False
 
-    def check_yaml(self, content):
-        if isYaml(content, safe_load_all=True):
+    def check_yaml(self, iostream):
+        """
+        Parses the YAML stream one document at a time without keeping previous documents in memory
+
+        Returns None on success or a string describing the position of the first error
+        """
+        doc_num = 0
+        try:
+            for _ in yaml.load_all(iostream, Loader=self.loader):
+                doc_num += 1
+        except yaml.YAMLError as _:
+            if self.verbose > 2:
+                print(_)
+            position = 'document %s' % (doc_num + 1)
+            mark = getattr(_, 'problem_mark', None)
+            if mark is not None:
+                position += ' line %s column %s' % (mark.line + 1, mark.column + 1)
+            return position
+        log.debug('%s YAML document(s) parsed', doc_num)
+        return None
+
+    def check_stream(self, iostream):
+        if self.benchmark:
+            self.benchmark_yaml(iostream.read())
+            return
+        # can't rewind stdin to pass it through, so have to buffer it for --print
+        if self.get_opt('print') and iostream is sys.stdin:
+            iostream = StringIO(iostream.read())
+        error_position = self.check_yaml(iostream)
+        if error_position is None:
             if self.get_opt('print'):
-                print(content, end='')
+                iostream.seek(0)
+                shutil.copyfileobj(iostream, sys.stdout)
             else:
                 print(self.valid_yaml_msg)
-        # multi-record yaml like JSON in Big Data isn't really used
-        # elif self.check_multiline_yaml():
-        #     pass
         else:
             self.failed = True
             if not self.get_opt('print'):
-                if self.verbose > 2:
-                    try:
-                        yaml.safe_load_all(content)
-                    except yaml.YAMLError as _:
-                        print(_)
-                die(self.invalid_yaml_msg)
+                die('%s (%s)' % (self.invalid_yaml_msg, error_position))
+
+    def benchmark_yaml(self, content):
+        timings = {}
+        for name, loader in (('pure', PURE_LOADER), ('c', C_LOADER)):
+            start = time.time()
+            try:
+                for _ in yaml.load_all(content, Loader=loader):
+                    pass
+            except yaml.YAMLError as _:
+                self.failed = True
+                print('%s (%s loader error: %s)' % (self.invalid_yaml_msg, name, str(_).replace('\n', ' ')))
+                return
+            timings[name] = time.time() - start
+            self.benchmark_totals[name] += timings[name]
+        print('%s => pure python loader: %.4f secs, libyaml C loader: %.4f secs, speedup: %s'
+              % (self.filename, timings['pure'], timings['c'], self.speedup(timings['pure'], timings['c'])))
+
+    @staticmethod
+    def speedup(pure, c_time):
+        if not c_time:
+            return 'N/A'
+        return '%.1fx' % (pure / c_time)
 
     def run(self):
         if not self.args:
@@ -122,6 +201,10 @@ class YamlValidatorTool(CLI):
                 die("path '%s' could not be determined as either a file or directory" % arg)
         for arg in args:
             self.check_path(arg)
+        if self.benchmark:
+            print('\nTotal => pure python loader: %.4f secs, libyaml C loader: %.4f secs, speedup: %s'
+                  % (self.benchmark_totals['pure'], self.benchmark_totals['c'],
+                     self.speedup(self.benchmark_totals['pure'], self.benchmark_totals['c'])))
         if self.failed:
             sys.exit(ERRORS['CRITICAL'])
 
@@ -151,16 +234,17 @@ class YamlValidatorTool(CLI):
     def check_file(self, filename):
         if filename == '-':
             filename = '<STDIN>'
+        self.filename = filename
         self.valid_yaml_msg = '%s => YAML OK' % filename
         self.invalid_yaml_msg = '%s => YAML INVALID' % filename
         if filename == '<STDIN>':
-            self.check_yaml(sys.stdin.read())
+            self.check_stream(sys.stdin)
         else:
             if self.is_excluded(filename):
                 return
             try:
                 with open(filename) as iostream:
-                    self.check_yaml(iostream.read())
+                    self.check_stream(iostream)
             except IOError as _:
                 die("ERROR: %s" % _)
 
@@ -25,6 +25,13 @@ Directories if given are detected and recursed, processing all files in the dire
 Works like a standard unix filter program - if no files are passed as arguments or '-' is passed then reads from
 standard input.
 
+With --output-dir, writes each converted file to a .json file under that directory instead, mirroring the input
+directory tree and converting files in parallel. Files whose output is already newer than the input are skipped.
+
+--stream mode takes the slash separated path of a repeating element (eg. CATALOG/PLANT) and outputs one JSON document
+per matching element as newline delimited JSON as the XML is parsed, discarding each element after it's been output.
+This converts arbitrarily large XML feeds in constant memory for piping straight in to bulk loaders.
+
 """
 
 from __future__ import absolute_import
@@ -37,13 +44,18 @@ import os
 import re
 import sys
 import xml
+from functools import partial
 import xmltodict
-libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
-sys.path.append(libdir)
+srcdir = os.path.abspath(os.path.dirname(__file__))
+pylib = os.path.join(srcdir, 'pylib')
+lib = os.path.join(srcdir, 'lib')
+sys.path.append(pylib)
+sys.path.append(lib)
 try:
     # pylint: disable=wrong-import-position
     from harisekhon.utils import die, ERRORS, log, log_option
     from harisekhon import CLI
+    from batch_convert import BatchConverter
 except ImportError as _:
     print('module import failed: %s' % _, file=sys.stderr)
     print("Did you remember to build the project by running 'make'?", file=sys.stderr)
@@ -51,7 +63,13 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.2.0'
+__version__ = '0.4.0'
+
+
+# module level function so it can be pickled to the --output-dir process pool
+def convert_xml_to_json(content, indent=None):
+    _ = xmltodict.parse(content)
+    return json.dumps(_, sort_keys=True, indent=indent) #, separators=(',', ': '))
 
 
 class XmlToJson(CLI):
@@ -62,26 +80,59 @@ class XmlToJson(CLI):
         # Python 3.x
         # super().__init__()
         self.indent = None
+        self.stream_path = None
         self.re_xml_suffix = re.compile(r'.*\.xml$', re.I)
+        self.batch = BatchConverter(self, convert_xml_to_json, self.re_xml_suffix, '.json')
 
     def add_options(self):
         self.add_opt('-p', '--pretty', action='store_true', help='Pretty Print the resulting JSON')
+        self.add_opt('-s', '--stream', metavar='path',
+                     help='Stream each element matching this slash separated element path (eg. CATALOG/PLANT, ' +
+                     'use * to match any element name at that level) as one JSON document per line')
+        self.batch.add_options()
 
     def xml_to_json(self, content, filepath=None):
         try:
-            _ = xmltodict.parse(content)
+            return convert_xml_to_json(content, indent=self.indent)
+        except xml.parsers.expat.ExpatError as _:
+            file_detail = ''
+            if filepath is not None:
+                file_detail = ' in file \'{0}\''.format(filepath)
+            die("Failed to parse XML{0}: {1}".format(file_detail, _))
+
+    def stream_element(self, path, item):
+        # xmltodict calls this for every element at the stream path depth, only output those matching the names
+        for (name, _), stream_name in zip(path, self.stream_path):
+            if stream_name not in ('*', name):
+                return True
+        print(json.dumps(item, sort_keys=True))
+        # returning True tells xmltodict to continue parsing, the item is not retained in the tree
+        return True
+
+    def xml_to_json_stream(self, filehandle, filepath=None):
+        try:
+            xmltodict.parse(filehandle, item_depth=len(self.stream_path), item_callback=self.stream_element)
         except xml.parsers.expat.ExpatError as _:
             file_detail = ''
             if filepath is not None:
                 file_detail = ' in file \'{0}\''.format(filepath)
             die("Failed to parse XML{0}: {1}".format(file_detail, _))
-        json_string = json.dumps(_, sort_keys=True, indent=self.indent) #, separators=(',', ': '))
-        return json_string
 
     def run(self):
         if self.get_opt('pretty'):
             log_option('pretty', True)
             self.indent = 4
+        self.batch.process_options()
+        self.batch.converter = partial(convert_xml_to_json, indent=self.indent)
+        if self.get_opt('stream'):
+            if self.batch.output_dir:
+                self.usage('--stream and --output-dir are mutually exclusive')
+            if self.indent:
+                self.usage('--pretty cannot be used with --stream as newline delimited JSON must be one line each')
+            self.stream_path = [_ for _ in self.get_opt('stream').split('/') if _]
+            if not self.stream_path:
+                self.usage('--stream path must contain at least one element name')
+            log_option('stream path', '/'.join(self.stream_path))
         if not self.args:
             self.args.append('-')
         for arg in self.args:
@@ -96,6 +147,10 @@ class XmlToJson(CLI):
                 log_option('directory', arg)
             else:
                 die("path '%s' could not be determined as either a file or directory" % arg)
+        if self.batch.output_dir:
+            if self.batch.run(self.args):
+                sys.exit(ERRORS['CRITICAL'])
+            return
         for arg in self.args:
             self.process_path(arg)
 
@@ -116,7 +171,14 @@ class XmlToJson(CLI):
         if filepath == '-':
             filepath = '<STDIN>'
         if filepath == '<STDIN>':
-            print(self.xml_to_json(sys.stdin.read()))
+            if self.stream_path:
+                # expat parses bytes, use the underlying byte stream on Python 3
+                self.xml_to_json_stream(getattr(sys.stdin, 'buffer', sys.stdin))
+            else:
+                print(self.xml_to_json(sys.stdin.read()))
+        elif self.stream_path:
+            with open(filepath, 'rb') as _:
+                self.xml_to_json_stream(_, filepath=filepath)
         else:
             with open(filepath) as _:
                 content = _.read()
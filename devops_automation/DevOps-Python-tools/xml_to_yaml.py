@@ -25,6 +25,9 @@ Directories if given are detected and recursed, processing all files in the dire
 Works like a standard unix filter program - if no files are passed as arguments or '-' is passed then reads from
 standard input.
 
+With --output-dir, writes each converted file to a .yaml file under that directory instead, mirroring the input
+directory tree and converting files in parallel. Files whose output is already newer than the input are skipped.
+
 """
 
 from __future__ import absolute_import
@@ -39,12 +42,16 @@ import sys
 import xml
 import xmltodict
 import yaml
-libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
-sys.path.append(libdir)
+srcdir = os.path.abspath(os.path.dirname(__file__))
+pylib = os.path.join(srcdir, 'pylib')
+lib = os.path.join(srcdir, 'lib')
+sys.path.append(pylib)
+sys.path.append(lib)
 try:
     # pylint: disable=wrong-import-position
     from harisekhon.utils import die, ERRORS, log, log_option
     from harisekhon import CLI
+    from batch_convert import BatchConverter
 except ImportError as _:
     print('module import failed: %s' % _, file=sys.stderr)
     print("Did you remember to build the project by running 'make'?", file=sys.stderr)
@@ -52,7 +59,16 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.1.0'
+__version__ = '0.2.0'
+
+
+# module level function so it can be pickled to the --output-dir process pool
+def convert_xml_to_yaml(content):
+    _ = xmltodict.parse(content)
+    # xmltodict returns a unicode OrderedDict so need to make it a plain dict to come out properly not like:
+    # !!python/object/apply:collections.OrderedDict
+    yaml_string = yaml.safe_dump(json.loads(json.dumps(_)), encoding='utf-8', sort_keys=True)
+    return yaml_string
 
 
 class XmlToYaml(CLI):
@@ -64,25 +80,24 @@ class XmlToYaml(CLI):
         # super().__init__()
         self.indent = None
         self.re_xml_suffix = re.compile(r'.*\.xml$', re.I)
+        self.batch = BatchConverter(self, convert_xml_to_yaml, self.re_xml_suffix, '.yaml')
 
     def add_options(self):
         self.add_opt('-p', '--pretty', action='store_true', help='Pretty Print the resulting YAML')
+        self.batch.add_options()
 
     @staticmethod
     def xml_to_yaml(content, filepath=None):
         try:
-            _ = xmltodict.parse(content)
+            return convert_xml_to_yaml(content)
         except xml.parsers.expat.ExpatError as _:
             file_detail = ''
             if filepath is not None:
                 file_detail = ' in file \'{0}\''.format(filepath)
             die("Failed to parse XML{0}: {1}".format(file_detail, _))
-        # xmltodict returns a unicode OrderedDict so need to make it a plain dict to come out properly not like:
-        # !!python/object/apply:collections.OrderedDict
-        yaml_string = yaml.safe_dump(json.loads(json.dumps(_)), encoding='utf-8', sort_keys=True)
-        return yaml_string
 
     def run(self):
+        self.batch.process_options()
         if self.get_opt('pretty'):
             log_option('pretty', True)
             self.indent = 4
@@ -100,6 +115,10 @@ class XmlToYaml(CLI):
                 log_option('directory', arg)
             else:
                 die("path '{}' could not be determined as either a file or directory".format(arg))
+        if self.batch.output_dir:
+            if self.batch.run(self.args):
+                sys.exit(ERRORS['CRITICAL'])
+            return
         for arg in self.args:
             self.process_path(arg)
 
@@ -27,6 +27,9 @@ Directories if given are detected and recursed, processing all files in the dire
 Works like a standard unix filter program - if no files are passed as arguments or '-' is passed then reads from
 standard input.
 
+With --output-dir, writes each converted file to a .json file under that directory instead, mirroring the input
+directory tree and converting files in parallel. Files whose output is already newer than the input are skipped.
+
 Written to convert .gitlab-ci.yml files to JSON for inputting to the GitLab API for validation
 (see gitlab_validate_ci_yml.sh in the DevOps-Bash-tools repo)
 
@@ -46,12 +49,16 @@ import os
 import re
 import sys
 import yaml
-libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pylib'))
-sys.path.append(libdir)
+srcdir = os.path.abspath(os.path.dirname(__file__))
+pylib = os.path.join(srcdir, 'pylib')
+lib = os.path.join(srcdir, 'lib')
+sys.path.append(pylib)
+sys.path.append(lib)
 try:
     # pylint: disable=wrong-import-position
     from harisekhon.utils import die, ERRORS, log, log_option
     from harisekhon import CLI
+    from batch_convert import BatchConverter
 except ImportError as _:
     print('module import failed: %s' % _, file=sys.stderr)
     print("Did you remember to build the project by running 'make'?", file=sys.stderr)
@@ -59,7 +66,13 @@ except ImportError as _:
     sys.exit(4)
 
 __author__ = 'Hari Sekhon'
-__version__ = '0.2.0'
+__version__ = '0.3.0'
+
+
+# module level function so it can be pickled to the --output-dir process pool
+def convert_yaml_to_json(content):
+    _ = yaml.load(content, Loader=yaml.FullLoader)
+    return json.dumps(_, indent=4)
 
 
 class YamlToJson(CLI):
@@ -70,19 +83,23 @@ class YamlToJson(CLI):
         # Python 3.x
         # super().__init__()
         self.re_yaml_suffix = re.compile(r'.*\.ya?ml$', re.I)
+        self.batch = BatchConverter(self, convert_yaml_to_json, self.re_yaml_suffix, '.json')
+
+    def add_options(self):
+        self.batch.add_options()
 
     @staticmethod
     def yaml_to_json(content, filepath=None):
         try:
-            _ = yaml.load(content, Loader=yaml.FullLoader)
+            return convert_yaml_to_json(content)
         except (KeyError, ValueError) as _:
             file_detail = ''
             if filepath is not None:
                 file_detail = ' in file \'{0}\''.format(filepath)
             die("Failed to parse YAML{0}: {1}".format(file_detail, _))
-        return json.dumps(_, sys.stdout, indent=4)
 
     def run(self):
+        self.batch.process_options()
         if not self.args:
             self.args.append('-')
         for arg in self.args:
@@ -97,6 +114,10 @@ class YamlToJson(CLI):
                 log_option('directory', arg)
             else:
                 die("path '%s' could not be determined as either a file or directory" % arg)
+        if self.batch.output_dir:
+            if self.batch.run(self.args):
+                sys.exit(ERRORS['CRITICAL'])
+            return
         for arg in self.args:
             self.process_path(arg)
 